@@ -0,0 +1,35 @@
+# Generated by Django 6.0.1 on 2026-10-19 15:20
+
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def renseigner_est_quantite_0(apps, schema_editor):
+    """Initialise le flag à partir des statuts IC existants (mêmes libellés que l'ancien filtre)"""
+    BRAsten = apps.get_model('br', 'BRAsten')
+    BRAsten.objects.filter(
+        Q(statut_ic__icontains='Quantité 0') |
+        Q(statut_ic__icontains='quantite_0') |
+        Q(statut_ic__icontains='Quantite 0')
+    ).update(est_quantite_0=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('br', '0004_rename_br_asten_numero__1f0c7b_idx_br_brasten_numero__2a4d81_idx_and_more'),
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='brasten',
+            name='est_quantite_0',
+            field=models.BooleanField(default=False, verbose_name='Quantité 0'),
+        ),
+        migrations.RunPython(renseigner_est_quantite_0, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='brasten',
+            index=models.Index(fields=['code_magasin', 'ic_integre', 'est_quantite_0', 'date_br'], name='br_brasten_code_ma_a60603_idx'),
+        ),
+    ]
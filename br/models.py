@@ -1,6 +1,17 @@
 from django.db import models
 from core.models import Magasin
 
+# Libellés de statut IC signalant un BR "Quantité 0" (exclu des statistiques)
+LIBELLES_QUANTITE_0 = ('quantité 0', 'quantite 0', 'quantite_0')
+
+
+def statut_est_quantite_0(statut_ic):
+    """Indique si un statut IC correspond à un BR "Quantité 0" (insensible à la casse)"""
+    if not statut_ic:
+        return False
+    statut = str(statut_ic).lower()
+    return any(libelle in statut for libelle in LIBELLES_QUANTITE_0)
+
 
 class BRAsten(models.Model):
     """BR provenant d'Asten"""
@@ -8,6 +19,8 @@ class BRAsten(models.Model):
     date_br = models.DateField(verbose_name="Date BR")
     statut_ic = models.CharField(max_length=50, null=True, blank=True, verbose_name="Statut IC")
     ic_integre = models.BooleanField(default=False, verbose_name="Intégré IC")
+    # Dérivé de statut_ic à chaque enregistrement (voir save) pour éviter les LIKE '%Quantité 0%'
+    est_quantite_0 = models.BooleanField(default=False, verbose_name="Quantité 0")
     code_magasin = models.ForeignKey(
         Magasin,
         on_delete=models.PROTECT,
@@ -28,9 +41,17 @@ class BRAsten(models.Model):
             models.Index(fields=['numero_br', 'date_br', 'code_magasin']),
             models.Index(fields=['date_br']),
             models.Index(fields=['code_magasin']),
+            models.Index(fields=['code_magasin', 'ic_integre', 'est_quantite_0', 'date_br']),
         ]
         ordering = ['-date_br', 'numero_br']
 
+    def save(self, *args, **kwargs):
+        self.est_quantite_0 = statut_est_quantite_0(self.statut_ic)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'statut_ic' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'est_quantite_0'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"BR Asten - {self.numero_br} - {self.code_magasin} - {self.date_br}"
 
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        # PRAGMA appliqués à chaque connexion SQLite (WAL, cache, busy_timeout...)
+        from . import sqlite  # noqa: F401
@@ -0,0 +1,43 @@
+"""
+Calcul concurrent des blocs indépendants d'une page (vues asynchrones de l'accueil et du dashboard).
+
+L'ORM asynchrone de Django (aget, acount...) exécute toutes les requêtes d'une même requête HTTP
+sur un seul thread : un asyncio.gather sur ces appels resterait séquentiel. Chaque bloc (fonction
+synchrone faisant ses requêtes ORM) est donc exécuté dans un thread du pool avec sa propre connexion,
+fermée (ou rendue au pool PostgreSQL) à la fin du bloc : la page attend le bloc le plus lent,
+et non plus la somme des blocs. Fonctionne aussi bien servi en ASGI qu'en WSGI.
+Les requêtes SQL de ces connexions sont comptées avec celles de la requête HTTP (instrumentation).
+"""
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+
+from core.instrumentation import connexions_instrumentees, enregistrer_mesure
+
+
+def _bloc_isole(request, nom, fonction):
+    def executer():
+        debut = time.perf_counter()
+        try:
+            with connexions_instrumentees():
+                return fonction()
+        finally:
+            # Connexion propre à ce thread : ne pas la laisser ouverte dans le pool de threads
+            connections.close_all()
+            if request is not None:
+                enregistrer_mesure(request, f'bloc-{nom}', (time.perf_counter() - debut) * 1000)
+    return executer
+
+
+async def calculer_en_parallele(blocs, request=None):
+    """
+    Exécute en parallèle les blocs {nom: fonction sans argument} et renvoie {nom: résultat}.
+    Avec `request`, la durée de chaque bloc est remontée à l'instrumentation (Server-Timing).
+    """
+    resultats = await asyncio.gather(*(
+        sync_to_async(_bloc_isole(request, nom, fonction), thread_sensitive=False)()
+        for nom, fonction in blocs.items()
+    ))
+    return dict(zip(blocs, resultats))
@@ -0,0 +1,267 @@
+"""
+Instrumentation des requêtes HTTP (optionnelle, activée par INSTRUMENTATION_ACTIVE).
+
+Pour chaque requête, le middleware mesure le nombre de requêtes SQL, le temps SQL cumulé,
+les requêtes SQL les plus lentes et le temps Python (total - SQL). Les mesures sont :
+- renvoyées dans l'en-tête Server-Timing (visible dans l'onglet Réseau du navigateur) ;
+- ajoutées au journal JSON lines INSTRUMENTATION_FICHIER (rotation par taille).
+
+Les requêtes SQL sont comptées par un collecteur porté par une variable de contexte : il suit la
+requête HTTP dans les threads des blocs calculés en parallèle (core/concurrence.py), dont les
+requêtes passent par leurs propres connexions. Le temps SQL est alors cumulé sur tous les threads.
+
+Les vues peuvent ajouter leurs propres mesures avec enregistrer_mesure().
+"""
+import contextvars
+import heapq
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import timedelta
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+NOM_JOURNAL = 'verification_commande.instrumentation'
+
+
+def _fichier_journal():
+    return Path(getattr(settings, 'INSTRUMENTATION_FICHIER', settings.BASE_DIR / 'logs' / 'instrumentation.jsonl'))
+
+
+def _get_journal():
+    """Logger dédié écrivant une ligne JSON par requête, avec rotation par taille"""
+    journal = logging.getLogger(NOM_JOURNAL)
+    if not journal.handlers:
+        fichier = _fichier_journal()
+        fichier.parent.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(
+            fichier,
+            maxBytes=getattr(settings, 'INSTRUMENTATION_TAILLE_MAX_MO', 10) * 1024 * 1024,
+            backupCount=getattr(settings, 'INSTRUMENTATION_NB_FICHIERS', 5),
+            encoding='utf-8',
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        journal.addHandler(handler)
+        journal.setLevel(logging.INFO)
+        journal.propagate = False
+    return journal
+
+
+def enregistrer_mesure(request, nom, duree_ms, description=''):
+    """
+    Ajoute une mesure nommée à la requête courante (Server-Timing + journal).
+    Sans effet si l'instrumentation est désactivée.
+    """
+    mesures = getattr(request, 'mesures_instrumentation', None)
+    if mesures is not None:
+        mesures.append({'nom': nom, 'duree_ms': round(duree_ms, 2), 'description': description})
+
+
+class _CollecteurSQL:
+    """Compte et chronomètre les requêtes SQL d'une requête HTTP et garde les plus lentes"""
+
+    def __init__(self, nb_lentes):
+        self.nb_lentes = nb_lentes
+        self.nb_requetes = 0
+        self.duree_totale = 0.0
+        self.lentes = []  # tas (durée, ordre, sql) limité à nb_lentes éléments
+        self._verrou = threading.Lock()  # alimenté par les threads des blocs parallèles
+
+    def ajouter(self, duree, sql):
+        with self._verrou:
+            self.nb_requetes += 1
+            self.duree_totale += duree
+            entree = (duree, self.nb_requetes, sql)
+            if len(self.lentes) < self.nb_lentes:
+                heapq.heappush(self.lentes, entree)
+            elif self.lentes and duree > self.lentes[0][0]:
+                heapq.heapreplace(self.lentes, entree)
+
+    def requetes_lentes(self):
+        return [
+            {'duree_ms': round(duree * 1000, 2), 'sql': sql[:1000]}
+            for duree, _, sql in sorted(self.lentes, reverse=True)
+        ]
+
+
+# Collecteurs actifs dans le contexte courant (imbriqués : benchmark_http autour du middleware).
+# sync_to_async copie le contexte dans le thread qui exécute la fonction.
+_collecteurs = contextvars.ContextVar('collecteurs_sql', default=())
+
+
+def _mesurer_sql(execute, sql, params, many, context):
+    """execute_wrapper : transmet la durée de la requête aux collecteurs du contexte courant"""
+    collecteurs = _collecteurs.get()
+    if not collecteurs:
+        return execute(sql, params, many, context)
+    debut = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duree = time.perf_counter() - debut
+        for collecteur in collecteurs:
+            collecteur.ajouter(duree, sql)
+
+
+@contextmanager
+def connexions_instrumentees():
+    """
+    Branche la mesure SQL sur les connexions du thread courant (une seule fois par connexion).
+    Sans effet en dehors d'une collecte : à utiliser dans tout thread qui exécute du SQL pour la
+    requête HTTP en cours (blocs parallèles).
+    """
+    with ExitStack() as pile:
+        for connexion in connections.all():
+            if _mesurer_sql not in connexion.execute_wrappers:
+                pile.enter_context(connexion.execute_wrapper(_mesurer_sql))
+        yield
+
+
+@contextmanager
+def collecter_sql(nb_lentes=0):
+    """Collecte les requêtes SQL exécutées dans ce contexte, y compris par les blocs parallèles"""
+    collecteur = _CollecteurSQL(nb_lentes)
+    jeton = _collecteurs.set(_collecteurs.get() + (collecteur,))
+    try:
+        with connexions_instrumentees():
+            yield collecteur
+    finally:
+        _collecteurs.reset(jeton)
+
+
+def _server_timing(total_ms, sql_ms, python_ms, nb_requetes, mesures):
+    valeurs = [
+        f'total;dur={total_ms:.1f}',
+        f'sql;dur={sql_ms:.1f};desc="{nb_requetes} requetes SQL"',
+        f'python;dur={python_ms:.1f}',
+    ]
+    for mesure in mesures:
+        nom = ''.join(c if c.isalnum() or c in '-_' else '-' for c in mesure['nom'])
+        valeur = f"{nom};dur={mesure['duree_ms']:.1f}"
+        if mesure['description']:
+            description = mesure['description'].replace('"', "'")
+            valeur += f';desc="{description}"'
+        valeurs.append(valeur)
+    return ', '.join(valeurs)
+
+
+class InstrumentationMiddleware:
+    """
+    Middleware de mesure (à placer en tête de MIDDLEWARE).
+    Retiré de la chaîne au démarrage si INSTRUMENTATION_ACTIVE est faux.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'INSTRUMENTATION_ACTIVE', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.nb_lentes = getattr(settings, 'INSTRUMENTATION_NB_REQUETES_LENTES', 5)
+        self.journal = _get_journal()
+
+    def __call__(self, request):
+        request.mesures_instrumentation = []
+        debut = time.perf_counter()
+        with collecter_sql(self.nb_lentes) as collecteur:
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - debut) * 1000
+        # Temps SQL cumulé (blocs parallèles compris) : peut dépasser le temps total
+        sql_ms = collecteur.duree_totale * 1000
+        python_ms = max(total_ms - sql_ms, 0.0)
+
+        response['Server-Timing'] = _server_timing(
+            total_ms, sql_ms, python_ms, collecteur.nb_requetes, request.mesures_instrumentation
+        )
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        try:
+            self.journal.info(json.dumps({
+                'date': timezone.now().isoformat(),
+                'methode': request.method,
+                'chemin': request.path,
+                'endpoint': resolver_match.view_name if resolver_match else request.path,
+                'statut': response.status_code,
+                'total_ms': round(total_ms, 2),
+                'sql_ms': round(sql_ms, 2),
+                'python_ms': round(python_ms, 2),
+                'nb_requetes': collecteur.nb_requetes,
+                'requetes_lentes': collecteur.requetes_lentes(),
+                'mesures': request.mesures_instrumentation,
+            }, ensure_ascii=False))
+        except Exception:
+            # Le journal de mesures ne doit jamais faire échouer la requête
+            logger.exception("Écriture du journal d'instrumentation impossible")
+        return response
+
+
+def lire_mesures(depuis=None):
+    """Lit les mesures du journal et de ses rotations (les plus anciennes d'abord)"""
+    fichier = _fichier_journal()
+    nb_fichiers = getattr(settings, 'INSTRUMENTATION_NB_FICHIERS', 5)
+    fichiers = [fichier.with_name(f'{fichier.name}.{i}') for i in range(nb_fichiers, 0, -1)] + [fichier]
+    for chemin in fichiers:
+        if not chemin.exists():
+            continue
+        with open(chemin, encoding='utf-8') as f:
+            for ligne in f:
+                try:
+                    mesure = json.loads(ligne)
+                except ValueError:
+                    continue
+                if depuis and mesure.get('date', '') < depuis.isoformat():
+                    continue
+                yield mesure
+
+
+def _percentile(valeurs_triees, pourcentage):
+    if not valeurs_triees:
+        return 0
+    index = min(len(valeurs_triees) - 1, int(round(pourcentage / 100 * (len(valeurs_triees) - 1))))
+    return valeurs_triees[index]
+
+
+def pires_endpoints(heures=24, limite=20):
+    """
+    Agrège les mesures des dernières `heures` par endpoint et les trie du plus lent au plus
+    rapide (p95 du temps total). Chaque entrée garde les requêtes SQL lentes de la pire requête.
+    """
+    depuis = timezone.now() - timedelta(hours=heures)
+    endpoints = {}
+    for mesure in lire_mesures(depuis):
+        stats = endpoints.setdefault(mesure.get('endpoint') or mesure.get('chemin'), {
+            'durees': [],
+            'sql_ms': 0.0,
+            'nb_requetes': 0,
+            'pire': None,
+        })
+        stats['durees'].append(mesure.get('total_ms', 0))
+        stats['sql_ms'] += mesure.get('sql_ms', 0)
+        stats['nb_requetes'] += mesure.get('nb_requetes', 0)
+        if stats['pire'] is None or mesure.get('total_ms', 0) > stats['pire'].get('total_ms', 0):
+            stats['pire'] = mesure
+
+    resultats = []
+    for endpoint, stats in endpoints.items():
+        durees = sorted(stats['durees'])
+        nb = len(durees)
+        resultats.append({
+            'endpoint': endpoint,
+            'nb_appels': nb,
+            'moyenne_ms': round(sum(durees) / nb, 1),
+            'p50_ms': _percentile(durees, 50),
+            'p95_ms': _percentile(durees, 95),
+            'max_ms': durees[-1],
+            'sql_moyen_ms': round(stats['sql_ms'] / nb, 1),
+            'nb_requetes_moyen': round(stats['nb_requetes'] / nb, 1),
+            'pire': stats['pire'],
+        })
+    resultats.sort(key=lambda r: r['p95_ms'], reverse=True)
+    return resultats[:limite]
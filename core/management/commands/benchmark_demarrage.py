@@ -0,0 +1,134 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Modules lourds qui ne doivent être chargés que dans les traitements qui en ont besoin (Excel...)
+MODULES_INTERDITS = ('pandas', 'numpy', 'openpyxl', 'pyarrow')
+
+# Script exécuté dans un interpréteur neuf : démarrage d'un worker web ou d'une commande de gestion
+SCRIPT_DEMARRAGE = """
+import json, resource, sys
+import django
+django.setup()
+cible = sys.argv[1]
+if cible == 'web':
+    from django.urls import get_resolver
+    get_resolver().url_patterns  # importe toutes les vues
+    from verification_commande.wsgi import application
+else:
+    from django.core import checks
+    from django.core.management import get_commands, load_command_class
+    commande = load_command_class(get_commands()[cible], cible)
+    if commande.requires_system_checks:
+        checks.run_checks()  # comme à l'exécution : les vérifications des URL importent toutes les vues
+# Pic de RSS de ce processus : ru_maxrss garderait celui du processus parent (conservé par fork + exec)
+try:
+    with open('/proc/self/status') as statut:
+        rss_ko = next(int(ligne.split()[1]) for ligne in statut if ligne.startswith('VmHWM:'))
+except (OSError, StopIteration):
+    rss_ko = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({
+    'rss_ko': rss_ko,
+    'modules_interdits': [nom for nom in sys.argv[2].split(',') if nom and nom in sys.modules],
+}))
+"""
+
+
+def analyser_importtime(sortie):
+    """
+    Analyse la sortie de `python -X importtime` : (temps total d'import en ms, {paquet racine: ms}).
+    Seuls les imports de premier niveau sont additionnés (leur cumul inclut les imports imbriqués).
+    """
+    total_us = 0
+    par_paquet = {}
+    for ligne in sortie.splitlines():
+        if not ligne.startswith('import time:'):
+            continue
+        champs = ligne[len('import time:'):].split('|')
+        if len(champs) != 3 or not champs[1].strip().isdigit():
+            continue  # ligne d'en-tête
+        module = champs[2].rstrip()[1:]  # un espace après le séparateur, puis l'indentation d'imbrication
+        if module.startswith(' '):
+            continue  # import imbriqué, déjà compté dans le cumul de son parent
+        cumul_us = int(champs[1])
+        total_us += cumul_us
+        racine = module.split('.')[0]
+        par_paquet[racine] = par_paquet.get(racine, 0) + cumul_us / 1000
+    return total_us / 1000, par_paquet
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le démarrage à froid (python -X importtime) d'un worker web et de commandes de gestion : "
+        "temps d'import, RSS, modules les plus coûteux ; échoue si un seuil est dépassé"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('cibles', nargs='*', default=['web', 'count_br'], help="'web' et/ou noms de commandes (défaut : web count_br)")
+        parser.add_argument('--repetitions', type=int, default=3, help='Démarrages mesurés par cible, médiane retenue (défaut : 3)')
+        parser.add_argument('--top', type=int, default=10, help='Paquets les plus coûteux affichés (défaut : 10)')
+        parser.add_argument('--max-ms', type=float, default=0, help='Seuil du démarrage à froid en ms (0 : pas de seuil)')
+        parser.add_argument('--max-rss-mo', type=float, default=0, help='Seuil de RSS par worker en Mo (0 : pas de seuil)')
+        parser.add_argument('--json', action='store_true', help='Rapport au format JSON')
+
+    def handle(self, *args, **options):
+        rapport = {
+            cible: self._mesurer(cible, max(1, options['repetitions']), options['top'])
+            for cible in options['cibles']
+        }
+        depassements = []
+        for cible, mesure in rapport.items():
+            if mesure['modules_interdits']:
+                depassements.append(f"{cible} : modules lourds chargés au démarrage ({', '.join(mesure['modules_interdits'])})")
+            if options['max_ms'] and mesure['demarrage_ms'] > options['max_ms']:
+                depassements.append(f"{cible} : démarrage {mesure['demarrage_ms']} ms > {options['max_ms']} ms")
+            if options['max_rss_mo'] and mesure['rss_mo'] > options['max_rss_mo']:
+                depassements.append(f"{cible} : RSS {mesure['rss_mo']} Mo > {options['max_rss_mo']} Mo")
+
+        if options['json']:
+            self.stdout.write(json.dumps(rapport, indent=2, ensure_ascii=False))
+        else:
+            for cible, mesure in rapport.items():
+                self.stdout.write(
+                    f"{cible} : démarrage {mesure['demarrage_ms']} ms (imports {mesure['imports_ms']} ms), "
+                    f"RSS {mesure['rss_mo']} Mo"
+                )
+                for paquet, duree in mesure['paquets_ms'].items():
+                    self.stdout.write(f"    {paquet:<30} {duree:>8.1f} ms")
+
+        if depassements:
+            raise CommandError('Seuils de démarrage dépassés :\n' + '\n'.join(depassements))
+        self.stdout.write(self.style.SUCCESS('✅ Démarrage dans les seuils'))
+
+    def _mesurer(self, cible, repetitions, top):
+        mesures = []
+        for _ in range(repetitions):
+            debut = time.perf_counter()
+            resultat = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', SCRIPT_DEMARRAGE, cible, ','.join(MODULES_INTERDITS)],
+                capture_output=True, text=True, cwd=settings.BASE_DIR, env=os.environ.copy(),
+            )
+            demarrage_ms = (time.perf_counter() - debut) * 1000
+            if resultat.returncode != 0:
+                raise CommandError(f"Démarrage de {cible} en échec :\n{resultat.stderr[-2000:]}")
+            imports_ms, par_paquet = analyser_importtime(resultat.stderr)
+            mesures.append((demarrage_ms, imports_ms, par_paquet, json.loads(resultat.stdout.strip().splitlines()[-1])))
+
+        # Démarrage médian ; détail des imports de ce démarrage
+        mesures.sort(key=lambda mesure: mesure[0])
+        demarrage_ms, imports_ms, par_paquet, etat = mesures[len(mesures) // 2]
+        return {
+            'demarrage_ms': round(demarrage_ms, 1),
+            'imports_ms': round(imports_ms, 1),
+            'rss_mo': round(max(mesure[3]['rss_ko'] for mesure in mesures) / 1024, 1),
+            'modules_interdits': etat['modules_interdits'],
+            'paquets_ms': {
+                paquet: round(duree, 1)
+                for paquet, duree in sorted(par_paquet.items(), key=lambda item: item[1], reverse=True)[:top]
+            },
+        }
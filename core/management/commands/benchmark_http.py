@@ -0,0 +1,295 @@
+import json
+import multiprocessing
+import random
+import re
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from core.instrumentation import collecter_sql
+from core.models import Magasin
+from ecarts.models import EcartCommande, EcartGPV, EcartLegend
+from tickets.models import Ticket
+
+# Types de données du dashboard (paramètre type_donnees)
+TYPES_DASHBOARD = ('commandes_asten', 'commandes_gpv', 'commandes_legend', 'br', 'factures')
+
+# Identifiants échantillonnés par page de détail
+NB_IDENTIFIANTS = 200
+
+# Pages de chaque endpoint appelées pendant l'échauffement
+NB_CHEMINS_ECHAUFFEMENT = 30
+
+# Requêtes minimales par endpoint (mesure et référence) pour comparer les p95 : en deçà, bruit
+MIN_ECHANTILLON_P95 = 20
+
+# En-tête Server-Timing de l'instrumentation : sql;dur=...;desc="N requetes SQL"
+MOTIF_SQL_SERVER_TIMING = re.compile(r'sql;dur=[\d.]+;desc="(\d+) requetes SQL"')
+
+def _centile(valeurs_triees, pourcentage):
+    if not valeurs_triees:
+        return 0
+    return valeurs_triees[min(len(valeurs_triees) - 1, int(len(valeurs_triees) * pourcentage / 100))]
+
+
+def _requete_client(client, chemin):
+    """Requête via le client de test Django : (statut, nombre de requêtes SQL)"""
+    # Collecteur de contexte : compte aussi les requêtes des blocs calculés en parallèle
+    with collecter_sql() as collecteur:
+        response = client.get(chemin)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        else:
+            response.content
+    return response.status_code, collecteur.nb_requetes
+
+
+def _requete_http(url_base, chemin):
+    """Requête vers un serveur lancé : (statut, nombre de requêtes SQL si l'instrumentation est active)"""
+    try:
+        with urllib.request.urlopen(url_base + chemin, timeout=60) as response:
+            response.read()
+            statut, entetes = response.status, response.headers
+    except urllib.error.HTTPError as exc:
+        statut, entetes = exc.code, exc.headers
+    except (urllib.error.URLError, OSError):
+        return 0, None
+    correspondance = MOTIF_SQL_SERVER_TIMING.search(entetes.get('Server-Timing', ''))
+    return statut, int(correspondance.group(1)) if correspondance else None
+
+
+def _executer(url_base, tirages, echeance):
+    """
+    Un travailleur (thread ou processus) : rejoue ses requêtes [(endpoint, chemin)] jusqu'à
+    l'échéance éventuelle. Renvoie [(endpoint, statut, durée ms, nb SQL)].
+    """
+    if url_base:
+        executer = lambda chemin: _requete_http(url_base, chemin)  # noqa: E731
+    else:
+        client = Client(raise_request_exception=False, HTTP_HOST=_hote_client())
+        executer = lambda chemin: _requete_client(client, chemin)  # noqa: E731
+    resultats = []
+    try:
+        for endpoint, chemin in tirages:
+            if echeance and time.time() >= echeance:
+                break
+            debut = time.perf_counter()
+            try:
+                statut, nb_sql = executer(chemin)
+            except Exception:
+                statut, nb_sql = 0, None
+            resultats.append((endpoint, statut, (time.perf_counter() - debut) * 1000, nb_sql))
+    finally:
+        connections.close_all()
+    return resultats
+
+
+def _hote_client():
+    return next((hote for hote in settings.ALLOWED_HOSTS if hote != '*' and not hote.startswith('.')), 'localhost')
+
+
+class Command(BaseCommand):
+    help = (
+        "Test de charge HTTP reproductible : trafic pondéré (accueil, dashboard, écarts, détails, tickets, "
+        "exports API) sur plusieurs threads ou processus, rapport JSON par endpoint et comparaison à une référence"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Serveur à tester (ex. http://127.0.0.1:8000) ; sinon client de test Django')
+        parser.add_argument('--travailleurs', type=int, default=4, help='Nombre de threads ou de processus (défaut : 4)')
+        parser.add_argument('--processus', action='store_true', help='Travailleurs en processus plutôt qu\'en threads')
+        parser.add_argument('--requetes', type=int, default=500, help='Nombre total de requêtes (défaut : 500)')
+        parser.add_argument('--duree', type=float, help='Durée maximale en secondes')
+        parser.add_argument('--graine', type=int, default=42, help='Graine du tirage de la séquence de requêtes (défaut : 42)')
+        parser.add_argument('--sortie', help='Fichier JSON où écrire le rapport (ex. pour en faire la référence)')
+        parser.add_argument('--reference', help='Rapport JSON de référence auquel comparer les résultats')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Hausse de p95 tolérée face à la référence (défaut : 0.2)')
+        parser.add_argument('--echec-si-regression', action='store_true', help='Code de sortie en erreur si une régression est détectée')
+
+    def handle(self, *args, **options):
+        url_base = (options['url'] or '').rstrip('/')
+        nb_travailleurs = max(1, options['travailleurs'])
+        scenarios = self._scenarios()
+
+        # Échauffement hors mesure : chaque page une fois (gabarits chargés, caches remplis)
+        _executer(url_base, [
+            (scenario['nom'], chemin) for scenario in scenarios
+            for chemin in scenario['chemins'][:NB_CHEMINS_ECHAUFFEMENT]
+        ], None)
+
+        # Séquence tirée d'avance : le même trafic quel que soit le nombre de travailleurs
+        alea = random.Random(options['graine'])
+        tirages = []
+        for scenario in alea.choices(scenarios, weights=[s['poids'] for s in scenarios], k=options['requetes']):
+            tirages.append((scenario['nom'], alea.choice(scenario['chemins'])))
+
+        echeance = time.time() + options['duree'] if options['duree'] else None
+        debut = time.perf_counter()
+        resultats = self._executer_lots(url_base, tirages, nb_travailleurs, options['processus'], echeance)
+        duree = time.perf_counter() - debut
+
+        rapport = self._rapport(resultats, duree, url_base, nb_travailleurs, options)
+        if options['reference']:
+            rapport['comparaison'] = self._comparer(rapport, options['reference'], options['tolerance'])
+        texte = json.dumps(rapport, indent=2, ensure_ascii=False)
+        if options['sortie']:
+            Path(options['sortie']).write_text(texte + '\n', encoding='utf-8')
+        self.stdout.write(texte)
+
+        regressions = rapport.get('comparaison', {}).get('regressions', [])
+        if regressions and options['echec_si_regression']:
+            raise CommandError(f"Régression sur {len(regressions)} endpoint(s) : {', '.join(regressions)}")
+
+    def _scenarios(self):
+        """Endpoints et poids du trafic ; les pages de détail tirent parmi des identifiants existants"""
+        aujourdhui = timezone.localdate()
+        magasins = list(Magasin.objects.order_by('code').values_list('code', flat=True)[:20]) or ['']
+        periode = f'date_debut={aujourdhui - timedelta(days=30)}&date_fin={aujourdhui}'
+        liste_ecarts = reverse('dashboard:liste_ecarts')
+        liste_tickets = reverse('tickets:liste')
+
+        scenarios = [
+            {'nom': 'accueil', 'poids': 10, 'chemins': [reverse('dashboard:accueil')]},
+            *[
+                {'nom': f'dashboard[{type_donnees}]', 'poids': 4,
+                 'chemins': [f"{reverse('dashboard:dashboard')}?type_donnees={type_donnees}"]}
+                for type_donnees in TYPES_DASHBOARD
+            ],
+            {'nom': 'liste_ecarts', 'poids': 10, 'chemins': [
+                liste_ecarts, f'{liste_ecarts}?statut=ouvert', f'{liste_ecarts}?{periode}',
+                *[f'{liste_ecarts}?type_ecart={type_ecart}' for type_ecart in ('asten', 'gpv', 'legend')],
+                *[f'{liste_ecarts}?magasin={code}' for code in magasins],
+            ]},
+            {'nom': 'liste_tickets', 'poids': 6, 'chemins': [
+                liste_tickets, f'{liste_tickets}?statut=en_cours', f'{liste_tickets}?{periode}',
+                *[f'{liste_tickets}?magasin={code}' for code in magasins],
+            ]},
+            *[
+                {'nom': f'export[{source}]', 'poids': 2,
+                 'chemins': [f"{reverse('dashboard:api_commandes', args=[source])}?taille_page=1000"]}
+                for source in ('asten', 'cyrus', 'gpv', 'legend', 'br')
+            ],
+            {'nom': 'export[ecarts]', 'poids': 2, 'chemins': [f"{reverse('dashboard:api_ecarts')}?taille_page=1000"]},
+        ]
+        details = (
+            ('detail_ecart', 'dashboard:detail_ecart', EcartCommande),
+            ('detail_ecart_gpv', 'dashboard:detail_ecart_gpv', EcartGPV),
+            ('detail_ecart_legend', 'dashboard:detail_ecart_legend', EcartLegend),
+            ('detail_ticket', 'tickets:detail', Ticket),
+        )
+        for nom, url, modele in details:
+            identifiants = modele.objects.order_by('-pk').values_list('pk', flat=True)[:NB_IDENTIFIANTS]
+            chemins = [reverse(url, args=[identifiant]) for identifiant in identifiants]
+            if chemins:
+                scenarios.append({'nom': nom, 'poids': 2, 'chemins': chemins})
+            else:
+                self.stdout.write(self.style.WARNING(f"{nom} ignoré : aucune ligne en base"))
+        return scenarios
+
+    def _executer_lots(self, url_base, tirages, nb_travailleurs, processus, echeance):
+        if processus:
+            # Processus dupliqués (fork) : les connexions ouvertes ne doivent pas être partagées
+            connections.close_all()
+            executeur = ProcessPoolExecutor(nb_travailleurs, mp_context=multiprocessing.get_context('fork'))
+        else:
+            executeur = ThreadPoolExecutor(nb_travailleurs, thread_name_prefix='charge')
+        with executeur:
+            lots = executeur.map(
+                _executer,
+                [url_base] * nb_travailleurs,
+                [tirages[i::nb_travailleurs] for i in range(nb_travailleurs)],
+                [echeance] * nb_travailleurs,
+            )
+            return [resultat for lot in lots for resultat in lot]
+
+    def _rapport(self, resultats, duree, url_base, nb_travailleurs, options):
+        par_endpoint = {}
+        for endpoint, statut, duree_ms, nb_sql in resultats:
+            par_endpoint.setdefault(endpoint, []).append((statut, duree_ms, nb_sql))
+
+        endpoints = {}
+        for endpoint, mesures in sorted(par_endpoint.items()):
+            durees = sorted(duree_ms for _, duree_ms, _ in mesures)
+            erreurs = sum(1 for statut, _, _ in mesures if not statut or statut >= 400)
+            requetes_sql = sorted(nb_sql for _, _, nb_sql in mesures if nb_sql is not None)
+            endpoints[endpoint] = {
+                'requetes': len(mesures),
+                'erreurs': erreurs,
+                'taux_erreur': round(erreurs / len(mesures), 4),
+                'debit_rps': round(len(mesures) / duree, 2) if duree else 0,
+                'p50_ms': round(_centile(durees, 50), 1),
+                'p95_ms': round(_centile(durees, 95), 1),
+                'p99_ms': round(_centile(durees, 99), 1),
+                'requetes_sql_moy': round(sum(requetes_sql) / len(requetes_sql), 1) if requetes_sql else None,
+                'requetes_sql_p50': _centile(requetes_sql, 50) if requetes_sql else None,
+                'requetes_sql_max': max(requetes_sql) if requetes_sql else None,
+            }
+
+        durees = sorted(duree_ms for _, _, duree_ms, _ in resultats)
+        erreurs = sum(mesure['erreurs'] for mesure in endpoints.values())
+        return {
+            'date': timezone.now().isoformat(),
+            'cible': url_base or 'client de test',
+            'travailleurs': nb_travailleurs,
+            'mode': 'processus' if options['processus'] else 'threads',
+            'graine': options['graine'],
+            'duree_s': round(duree, 2),
+            'global': {
+                'requetes': len(resultats),
+                'erreurs': erreurs,
+                'taux_erreur': round(erreurs / len(resultats), 4) if resultats else 0,
+                'debit_rps': round(len(resultats) / duree, 2) if duree else 0,
+                'p50_ms': round(_centile(durees, 50), 1),
+                'p95_ms': round(_centile(durees, 95), 1),
+                'p99_ms': round(_centile(durees, 99), 1),
+            },
+            'endpoints': endpoints,
+        }
+
+    def _comparer(self, rapport, chemin_reference, tolerance):
+        """
+        Écarts par endpoint face à la référence. Régression : p95 au-delà de la tolérance (et d'au
+        moins 5 ms, sur au moins MIN_ECHANTILLON_P95 requêtes de part et d'autre), taux d'erreur en hausse ou nombre médian de requêtes SQL
+        en hausse (la moyenne dépend des requêtes servies depuis le cache).
+        """
+        try:
+            reference = json.loads(Path(chemin_reference).read_text(encoding='utf-8'))
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Référence illisible ({chemin_reference}) : {exc}")
+
+        comparaison = {'reference': reference.get('date'), 'endpoints': {}, 'regressions': []}
+        for endpoint, mesure in rapport['endpoints'].items():
+            ancienne = reference.get('endpoints', {}).get(endpoint)
+            if not ancienne:
+                continue
+            ecart_p95 = (mesure['p95_ms'] - ancienne['p95_ms']) / ancienne['p95_ms'] if ancienne['p95_ms'] else 0
+            sql, sql_reference = mesure['requetes_sql_p50'], ancienne.get('requetes_sql_p50')
+            motifs = []
+            echantillon = min(mesure['requetes'], ancienne.get('requetes', 0)) >= MIN_ECHANTILLON_P95
+            if echantillon and ecart_p95 > tolerance and mesure['p95_ms'] - ancienne['p95_ms'] >= 5:
+                motifs.append('p95')
+            if mesure['taux_erreur'] > ancienne['taux_erreur']:
+                motifs.append('erreurs')
+            if sql is not None and sql_reference is not None and sql > sql_reference:
+                motifs.append('requetes_sql')
+            comparaison['endpoints'][endpoint] = {
+                'p95_ms': mesure['p95_ms'],
+                'p95_ms_reference': ancienne['p95_ms'],
+                'ecart_p95': round(ecart_p95, 3),
+                'requetes_sql_p50': sql,
+                'requetes_sql_p50_reference': sql_reference,
+                'regression': motifs,
+            }
+            if motifs:
+                comparaison['regressions'].append(endpoint)
+        return comparaison
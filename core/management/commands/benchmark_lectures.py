@@ -0,0 +1,102 @@
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+from django.db.models import Count, Sum
+from asten.models import CommandeAsten
+from core.models import Magasin
+from imports.management.commands.benchmark_import import CODES_MAGASINS_BENCH, ecrire_fichier_asten
+from imports.models import ImportFichier
+from imports.services import importer_fichier_asten
+
+# Profil SQLite par défaut de Django, pour comparaison avec les réglages de config.env
+PRAGMAS_SANS_REGLAGES = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+
+class Command(BaseCommand):
+    help = (
+        "SQLite : mesure la latence des lectures du dashboard pendant un import Asten, sans réglages "
+        "(journal DELETE) puis avec les PRAGMA de config.env (WAL...). Les données importées sont supprimées."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lignes', type=int, default=50000, help='Lignes du fichier importé (défaut : 50000)')
+        parser.add_argument('--magasins', type=int, default=50, help='Nombre de magasins, 500 au plus (défaut : 50)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stdout.write(self.style.WARNING("Mesure réservée au profil SQLite."))
+            return
+
+        codes = CODES_MAGASINS_BENCH[:options['magasins']]
+        pragmas_config = settings.SQLITE_PRAGMAS
+        with tempfile.TemporaryDirectory() as dossier:
+            fichier = os.path.join(dossier, 'bench_lectures_asten.csv')
+            ecrire_fichier_asten(fichier, options['lignes'], codes, random.Random(42))
+            # Données synthétiques supprimées après chaque mesure : pas d'archive Parquet
+            archivage = getattr(settings, 'ARCHIVE_IMPORTS_ACTIVE', True)
+            settings.ARCHIVE_IMPORTS_ACTIVE = False
+            try:
+                for libelle, pragmas in (
+                    ('sans réglages (journal DELETE)', PRAGMAS_SANS_REGLAGES),
+                    ('réglages config.env', pragmas_config),
+                ):
+                    settings.SQLITE_PRAGMAS = pragmas
+                    connections.close_all()  # nouvelles connexions avec ces PRAGMA
+                    self._mesurer(libelle, fichier, codes)
+            finally:
+                settings.SQLITE_PRAGMAS = pragmas_config
+                settings.ARCHIVE_IMPORTS_ACTIVE = archivage
+                connections.close_all()
+
+    def _mesurer(self, libelle, fichier, codes):
+        existants = set(Magasin.objects.filter(code__in=codes).values_list('code', flat=True))
+        Magasin.objects.bulk_create([Magasin(code=code, nom=f'Bench {code}') for code in codes if code not in existants])
+        duree_import = []
+
+        def importer():
+            debut = time.perf_counter()
+            try:
+                importer_fichier_asten(fichier)
+            finally:
+                duree_import.append(time.perf_counter() - debut)
+                connection.close()
+
+        fil = threading.Thread(target=importer)
+        latences = []
+        erreurs = 0
+        fil.start()
+        try:
+            while fil.is_alive():
+                debut = time.perf_counter()
+                try:
+                    # Lectures représentatives de l'accueil / du dashboard
+                    CommandeAsten.objects.count()
+                    list(CommandeAsten.objects.values('code_magasin').annotate(nb=Count('id'), total=Sum('montant'))[:10])
+                    ImportFichier.objects.order_by('-date_import').first()
+                    latences.append((time.perf_counter() - debut) * 1000)
+                except OperationalError:
+                    erreurs += 1
+                time.sleep(0.02)
+        finally:
+            fil.join()
+            CommandeAsten.objects.filter(fichier_source=os.path.basename(fichier)).delete()
+            ImportFichier.objects.filter(nom_fichier=os.path.basename(fichier)).delete()
+            Magasin.objects.filter(code__in=set(codes) - existants).delete()
+
+        if latences:
+            latences.sort()
+            self.stdout.write(
+                f"{libelle:<32} import {duree_import[0]:6.2f} s  lectures={len(latences):4d}  "
+                f"p50={statistics.median(latences):7.1f} ms  "
+                f"p95={latences[min(len(latences) - 1, int(len(latences) * 0.95))]:7.1f} ms  "
+                f"max={latences[-1]:7.1f} ms  erreurs « database is locked »={erreurs}"
+            )
+        else:
+            self.stdout.write(f"{libelle:<32} import {duree_import[0]:6.2f} s  aucune lecture aboutie, erreurs={erreurs}")
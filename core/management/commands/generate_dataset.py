@@ -0,0 +1,380 @@
+import json
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, time as heure, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import BigIntegerField, F, Max
+from django.db.models.functions import Cast
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from asten.models import CommandeAsten
+from br.models import BRAsten
+from core.models import Magasin
+from cyrus.models import CommandeCyrus
+from ecarts.models import EcartCommande, EcartGPV, EcartLegend, RecalculEcarts
+from gpv.models import CommandeGPV
+from legend.models import CommandeLegend
+from tickets.models import (
+    CompteurTicket, HistoriqueStatut, SuiviTicket, Technicien, Ticket, TicketCategorie,
+)
+from tickets.services import invalider_stats_tickets, reconstruire_index_recherche
+
+# Marque des lignes générées (fichier_source des commandes / BR, demandeur des tickets) : --purger
+SOURCE = 'generate_dataset'
+
+# Plages de numéros distinctes par source : pas de rapprochement Cyrus accidentel entre sources
+DEBUT_NUMEROS = {'asten': 10_000_000, 'gpv': 40_000_000, 'legend': 70_000_000, 'br': 1_000_000}
+
+STATUTS_GPV_NON_TRANSMIS = ('Saisie', 'Validée')
+CATEGORIES_TICKETS = ('Caisse', 'Réseau', 'Imprimante', 'Stock', 'Prix', 'Logiciel')
+MESSAGES_SUIVI = (
+    "Prise en charge, diagnostic en cours.",
+    "Redémarrage du poste effectué, le magasin confirme.",
+    "En attente du retour du fournisseur.",
+    "Intervention sur site planifiée.",
+    "Correctif appliqué, à surveiller.",
+)
+
+
+@contextmanager
+def dates_imposees(*champs):
+    """Désactive auto_now / auto_now_add : les lignes gardent les dates du jeu de données"""
+    sauvegarde = [(champ, champ.auto_now, champ.auto_now_add) for champ in champs]
+    for champ in champs:
+        champ.auto_now = champ.auto_now_add = False
+    try:
+        yield
+    finally:
+        for champ, auto_now, auto_now_add in sauvegarde:
+            champ.auto_now, champ.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère un jeu de données synthétique de volume production (magasins, commandes Asten / Cyrus / "
+        "GPV / Legend, BR, écarts, tickets avec historique) par insertions groupées"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--magasins', type=int, default=50, help='Nombre de magasins, pris dans magasin.json puis complétés (défaut : 50)')
+        parser.add_argument('--commandes-par-jour', type=int, default=200, help='Commandes par source et par jour (défaut : 200)')
+        parser.add_argument('--date-debut', help='Premier jour AAAA-MM-JJ (défaut : il y a 90 jours)')
+        parser.add_argument('--date-fin', help='Dernier jour AAAA-MM-JJ (défaut : aujourd\'hui)')
+        parser.add_argument('--taux-absent-cyrus', type=float, default=0.05, help='Part des commandes absentes de Cyrus (défaut : 0.05)')
+        parser.add_argument('--taux-decalage-date', type=float, default=0.03, help='Part des commandes intégrées dans Cyrus à une autre date (défaut : 0.03)')
+        parser.add_argument('--taux-zeros-legend', type=float, default=0.3, help='Part des numéros Legend avec zéros en tête (défaut : 0.3)')
+        parser.add_argument('--taux-legend-exportee', type=float, default=0.9, help='Part des commandes Legend exportées (défaut : 0.9)')
+        parser.add_argument('--taux-gpv-transmise', type=float, default=0.6, help='Part des commandes GPV au statut Transmise (défaut : 0.6)')
+        parser.add_argument('--taux-br-non-integre', type=float, default=0.05, help='Part des BR non intégrés IC (défaut : 0.05)')
+        parser.add_argument('--taux-br-quantite-0', type=float, default=0.01, help='Part des BR « Quantité 0 » (défaut : 0.01)')
+        parser.add_argument('--tickets-par-jour', type=int, default=20, help='Tickets créés par jour, avec historique de statut (défaut : 20)')
+        parser.add_argument('--graine', type=int, default=42, help='Graine du générateur (défaut : 42)')
+        parser.add_argument('--taille-lot', type=int, default=5000, help='Lignes par INSERT groupé (défaut : 5000)')
+        parser.add_argument('--purger', action='store_true', help='Supprime d\'abord les données générées précédemment')
+
+    def handle(self, *args, **options):
+        aujourdhui = timezone.localdate()
+        date_fin = parse_date(options['date_fin']) if options['date_fin'] else aujourdhui
+        date_debut = parse_date(options['date_debut']) if options['date_debut'] else date_fin - timedelta(days=89)
+        if not date_debut or not date_fin or date_debut > date_fin:
+            raise CommandError('Période invalide (format AAAA-MM-JJ, début avant fin)')
+
+        self.options = options
+        self.alea = random.Random(options['graine'])
+        self.taille_lot = max(1, options['taille_lot'])
+        self.comptes = {}
+        debut = time.perf_counter()
+
+        if options['purger']:
+            self._purger()
+
+        magasins = self._magasins(options['magasins'])
+        techniciens, categories = self._referentiels_tickets()
+        self.numeros = dict(DEBUT_NUMEROS)
+        self.numeros.update(self._prochains_numeros())
+
+        nb_jours = (date_fin - date_debut).days + 1
+        with dates_imposees(
+            Ticket._meta.get_field('date_creation'),
+            Ticket._meta.get_field('date_mise_a_jour'),
+            HistoriqueStatut._meta.get_field('date_changement'),
+            SuiviTicket._meta.get_field('date_creation'),
+        ):
+            for indice in range(nb_jours):
+                jour = date_debut + timedelta(days=indice)
+                with transaction.atomic():
+                    self._generer_commandes(jour, magasins)
+                    self._generer_br(jour, magasins)
+                    self._generer_tickets(jour, magasins, techniciens, categories)
+                if options['verbosity'] >= 1 and ((indice + 1) % 10 == 0 or indice + 1 == nb_jours):
+                    self.stdout.write(
+                        f"{jour} ({indice + 1}/{nb_jours} jours) — {sum(self.comptes.values())} lignes "
+                        f"en {time.perf_counter() - debut:.0f} s"
+                    )
+
+        # Nouvelle version des données (caches et validateurs HTTP), index de recherche des tickets
+        RecalculEcarts.objects.create(
+            type_recalcul='automatique',
+            ecarts_crees=sum(self.comptes.get(cle, 0) for cle in ('ecarts_asten', 'ecarts_gpv', 'ecarts_legend')),
+        )
+        reconstruire_index_recherche()
+        invalider_stats_tickets()
+
+        duree = time.perf_counter() - debut
+        total = sum(self.comptes.values())
+        for cle, nombre in self.comptes.items():
+            self.stdout.write(f"  {cle:<18} {nombre:>12}")
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {total} lignes générées en {duree:.1f} s ({total / duree:.0f} lignes/s), "
+            f"{len(magasins)} magasins, du {date_debut} au {date_fin}"
+        ))
+
+    # --- Référentiels -------------------------------------------------------------------------
+
+    def _magasins(self, nombre):
+        """Magasins de magasin.json (dans l'ordre du fichier), complétés par des codes synthétiques"""
+        fichier = Path(settings.BASE_DIR) / 'magasin.json'
+        donnees = json.loads(fichier.read_text(encoding='utf-8')) if fichier.exists() else {}
+        candidats = [(code, info.get('name', code)) for code, info in donnees.items()]
+        candidats += [(str(9000 + i), f'Magasin synthétique {i}') for i in range(max(0, nombre - len(candidats)))]
+        candidats = candidats[:nombre]
+        Magasin.objects.bulk_create([Magasin(code=code, nom=nom) for code, nom in candidats], ignore_conflicts=True)
+        return [code for code, _ in candidats]
+
+    def _referentiels_tickets(self):
+        if not Technicien.objects.exists():
+            Technicien.objects.bulk_create([Technicien(nom=f'Technicien {i}') for i in range(1, 9)])
+        TicketCategorie.objects.bulk_create([TicketCategorie(nom=nom) for nom in CATEGORIES_TICKETS], ignore_conflicts=True)
+        return (
+            list(Technicien.objects.filter(actif=True).values_list('id', flat=True)),
+            list(TicketCategorie.objects.filter(actif=True).values_list('id', flat=True)),
+        )
+
+    def _prochains_numeros(self):
+        """Reprise après une génération précédente : numéros au-delà des derniers générés"""
+        prochains = {}
+        sources = (
+            ('asten', CommandeAsten, 'numero_commande'), ('gpv', CommandeGPV, 'numero_commande'),
+            ('legend', CommandeLegend, 'numero_commande'), ('br', BRAsten, 'numero_br'),
+        )
+        for source, modele, champ in sources:
+            maximum = modele.objects.filter(fichier_source=SOURCE).aggregate(
+                numero_max=Max(Cast(champ, BigIntegerField()))
+            )['numero_max']
+            if maximum is not None:
+                prochains[source] = maximum + 1
+        return prochains
+
+    def _numero(self, source):
+        numero = self.numeros[source]
+        self.numeros[source] += 1
+        return numero
+
+    def _purger(self):
+        debut = time.perf_counter()
+        with transaction.atomic():
+            for modele in (CommandeAsten, CommandeGPV, CommandeLegend, CommandeCyrus, BRAsten):
+                # Les écarts suivent par cascade
+                modele.objects.filter(fichier_source=SOURCE).delete()
+            Ticket.objects.filter(demandeur=SOURCE).delete()
+        self.stdout.write(f"Données générées précédemment supprimées en {time.perf_counter() - debut:.1f} s")
+
+    def _inserer(self, cle, modele, objets):
+        modele.objects.bulk_create(objets, batch_size=self.taille_lot)
+        self.comptes[cle] = self.comptes.get(cle, 0) + len(objets)
+        return objets
+
+    # --- Commandes et écarts ------------------------------------------------------------------
+
+    def _date_cyrus(self, jour):
+        """Date de la commande côté Cyrus : décalée de 1 à 3 jours pour une part des commandes"""
+        if self.alea.random() < self.options['taux_decalage_date']:
+            return jour + timedelta(days=self.alea.randint(1, 3))
+        return jour
+
+    def _montant(self):
+        return Decimal(self.alea.randint(1_000, 5_000_000)) / 100
+
+    def _generer_commandes(self, jour, magasins):
+        alea = self.alea
+        opts = self.options
+        par_jour = opts['commandes_par_jour']
+        asten, gpv, legend, cyrus = [], [], [], []
+        asten_absentes, gpv_absentes, legend_absentes = [], [], []
+
+        for _ in range(par_jour):
+            magasin = alea.choice(magasins)
+            numero = str(self._numero('asten'))
+            montant = self._montant()
+            commande = CommandeAsten(
+                date_commande=jour, numero_commande=numero, code_magasin_id=magasin,
+                montant=montant, statut=alea.choice(('Validée', 'Livrée', 'En cours')), fichier_source=SOURCE,
+            )
+            asten.append(commande)
+            if alea.random() < opts['taux_absent_cyrus']:
+                asten_absentes.append(commande)
+            else:
+                cyrus.append(CommandeCyrus(
+                    date_commande=self._date_cyrus(jour), numero_commande=numero, code_magasin_id=magasin,
+                    montant=montant, statut='A', fichier_source=SOURCE,
+                ))
+
+        for _ in range(par_jour):
+            magasin = alea.choice(magasins)
+            numero = str(self._numero('gpv'))
+            transmise = alea.random() < opts['taux_gpv_transmise']
+            commande = CommandeGPV(
+                date_creation=jour, numero_commande=numero, code_magasin_id=magasin, nom_magasin=magasin,
+                date_validation=jour, date_transfert=jour if transmise else None,
+                statut='Transmise' if transmise else alea.choice(STATUTS_GPV_NON_TRANSMIS), fichier_source=SOURCE,
+            )
+            gpv.append(commande)
+            # Seules les commandes « Transmise » doivent être dans Cyrus
+            if not transmise:
+                continue
+            if alea.random() < opts['taux_absent_cyrus']:
+                gpv_absentes.append(commande)
+            else:
+                cyrus.append(CommandeCyrus(
+                    date_commande=self._date_cyrus(jour), numero_commande=numero, code_magasin_id=magasin,
+                    statut='G', fichier_source=SOURCE,
+                ))
+
+        for _ in range(par_jour):
+            magasin = alea.choice(magasins)
+            numero = str(self._numero('legend'))
+            exportee = alea.random() < opts['taux_legend_exportee']
+            # Legend garde parfois des zéros en tête, Cyrus jamais (rapprochement sur le numéro normalisé)
+            numero_legend = '00' + numero if alea.random() < opts['taux_zeros_legend'] else numero
+            commande = CommandeLegend(
+                numero_brut=f'DIV-{numero_legend}', numero_commande=numero_legend, depot_origine=magasin,
+                depot_destination=alea.choice(magasins), date_commande=jour, exportee=exportee,
+                code_depot=magasin, date_livraison_prevue=jour + timedelta(days=2), fichier_source=SOURCE,
+            )
+            legend.append(commande)
+            if not exportee:
+                continue
+            if alea.random() < opts['taux_absent_cyrus']:
+                legend_absentes.append(commande)
+            else:
+                cyrus.append(CommandeCyrus(
+                    date_commande=self._date_cyrus(jour), numero_commande=numero, code_magasin_id=magasin,
+                    statut='L', fichier_source=SOURCE,
+                ))
+
+        self._inserer('asten', CommandeAsten, asten)
+        self._inserer('gpv', CommandeGPV, gpv)
+        self._inserer('legend', CommandeLegend, legend)
+        self._inserer('cyrus', CommandeCyrus, cyrus)
+        # Écarts tels que recalculer_ecarts les créerait (clés primaires renseignées par bulk_create)
+        self._inserer('ecarts_asten', EcartCommande, [
+            EcartCommande(commande_asten_id=commande.pk, statut='ouvert') for commande in asten_absentes
+        ])
+        self._inserer('ecarts_gpv', EcartGPV, [
+            EcartGPV(commande_gpv_id=commande.pk, statut='ouvert') for commande in gpv_absentes
+        ])
+        self._inserer('ecarts_legend', EcartLegend, [
+            EcartLegend(commande_legend_id=commande.pk, statut='ouvert', type_ecart='cyrus_absent')
+            for commande in legend_absentes
+        ])
+
+    def _generer_br(self, jour, magasins):
+        alea = self.alea
+        opts = self.options
+        brs = []
+        for _ in range(opts['commandes_par_jour']):
+            tirage = alea.random()
+            if tirage < opts['taux_br_quantite_0']:
+                statut_ic, ic_integre, quantite_0 = 'Quantité 0', False, True
+            elif tirage < opts['taux_br_quantite_0'] + opts['taux_br_non_integre']:
+                statut_ic, ic_integre, quantite_0 = 'Non intégré', False, False
+            else:
+                statut_ic, ic_integre, quantite_0 = 'Intégré', True, False
+            brs.append(BRAsten(
+                numero_br=str(self._numero('br')), date_br=jour, code_magasin_id=alea.choice(magasins),
+                statut_ic=statut_ic, ic_integre=ic_integre, est_quantite_0=quantite_0, fichier_source=SOURCE,
+            ))
+        # Contrairement à save(), bulk_create ne dérive pas est_quantite_0 : renseigné ci-dessus
+        self._inserer('br', BRAsten, brs)
+
+    # --- Tickets ------------------------------------------------------------------------------
+
+    def _reserver_numeros_tickets(self, nombre):
+        """Réserve `nombre` numéros consécutifs au compteur des tickets ; renvoie le premier"""
+        premier = CompteurTicket.prochain_numero()
+        if nombre > 1:
+            CompteurTicket.objects.filter(nom='ticket').update(valeur=F('valeur') + nombre - 1)
+        return premier
+
+    def _generer_tickets(self, jour, magasins, techniciens, categories):
+        nombre = self.options['tickets_par_jour']
+        if nombre <= 0:
+            return
+        alea = self.alea
+        premier = self._reserver_numeros_tickets(nombre)
+        minuit = timezone.make_aware(datetime.combine(jour, heure.min))
+        maintenant = timezone.now()
+        niveaux = [niveau for niveau, _ in Ticket.NIVEAU_CHOICES]
+
+        tickets, parcours = [], []
+        for indice in range(nombre):
+            creation = minuit + timedelta(minutes=alea.randint(7 * 60, 19 * 60))
+            # Parcours de statuts : prise en charge, attente éventuelle, résolution puis fermeture
+            etapes = [(Ticket.STATUT_EN_COURS, alea.uniform(0.2, 8))]
+            if alea.random() < 0.3:
+                etapes += [(Ticket.STATUT_EN_ATTENTE, alea.uniform(1, 24)), (Ticket.STATUT_EN_COURS, alea.uniform(2, 48))]
+            etapes.append((Ticket.STATUT_RESOLU, alea.uniform(1, 72)))
+            if alea.random() < 0.5:
+                etapes.append((Ticket.STATUT_FERME, alea.uniform(2, 96)))
+            # Tickets récents : parcours interrompu à la date du jour
+            transitions, date_etape = [], creation
+            for statut, delai_h in etapes:
+                date_etape = date_etape + timedelta(hours=delai_h)
+                if date_etape > maintenant:
+                    break
+                transitions.append((statut, date_etape))
+            statut_final = transitions[-1][0] if transitions else Ticket.STATUT_NOUVEAU
+            date_fermeture = transitions[-1][1] if statut_final in (Ticket.STATUT_RESOLU, Ticket.STATUT_FERME) else None
+            tickets.append(Ticket(
+                numero_ticket=str(premier + indice),
+                type_demande=alea.choice((Ticket.TYPE_INCIDENT, Ticket.TYPE_DEMANDE)),
+                categorie_id=alea.choice(categories) if categories else None,
+                statut=statut_final, urgence=alea.choice(niveaux), impact=alea.choice(niveaux),
+                magasin_id=alea.choice(magasins), demandeur=SOURCE,
+                description=f"Incident {alea.choice(CATEGORIES_TICKETS).lower()} signalé par le magasin",
+                date_creation=creation, date_mise_a_jour=transitions[-1][1] if transitions else creation,
+                date_fermeture=date_fermeture,
+            ))
+            parcours.append((creation, transitions))
+        self._inserer('tickets', Ticket, tickets)
+
+        historiques, suivis, assignations = [], [], []
+        for ticket, (creation, transitions) in zip(tickets, parcours):
+            historiques.append(HistoriqueStatut(
+                ticket_id=ticket.pk, ancien_statut='', nouveau_statut=Ticket.STATUT_NOUVEAU,
+                utilisateur=SOURCE, date_changement=creation,
+            ))
+            ancien = Ticket.STATUT_NOUVEAU
+            for statut, date_etape in transitions:
+                historiques.append(HistoriqueStatut(
+                    ticket_id=ticket.pk, ancien_statut=ancien, nouveau_statut=statut,
+                    utilisateur=SOURCE, date_changement=date_etape,
+                ))
+                ancien = statut
+            if transitions:
+                suivis.append(SuiviTicket(
+                    ticket_id=ticket.pk, auteur=SOURCE, message=alea.choice(MESSAGES_SUIVI),
+                    date_creation=transitions[0][1],
+                ))
+            if techniciens:
+                assignations.append(Ticket.assigne_a.through(ticket_id=ticket.pk, technicien_id=alea.choice(techniciens)))
+        self._inserer('historiques', HistoriqueStatut, historiques)
+        self._inserer('suivis', SuiviTicket, suivis)
+        self._inserer('assignations', Ticket.assigne_a.through, assignations)
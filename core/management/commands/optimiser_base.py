@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintenance périodique de la base (à planifier, ex. chaque nuit) : statistiques du planificateur "
+        "(PRAGMA optimize ou ANALYZE complet) et, sous SQLite, réduction du journal WAL"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--complet',
+            action='store_true',
+            help="ANALYZE de toutes les tables au lieu de PRAGMA optimize (plus long, après un gros import)",
+        )
+        parser.add_argument(
+            '--vacuum',
+            action='store_true',
+            help="SQLite : VACUUM pour récupérer l'espace libre (bloque les écritures pendant l'opération)",
+        )
+
+    def handle(self, *args, **options):
+        debut = time.perf_counter()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                if options['complet']:
+                    cursor.execute('ANALYZE')
+                else:
+                    # N'analyse que les tables dont les statistiques sont absentes ou obsolètes
+                    cursor.execute('PRAGMA analysis_limit = 1000')
+                    cursor.execute('PRAGMA optimize')
+                if options['vacuum']:
+                    cursor.execute('VACUUM')
+                cursor.execute('PRAGMA journal_mode')
+                if cursor.fetchone()[0].lower() == 'wal':
+                    # Replie le journal WAL dans la base et le remet à zéro
+                    cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            elif connection.vendor == 'postgresql':
+                cursor.execute('VACUUM ANALYZE' if options['vacuum'] else 'ANALYZE')
+            else:
+                cursor.execute('ANALYZE')
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Base {connection.vendor} optimisée en {time.perf_counter() - debut:.2f} s"
+        ))
@@ -0,0 +1,34 @@
+"""
+Réglages des connexions SQLite (profil par défaut, sans serveur PostgreSQL).
+
+À chaque nouvelle connexion, les PRAGMA de settings.SQLITE_PRAGMAS sont appliqués :
+- journal WAL : les lectures (dashboard, accueil) ne sont plus bloquées pendant un import ;
+- synchronous=NORMAL : sûr en WAL, évite un fsync à chaque validation ;
+- mmap_size / cache_size / temp_store : lectures et tris en mémoire ;
+- busy_timeout : attente du verrou d'écriture au lieu d'un « database is locked » immédiat.
+Une valeur vide dans config.env désactive le PRAGMA correspondant.
+"""
+import re
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+VALEUR_PRAGMA = re.compile(r'^-?\w+$')
+
+
+def pragmas_sqlite():
+    """PRAGMA à appliquer, dans l'ordre (journal_mode en premier), valeurs vides exclues"""
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    return [(nom, str(valeur)) for nom, valeur in pragmas.items() if str(valeur).strip() != '']
+
+
+@receiver(connection_created)
+def configurer_connexion_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for nom, valeur in pragmas_sqlite():
+            if not VALEUR_PRAGMA.match(nom) or not VALEUR_PRAGMA.match(valeur):
+                raise ValueError(f"PRAGMA SQLite invalide : {nom}={valeur!r}")
+            cursor.execute(f'PRAGMA {nom} = {valeur}')
@@ -0,0 +1,206 @@
+"""
+API JSON en lecture seule pour les flux n8n et l'écran BI.
+
+Chaque réponse porte un ETag et un Last-Modified dérivés de la version des données
+(dernier ImportFichier.date_import et dernier recalcul des écarts) : un client qui
+renvoie If-None-Match / If-Modified-Since reçoit un 304 sans autre requête que la
+lecture de la version.
+"""
+import hashlib
+
+from django.core.paginator import Paginator
+from django.http import JsonResponse
+from django.utils.dateparse import parse_date
+from django.views.decorators.http import condition, require_GET
+
+from asten.models import CommandeAsten
+from br.models import BRAsten
+from cyrus.models import CommandeCyrus
+from ecarts.services import (
+    get_version_donnees, lister_ecarts,
+    statistiques_asten, statistiques_gpv, statistiques_legend, statistiques_br,
+)
+from gpv.models import CommandeGPV
+from legend.models import CommandeLegend
+
+TAILLE_PAGE_DEFAUT = 100
+TAILLE_PAGE_MAX = 1000
+
+
+def _version(request):
+    """Version des données, lue une seule fois par requête (partagée entre ETag et Last-Modified)"""
+    if not hasattr(request, '_version_donnees'):
+        request._version_donnees = get_version_donnees()
+    return request._version_donnees
+
+
+def _etag(request, *args, **kwargs):
+    dernier_import, dernier_recalcul = _version(request)
+    brut = f"{dernier_import}|{dernier_recalcul}|{request.get_full_path()}"
+    return hashlib.md5(brut.encode('utf-8')).hexdigest()
+
+
+def _last_modified(request, *args, **kwargs):
+    dates = [d for d in _version(request) if d is not None]
+    return max(dates) if dates else None
+
+
+def _filtres_communs(request):
+    date_debut = parse_date(request.GET.get('date_debut') or '')
+    date_fin = parse_date(request.GET.get('date_fin') or '')
+    codes_magasins = [m for m in request.GET.getlist('magasin') if m and m != 'None']
+    return date_debut, date_fin, codes_magasins or None
+
+
+def _paginer(request, queryset_ou_liste):
+    try:
+        taille_page = int(request.GET.get('taille_page', TAILLE_PAGE_DEFAUT))
+    except (TypeError, ValueError):
+        taille_page = TAILLE_PAGE_DEFAUT
+    taille_page = max(1, min(taille_page, TAILLE_PAGE_MAX))
+    paginator = Paginator(queryset_ou_liste, taille_page)
+    page_obj = paginator.get_page(request.GET.get('page', 1))
+    return page_obj, {
+        'page': page_obj.number,
+        'nombre_pages': paginator.num_pages,
+        'taille_page': taille_page,
+        'total': paginator.count,
+    }
+
+
+def _reponse(request, donnees):
+    dernier_import, dernier_recalcul = _version(request)
+    donnees['version'] = {
+        'dernier_import': dernier_import,
+        'dernier_recalcul': dernier_recalcul,
+    }
+    return JsonResponse(donnees, json_dumps_params={'ensure_ascii': False})
+
+
+@require_GET
+@condition(etag_func=_etag, last_modified_func=_last_modified)
+def api_statistiques(request):
+    """Statistiques d'intégration par source (mêmes règles de calcul que le dashboard)"""
+    date_debut, date_fin, codes_magasins = _filtres_communs(request)
+    return _reponse(request, {
+        'filtres': {
+            'date_debut': date_debut,
+            'date_fin': date_fin,
+            'magasin': codes_magasins or [],
+        },
+        'statistiques': {
+            'asten': statistiques_asten(date_debut, date_fin, codes_magasins),
+            'gpv': statistiques_gpv(date_debut, date_fin, codes_magasins),
+            'legend': statistiques_legend(date_debut, date_fin),
+            'br': statistiques_br(date_debut, date_fin, codes_magasins),
+        },
+    })
+
+
+@require_GET
+@condition(etag_func=_etag, last_modified_func=_last_modified)
+def api_ecarts(request):
+    """Liste des écarts (mêmes filtres et même tri que la page liste_ecarts)"""
+    date_debut, date_fin, _ = _filtres_communs(request)
+    ecarts = lister_ecarts(
+        date_debut=date_debut,
+        date_fin=date_fin,
+        code_magasin=request.GET.get('magasin') or None,
+        statut=request.GET.get('statut', ''),
+        type_ecart=request.GET.get('type_ecart', ''),
+    )
+    page_obj, pagination = _paginer(request, ecarts)
+    resultats = []
+    for item in page_obj.object_list:
+        code_magasin = item.get('code_magasin')
+        resultats.append({
+            'type': item['type'],
+            'id': item['id'],
+            'statut': item['statut'],
+            'date_commande': item['date_commande'],
+            'numero_commande': item['numero_commande'],
+            'code_magasin': code_magasin.code if code_magasin else None,
+            'depot_origine': item.get('depot_origine'),
+            'depot_destination': item.get('depot_destination'),
+            'montant': item['montant'],
+            'date_creation': item['date_creation'],
+            'commentaire': item['ecart'].commentaire,
+        })
+    return _reponse(request, {'pagination': pagination, 'resultats': resultats})
+
+
+# Pour chaque source : modèle, champ date, champ numéro et colonnes exposées
+SOURCES_COMMANDES = {
+    'asten': {
+        'modele': CommandeAsten,
+        'champ_date': 'date_commande',
+        'champ_numero': 'numero_commande',
+        'champs': ['id', 'date_commande', 'numero_commande', 'code_magasin', 'montant', 'statut', 'fichier_source'],
+    },
+    'cyrus': {
+        'modele': CommandeCyrus,
+        'champ_date': 'date_commande',
+        'champ_numero': 'numero_commande',
+        'champs': ['id', 'date_commande', 'numero_commande', 'code_magasin', 'montant', 'statut', 'fichier_source'],
+    },
+    'gpv': {
+        'modele': CommandeGPV,
+        'champ_date': 'date_creation',
+        'champ_numero': 'numero_commande',
+        'champs': [
+            'id', 'date_creation', 'date_validation', 'date_transfert', 'numero_commande',
+            'code_magasin', 'nom_magasin', 'statut', 'fichier_source',
+        ],
+    },
+    'legend': {
+        'modele': CommandeLegend,
+        'champ_date': 'date_commande',
+        'champ_numero': 'numero_commande',
+        'magasin': False,
+        'champs': [
+            'id', 'date_commande', 'numero_brut', 'numero_commande', 'depot_origine',
+            'depot_destination', 'exportee', 'code_client', 'code_depot', 'fichier_source',
+        ],
+    },
+    'br': {
+        'modele': BRAsten,
+        'champ_date': 'date_br',
+        'champ_numero': 'numero_br',
+        'champs': ['id', 'date_br', 'numero_br', 'code_magasin', 'statut_ic', 'ic_integre', 'fichier_source'],
+    },
+}
+
+
+@require_GET
+@condition(etag_func=_etag, last_modified_func=_last_modified)
+def api_commandes(request, source):
+    """Liste paginée des commandes d'une source (asten, cyrus, gpv, legend) ou des BR"""
+    config = SOURCES_COMMANDES.get(source)
+    if config is None:
+        return JsonResponse(
+            {'erreur': f"Source inconnue : {source}", 'sources': sorted(SOURCES_COMMANDES)},
+            status=404,
+        )
+
+    date_debut, date_fin, codes_magasins = _filtres_communs(request)
+    champ_date = config['champ_date']
+    filtres = {}
+    if date_debut:
+        filtres[f'{champ_date}__gte'] = date_debut
+    if date_fin:
+        filtres[f'{champ_date}__lte'] = date_fin
+    if codes_magasins and config.get('magasin', True):
+        filtres['code_magasin__code__in'] = codes_magasins
+    numero = (request.GET.get('numero') or '').strip()
+    if numero:
+        filtres[f"{config['champ_numero']}__icontains"] = numero
+
+    queryset = config['modele'].objects.filter(**filtres).order_by(
+        f'-{champ_date}', config['champ_numero'], 'id'
+    ).values(*config['champs'])
+    page_obj, pagination = _paginer(request, queryset)
+    return _reponse(request, {
+        'source': source,
+        'pagination': pagination,
+        'resultats': list(page_obj.object_list),
+    })
@@ -1,53 +1,106 @@
+import csv
+import json
+
 from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Q
+from django.db.models.functions import TruncMonth
+
 from br.models import BRAsten
-from django.db.models import Q
+
+COLONNES_COMPTEURS = ['total', 'integres', 'non_integres', 'quantite_0', 'taux_integration', 'taux_non_integration']
+
+
+def _compteurs():
+    """Compteurs BR calculés en un seul passage (agrégats conditionnels sur est_quantite_0)"""
+    return {
+        'total': Count('id'),
+        'integres': Count('id', filter=Q(ic_integre=True, est_quantite_0=False)),
+        'non_integres': Count('id', filter=Q(ic_integre=False, est_quantite_0=False)),
+        'quantite_0': Count('id', filter=Q(est_quantite_0=True)),
+    }
+
+
+def _ajouter_taux(ligne):
+    """Les "Quantité 0" sont exclus du total servant aux pourcentages"""
+    total_pour_stats = ligne['total'] - ligne['quantite_0']
+    ligne['taux_integration'] = round((ligne['integres'] / total_pour_stats * 100) if total_pour_stats > 0 else 0, 2)
+    ligne['taux_non_integration'] = round((ligne['non_integres'] / total_pour_stats * 100) if total_pour_stats > 0 else 0, 2)
+    return ligne
 
 
 class Command(BaseCommand):
-    help = 'Affiche le nombre de BR non intégrés'
+    help = 'Statistiques des BR Asten (total, intégrés, non intégrés, Quantité 0) en un seul passage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--by-magasin', action='store_true', help='Ventiler par magasin')
+        parser.add_argument('--by-month', action='store_true', help='Ventiler par mois (date BR)')
+        parser.add_argument('--by-fichier', action='store_true', help='Ventiler par fichier source')
+        parser.add_argument(
+            '--format',
+            choices=['texte', 'json', 'csv'],
+            default='texte',
+            help='Format de sortie (par défaut : texte)',
+        )
 
     def handle(self, *args, **options):
-        # Compter tous les BR
-        total = BRAsten.objects.count()
-
-        # Compter les BR non intégrés (en excluant les "Quantité 0")
-        non_integres = BRAsten.objects.filter(ic_integre=False).exclude(
-            Q(statut_ic__icontains='Quantité 0') | 
-            Q(statut_ic__icontains='quantite_0') |
-            Q(statut_ic__icontains='Quantite 0')
-        ).count()
-
-        # Compter les BR intégrés (en excluant les "Quantité 0")
-        integres = BRAsten.objects.filter(ic_integre=True).exclude(
-            Q(statut_ic__icontains='Quantité 0') | 
-            Q(statut_ic__icontains='quantite_0') |
-            Q(statut_ic__icontains='Quantite 0')
-        ).count()
-
-        # Compter les BR "Quantité 0" (exclus des statistiques)
-        quantite_0 = BRAsten.objects.filter(
-            Q(statut_ic__icontains='Quantité 0') | 
-            Q(statut_ic__icontains='quantite_0') |
-            Q(statut_ic__icontains='Quantite 0')
-        ).count()
-
-        # Afficher les résultats
+        dimensions = []
+        annotations = {}
+        if options['by_magasin']:
+            dimensions.append('code_magasin')
+        if options['by_month']:
+            annotations['mois'] = TruncMonth('date_br')
+            dimensions.append('mois')
+        if options['by_fichier']:
+            dimensions.append('fichier_source')
+
+        if dimensions:
+            # Un seul GROUP BY sur toutes les dimensions demandées
+            lignes = [
+                _ajouter_taux(ligne)
+                for ligne in BRAsten.objects.annotate(**annotations)
+                .values(*dimensions)
+                .annotate(**_compteurs())
+                .order_by(*dimensions)
+            ]
+        else:
+            lignes = [_ajouter_taux(BRAsten.objects.aggregate(**_compteurs()))]
+
+        for ligne in lignes:
+            if ligne.get('mois') is not None:
+                ligne['mois'] = ligne['mois'].strftime('%Y-%m')
+
+        colonnes = dimensions + COLONNES_COMPTEURS
+        if options['format'] == 'json':
+            self.stdout.write(json.dumps(lignes if dimensions else lignes[0], cls=DjangoJSONEncoder, ensure_ascii=False, indent=2))
+        elif options['format'] == 'csv':
+            writer = csv.DictWriter(self.stdout, fieldnames=colonnes, delimiter=';', lineterminator='\n')
+            writer.writeheader()
+            writer.writerows(lignes)
+        elif dimensions:
+            self._afficher_tableau(colonnes, lignes)
+        else:
+            self._afficher_resume(lignes[0])
+
+    def _afficher_resume(self, ligne):
         self.stdout.write("=" * 50)
         self.stdout.write(self.style.SUCCESS("STATISTIQUES DES BR ASTEN"))
         self.stdout.write("=" * 50)
-        self.stdout.write(f"Total BR: {total}")
-        self.stdout.write(self.style.SUCCESS(f"BR Intégrés: {integres}"))
-        self.stdout.write(self.style.ERROR(f"BR Non Intégrés: {non_integres}"))
-        self.stdout.write(f"BR Quantité 0 (exclus): {quantite_0}")
+        self.stdout.write(f"Total BR: {ligne['total']}")
+        self.stdout.write(self.style.SUCCESS(f"BR Intégrés: {ligne['integres']}"))
+        self.stdout.write(self.style.ERROR(f"BR Non Intégrés: {ligne['non_integres']}"))
+        self.stdout.write(f"BR Quantité 0 (exclus): {ligne['quantite_0']}")
         self.stdout.write("=" * 50)
-
-        # Calculer les pourcentages
-        if total > quantite_0:
-            total_pour_stats = total - quantite_0
-            taux_integration = round((integres / total_pour_stats * 100) if total_pour_stats > 0 else 0, 2)
-            taux_non_integration = round((non_integres / total_pour_stats * 100) if total_pour_stats > 0 else 0, 2)
-            self.stdout.write(f"Taux d'intégration: {taux_integration}%")
-            self.stdout.write(f"Taux de non-intégration: {taux_non_integration}%")
+        if ligne['total'] > ligne['quantite_0']:
+            self.stdout.write(f"Taux d'intégration: {ligne['taux_integration']}%")
+            self.stdout.write(f"Taux de non-intégration: {ligne['taux_non_integration']}%")
         self.stdout.write("=" * 50)
 
-
+    def _afficher_tableau(self, colonnes, lignes):
+        valeurs = [[str(ligne[colonne] if ligne[colonne] is not None else '-') for colonne in colonnes] for ligne in lignes]
+        largeurs = [max([len(colonne)] + [len(v[i]) for v in valeurs]) for i, colonne in enumerate(colonnes)]
+        self.stdout.write(self.style.SUCCESS("  ".join(c.ljust(l) for c, l in zip(colonnes, largeurs))))
+        self.stdout.write("  ".join("-" * l for l in largeurs))
+        for ligne in valeurs:
+            self.stdout.write("  ".join(v.ljust(l) for v, l in zip(ligne, largeurs)))
+        self.stdout.write(f"{len(lignes)} ligne(s)")
@@ -0,0 +1,48 @@
+"""
+Balise {% cache %} chronométrée : même syntaxe et même cache que la balise de Django
+({% load cache_mesure %} à la place de {% load cache %}). Chaque fragment rendu ajoute la mesure
+`fragment-<nom>` (durée de la balise, hit / miss) à l'instrumentation (Server-Timing) ; sur un
+miss, la durée comprend le calcul des valeurs paresseuses lues par le fragment.
+"""
+import time
+
+from django import template
+from django.template import NodeList
+from django.templatetags.cache import CacheNode, do_cache
+
+from core.instrumentation import enregistrer_mesure
+
+register = template.Library()
+
+
+class ContenuFragment(NodeList):
+    """Contenu du fragment : son rendu signale que le fragment n'était pas en cache"""
+
+    def render(self, context):
+        context.render_context[id(self)] = True
+        return super().render(context)
+
+
+class CacheMesureNode(CacheNode):
+    def __init__(self, nodelist, *args):
+        contenu = ContenuFragment(nodelist)
+        contenu.contains_nontext = nodelist.contains_nontext
+        super().__init__(contenu, *args)
+
+    def render(self, context):
+        debut = time.perf_counter()
+        context.render_context[id(self.nodelist)] = False
+        valeur = super().render(context)
+        enregistrer_mesure(
+            context.get('request'),
+            f'fragment-{self.fragment_name}',
+            (time.perf_counter() - debut) * 1000,
+            'miss' if context.render_context[id(self.nodelist)] else 'hit',
+        )
+        return valeur
+
+
+@register.tag('cache')
+def cache_mesure(parser, token):
+    noeud = do_cache(parser, token)
+    return CacheMesureNode(noeud.nodelist, noeud.expire_time_var, noeud.fragment_name, noeud.vary_on, noeud.cache_name)
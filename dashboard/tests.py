@@ -1,3 +1,72 @@
-from django.test import TestCase
+import re
+import tempfile
+from pathlib import Path
 
-# Create your tests here.
+from unittest import mock
+
+from django.db.backends.utils import CursorWrapper
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from ecarts.services import statistiques_asten
+
+MOTIF_SQL = re.compile(r'sql;dur=[\d.]+;desc="(\d+) requetes SQL"')
+
+
+class InstrumentationDashboardTests(TransactionTestCase):
+    """Server-Timing du dashboard : requêtes des blocs calculés en parallèle comptées, fragments chronométrés"""
+
+    def setUp(self):
+        self.dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dossier.cleanup)
+
+    def test_nombre_requetes_server_timing(self):
+        with override_settings(
+            INSTRUMENTATION_ACTIVE=True,
+            INSTRUMENTATION_FICHIER=Path(self.dossier.name) / 'instrumentation.jsonl',
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+        ):
+            # Référence : toutes les requêtes exécutées, quels que soient le thread et la connexion
+            executer = CursorWrapper._execute_with_wrappers
+            requetes = []
+
+            def compter(curseur, sql, *args, **kwargs):
+                requetes.append(sql)
+                return executer(curseur, sql, *args, **kwargs)
+
+            with mock.patch.object(CursorWrapper, '_execute_with_wrappers', compter):
+                response = Client().get(reverse('dashboard:dashboard'), {'type_donnees': 'br'})
+
+        self.assertEqual(response.status_code, 200)
+        correspondance = MOTIF_SQL.search(response['Server-Timing'])
+        self.assertIsNotNone(correspondance)
+        self.assertIn('bloc-tableau', response['Server-Timing'])
+        for fragment in ('dashboard_magasins', 'dashboard_stats', 'dashboard_br'):
+            self.assertIn(f'fragment-{fragment};dur=', response['Server-Timing'])
+        self.assertEqual(int(correspondance.group(1)), len(requetes))
+
+
+class CacheFragmentsTests(TransactionTestCase):
+    """Cartes de l'accueil en cache ({% cache %}) : la vue ne les recalcule pas et le signale"""
+
+    def setUp(self):
+        self.dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dossier.cleanup)
+
+    def test_cartes_servies_depuis_le_cache(self):
+        with override_settings(
+            INSTRUMENTATION_ACTIVE=True,
+            INSTRUMENTATION_FICHIER=Path(self.dossier.name) / 'instrumentation.jsonl',
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-fragments'}},
+        ):
+            client = Client()
+            with mock.patch('dashboard.views.statistiques_asten', wraps=statistiques_asten) as calcul:
+                premiere = client.get(reverse('dashboard:accueil'))
+                seconde = client.get(reverse('dashboard:accueil'))
+
+        self.assertEqual(premiere.status_code, 200)
+        self.assertEqual(calcul.call_count, 1)
+        self.assertRegex(premiere['Server-Timing'], r'fragment-accueil_asten;dur=[\d.]+;desc="miss"')
+        self.assertRegex(seconde['Server-Timing'], r'fragment-accueil_asten;dur=[\d.]+;desc="hit"')
+        self.assertNotIn('desc="miss"', seconde['Server-Timing'])
+        self.assertEqual(premiere.content, seconde.content)
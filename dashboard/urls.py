@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 app_name = 'dashboard'
 
@@ -28,4 +28,9 @@ urlpatterns = [
     path('parametres/magasins/', views.gestion_magasins, name='gestion_magasins'),
     path('parametres/utilisateurs/', views.gestion_utilisateurs, name='gestion_utilisateurs'),
     path('parametres/preferences/', views.preferences_utilisateur, name='preferences_utilisateur'),
+    path('parametres/performances/', views.performances, name='performances'),
+    # API JSON (lecture seule, validateurs ETag / Last-Modified)
+    path('api/statistiques/', api.api_statistiques, name='api_statistiques'),
+    path('api/ecarts/', api.api_ecarts, name='api_ecarts'),
+    path('api/commandes/<str:source>/', api.api_commandes, name='api_commandes'),
 ]
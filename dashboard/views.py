@@ -1,5 +1,8 @@
+from functools import partial
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.utils.dateparse import parse_date
@@ -7,12 +10,18 @@ from django.urls import reverse
 from django.core.paginator import Paginator
 from datetime import datetime
 from django.utils import timezone
-from django.db.models import Q, Prefetch, Exists, OuterRef
+from django.utils.functional import SimpleLazyObject
+from django.db.models import Count, Q, Prefetch
 from django.db import IntegrityError
 from django.db.models.deletion import ProtectedError
 from imports.services import scanner_et_importer_fichiers
+from imports.sources import lister_fichiers_source
 from imports.models import ImportFichier
-from ecarts.services import recalculer_ecarts, get_statistiques
+from ecarts.services import (
+    recalculer_ecarts, get_statistiques, enregistrer_modification_manuelle, lister_ecarts,
+    statistiques_asten, statistiques_gpv, statistiques_legend, statistiques_br,
+    commandes_asten_rapprochees, commandes_gpv_rapprochees, get_cle_cache_donnees,
+)
 from asten.models import CommandeAsten
 from cyrus.models import CommandeCyrus
 from gpv.models import CommandeGPV
@@ -23,10 +32,12 @@ from core.models import Magasin
 from django.conf import settings
 from pathlib import Path
 from tickets.models import Ticket
+from core.instrumentation import pires_endpoints
+from core.concurrence import calculer_en_parallele
 
 
-def dashboard(request):
-    """Vue principale du dashboard"""
+def _actualiser_dashboard(request):
+    """Import des nouveaux fichiers et recalcul des écarts si nécessaire, avant l'affichage du dashboard"""
     # Les données existantes en base sont TOUJOURS chargées et affichées
     # Vérifier s'il y a de nouveaux fichiers à importer (même si déjà actualisé dans la session)
     # Les données restent en base de données donc elles persistent même si on change de type
@@ -42,10 +53,7 @@ def dashboard(request):
             }
             nouveaux_fichiers = False
             for type_fichier, dossier in sources.items():
-                if not dossier.exists():
-                    continue
-                fichiers = list(dossier.glob('*.csv')) + list(dossier.glob('*.CSV'))
-                for fichier in fichiers:
+                for fichier in lister_fichiers_source(dossier):
                     import_existant = ImportFichier.objects.filter(
                         type_fichier=type_fichier, nom_fichier=fichier.name
                     ).first()
@@ -80,7 +88,10 @@ def dashboard(request):
         except Exception as e:
             # En cas d'erreur, on continue quand même
             pass
-    
+
+
+def _filtres_dashboard(request):
+    """Filtres du dashboard lus dans la requête (période, dates, magasins, type de données)"""
     # Récupérer les filtres (gérer les valeurs "None" en string et la sélection multiple)
     date_debut = request.GET.get('date_debut')
     date_fin = request.GET.get('date_fin')
@@ -113,13 +124,41 @@ def dashboard(request):
         elif len(code_magasin) == 1:
             # Si un seul magasin est sélectionné, garder comme liste pour cohérence
             pass
-    
-    # Liste des magasins pour le filtre
-    magasins = Magasin.objects.all().order_by('code')
-    
-    # Initialiser les variables avec des valeurs par défaut
+
+    return {
+        'date_debut': date_debut,
+        'date_fin': date_fin,
+        'date_debut_parsed': date_debut_parsed,
+        'date_fin_parsed': date_fin_parsed,
+        'code_magasin': code_magasin,
+        'type_donnees': type_donnees,
+        'periode': periode,
+        'show': show,
+    }
+
+
+def _stats_dashboard(filtres):
+    """Cartes de statistiques du type de données sélectionné"""
     # IMPORTANT: Les données doivent TOUJOURS être chargées depuis la base, même sans actualisation
-    stats = {
+    type_donnees = filtres['type_donnees']
+    date_debut_parsed = filtres['date_debut_parsed']
+    date_fin_parsed = filtres['date_fin_parsed']
+    code_magasin = filtres['code_magasin']
+    if type_donnees == 'commandes_asten':
+        # (les écarts "quantite_0" sont exclus du total, voir ecarts.services)
+        return statistiques_asten(date_debut_parsed, date_fin_parsed, code_magasin)
+    if type_donnees == 'commandes_gpv':
+        # (seules les commandes "Transmise" doivent être dans Cyrus, voir ecarts.services)
+        return statistiques_gpv(date_debut_parsed, date_fin_parsed, code_magasin)
+    if type_donnees == 'commandes_legend':
+        # Statistiques basées uniquement sur les commandes exportées (comparaison sans code magasin)
+        return statistiques_legend(date_debut_parsed, date_fin_parsed)
+    if type_donnees == 'br':
+        # IMPORTANT: Les statistiques en haut affichent TOUJOURS le total global (sans filtre de date)
+        # Utiliser plus de décimales pour les petits pourcentages
+        return statistiques_br(codes_magasins=code_magasin, decimales=3)
+    # Factures : à implémenter quand les modèles Factures seront créés
+    return {
         'total_source': 0,
         'total_target': 0,
         'integres': 0,
@@ -127,389 +166,72 @@ def dashboard(request):
         'taux_integration': 0,
         'taux_non_integration': 0,
     }
+
+
+def _tableau_dashboard(request, filtres):
+    """Lignes du tableau du type de données sélectionné (page courante, BR trouvés / non trouvés)"""
+    date_debut_parsed = filtres['date_debut_parsed']
+    date_fin_parsed = filtres['date_fin_parsed']
+    code_magasin = filtres['code_magasin']
+    type_donnees = filtres['type_donnees']
+    show = filtres['show']
+    statut_ic = ''
+    br_trouvees = None
+    br_non_trouvees = None
     commandes_data = []
+    page_obj = None
     titre_tableau = "Comparaison Asten vs Cyrus"
 
 
     # Traiter selon le type de données sélectionné
     if type_donnees == 'commandes_asten':
-        # Récupérer les commandes avec leurs statuts d'intégration
-        # TOUJOURS charger les données existantes en base, même sans actualisation
-        filtres_asten = {}
-        filtres_cyrus = {}
-        if date_debut_parsed:
-            filtres_asten['date_commande__gte'] = date_debut_parsed
-            filtres_cyrus['date_commande__gte'] = date_debut_parsed
-        if date_fin_parsed:
-            filtres_asten['date_commande__lte'] = date_fin_parsed
-            filtres_cyrus['date_commande__lte'] = date_fin_parsed
-        if code_magasin:
-            # Gérer la sélection multiple de magasins
-            filtres_asten['code_magasin__code__in'] = code_magasin
-            filtres_cyrus['code_magasin__code__in'] = code_magasin
-        
-        # Calculer les statistiques avec les filtres appliqués
-        total_asten = CommandeAsten.objects.filter(**filtres_asten).count()
-        total_cyrus = CommandeCyrus.objects.filter(**filtres_cyrus).count()
-        
-        # Compter les commandes réellement intégrées dans Cyrus (optimisé avec une sous-requête)
-        commandes_reellement_integres = CommandeAsten.objects.filter(**filtres_asten).filter(
-            Exists(
-                CommandeCyrus.objects.filter(
-                    date_commande=OuterRef('date_commande'),
-                    numero_commande=OuterRef('numero_commande'),
-                    code_magasin=OuterRef('code_magasin')
-                )
-            )
-        ).count()
-        
-        # Compter les écarts avec les filtres
-        filtres_ecarts = {}
-        if date_debut_parsed:
-            filtres_ecarts['commande_asten__date_commande__gte'] = date_debut_parsed
-        if date_fin_parsed:
-            filtres_ecarts['commande_asten__date_commande__lte'] = date_fin_parsed
-        if code_magasin:
-            filtres_ecarts['commande_asten__code_magasin__code__in'] = code_magasin
-        
-        # Compter les écarts par statut
-        total_ecarts_ouverts = EcartCommande.objects.filter(**filtres_ecarts).filter(statut='ouvert').count()
-        total_ecarts_resolus = EcartCommande.objects.filter(**filtres_ecarts).filter(statut='resolu').count()
-        total_ecarts_ignores = EcartCommande.objects.filter(**filtres_ecarts).filter(statut='ignore').count()
-        total_ecarts_quantite_0 = EcartCommande.objects.filter(**filtres_ecarts).filter(statut='quantite_0').count()
-        
-        # Logique de calcul :
-        # - Les écarts "ouverts" = commandes non intégrées
-        # - Les écarts "résolus" = commandes considérées comme intégrées (même si pas encore dans Cyrus)
-        # - Les écarts "ignorés" = commandes considérées comme intégrées
-        # - Les écarts "quantite_0" = NE COMPTENT PAS dans les statistiques (exclus du total)
-        # 
-        # Total pour les statistiques = total_asten - total_ecarts_quantite_0 (exclure les quantite_0)
-        # Commandes intégrées = total_asten - total_ecarts_ouverts - total_ecarts_quantite_0
-        # (les écarts résolus et ignorés sont déjà comptés comme intégrés dans cette formule)
-        
-        # Exclure les commandes avec écart "quantite_0" du total affiché
-        total_asten_pour_stats = total_asten - total_ecarts_quantite_0
-        
-        # Commandes intégrées = total - écarts ouverts - écarts quantite_0
-        # (les écarts résolus et ignorés sont déjà dans le total, donc ils sont comptés comme intégrés)
-        commandes_integres = total_asten - total_ecarts_ouverts - total_ecarts_quantite_0
-        commandes_non_integres = total_ecarts_ouverts
-        
-        # Calculer les taux basés sur le total sans les quantite_0
-        taux_integration = round((commandes_integres / total_asten_pour_stats * 100) if total_asten_pour_stats > 0 else 0, 2)
-        taux_non_integration = round((commandes_non_integres / total_asten_pour_stats * 100) if total_asten_pour_stats > 0 else 0, 2)
-        
-        # Normaliser les statistiques pour correspondre au template
-        # Utiliser total_asten_pour_stats pour exclure les quantite_0 du total affiché
-        stats = {
-            'total_source': total_asten_pour_stats,  # Total sans les quantite_0
-            'total_target': total_cyrus,
-            'integres': commandes_integres,
-            'non_integres': commandes_non_integres,  # Utiliser le calcul réel, pas les écarts
-            'taux_integration': taux_integration,
-            'taux_non_integration': taux_non_integration,
-        }
-        
-        # Optimiser les requêtes : précharger les écarts et les commandes Cyrus correspondantes
-        # Utiliser prefetch_related pour éviter les requêtes N+1
-        commandes_asten = CommandeAsten.objects.filter(**filtres_asten).select_related('code_magasin').prefetch_related(
-            Prefetch('ecart', queryset=EcartCommande.objects.all())
-        ).order_by('-date_commande', 'numero_commande')
-        
-        # Limiter le nombre de commandes pour l'affichage (pagination implicite)
-        # Charger seulement les 200 premières pour améliorer les performances
-        commandes_asten_limited = list(commandes_asten[:200])
-        
-        # Créer un dictionnaire des commandes Cyrus pour lookup rapide
-        # Récupérer toutes les commandes Cyrus correspondantes en une seule requête optimisée
-        cyrus_lookup = {}
-        if commandes_asten_limited:
-            # Convertir en liste pour éviter les problèmes d'itération
-            commandes_list = commandes_asten_limited
-            
-            # Récupérer les clés uniques des commandes Asten
-            asten_keys = []
-            for cmd in commandes_list:
-                asten_keys.append((cmd.date_commande, cmd.numero_commande, cmd.code_magasin.code))
-            
-            # Construire une requête optimisée avec Q objects
-            # Utiliser toutes les clés pour vérifier toutes les commandes affichées
-            if asten_keys:
-                # Construire la requête Q par lots de 50 pour éviter les requêtes SQL trop complexes
-                # mais traiter toutes les commandes affichées
-                cyrus_commands_list = []
-                for i in range(0, len(asten_keys), 50):
-                    batch_keys = asten_keys[i:i+50]
-                    q_objects = Q()
-                    for date, numero, code in batch_keys:
-                        q_objects |= Q(date_commande=date, numero_commande=numero, code_magasin__code=code)
-                    
-                    batch_cyrus = CommandeCyrus.objects.filter(q_objects).select_related('code_magasin')
-                    cyrus_commands_list.extend(batch_cyrus)
-                
-                # Créer un dictionnaire pour lookup rapide
-                for cyrus_cmd in cyrus_commands_list:
-                    key = (cyrus_cmd.date_commande, cyrus_cmd.numero_commande, cyrus_cmd.code_magasin.code)
-                    cyrus_lookup[key] = cyrus_cmd
-        
-        # Préparer les données pour l'affichage
-        commandes_integres_list = []
-        commandes_non_integres_list = []
-        
-        for cmd_asten in commandes_asten_limited:
-            # Lookup rapide dans le dictionnaire
-            key = (cmd_asten.date_commande, cmd_asten.numero_commande, cmd_asten.code_magasin.code)
-            cmd_cyrus = cyrus_lookup.get(key)
-            
-            # Récupérer l'écart (déjà préchargé avec prefetch_related)
+        # Présence dans Cyrus et statut d'intégration calculés en SQL (EXISTS corrélé) :
+        # non intégrées en premier, puis intégrées, pagination sur l'ensemble filtré
+        commandes_asten = commandes_asten_rapprochees(
+            date_debut_parsed, date_fin_parsed, code_magasin,
+            non_integres_seulement=(show == 'non_integres'),
+        )
+        page_obj = Paginator(commandes_asten, 50).get_page(request.GET.get('page'))
+
+        commandes_data = []
+        for cmd_asten in page_obj:
             try:
                 ecart = cmd_asten.ecart
-            except:
+            except EcartCommande.DoesNotExist:
                 ecart = None
-            
-            # Si l'écart est résolu, considérer comme intégré même si pas dans Cyrus
-            # Si l'écart est quantite_0, ne pas le compter (ni intégré ni non intégré)
-            is_integre = False
-            if ecart:
-                if ecart.statut == 'resolu':
-                    is_integre = True  # Écart résolu = considéré comme intégré
-                elif ecart.statut == 'quantite_0':
-                    continue  # Écart quantite_0 = exclu de l'affichage
-                elif ecart.statut == 'ignore':
-                    is_integre = True  # Écart ignoré = considéré comme intégré
-                else:
-                    is_integre = cmd_cyrus is not None  # Écart ouvert = vérifier si dans Cyrus
-            else:
-                is_integre = cmd_cyrus is not None  # Pas d'écart = vérifier si dans Cyrus
-            
-            item = {
+            commandes_data.append({
                 'asten': cmd_asten,
-                'cyrus': cmd_cyrus,
-                'integre': is_integre,
+                'cyrus': cmd_asten.dans_cyrus,
+                'integre': cmd_asten.integre,
                 'ecart': ecart,
-            }
-            
-            # Séparer les intégrées et non intégrées
-            if is_integre:
-                commandes_integres_list.append(item)
-            else:
-                commandes_non_integres_list.append(item)
-        
-        # Mettre les non intégrées en premier, puis les intégrées (ou seulement non intégrées selon le filtre)
-        if show == 'non_integres':
-            commandes_data = commandes_non_integres_list
-        else:
-            commandes_data = commandes_non_integres_list + commandes_integres_list
+            })
         titre_tableau = "Comparaison Asten vs Cyrus"
         
     elif type_donnees == 'commandes_gpv':
-        # Récupérer les commandes GPV avec leurs statuts d'intégration
-        # IMPORTANT: Seules les commandes avec statut "Transmise" doivent être dans Cyrus
-        filtres_gpv = {}
-        filtres_cyrus = {}
-        if date_debut_parsed:
-            filtres_gpv['date_creation__gte'] = date_debut_parsed
-            filtres_cyrus['date_commande__gte'] = date_debut_parsed
-        if date_fin_parsed:
-            filtres_gpv['date_creation__lte'] = date_fin_parsed
-            filtres_cyrus['date_commande__lte'] = date_fin_parsed
-        if code_magasin:
-            # Gérer la sélection multiple de magasins
-            filtres_gpv['code_magasin__code__in'] = code_magasin
-            filtres_cyrus['code_magasin__code__in'] = code_magasin
-        
-        # Filtrer uniquement les commandes "Transmise" pour les statistiques
-        # (car seules celles-ci doivent être dans Cyrus)
-        filtres_gpv_transmise = filtres_gpv.copy()
-        filtres_gpv_transmise['statut__iexact'] = 'Transmise'
-        
-        # Calculer les statistiques avec les filtres appliqués
-        # Total GPV "Transmise" = seules celles qui doivent être dans Cyrus
-        total_gpv_transmise = CommandeGPV.objects.filter(**filtres_gpv_transmise).count()
-        total_cyrus = CommandeCyrus.objects.filter(**filtres_cyrus).count()
-        
-        # Compter les commandes réellement intégrées dans Cyrus (optimisé avec une sous-requête)
-        commandes_reellement_integres = CommandeGPV.objects.filter(**filtres_gpv_transmise).filter(
-            Exists(
-                CommandeCyrus.objects.filter(
-                    date_commande=OuterRef('date_creation'),
-                    numero_commande=OuterRef('numero_commande'),
-                    code_magasin=OuterRef('code_magasin')
-                )
-            )
-        ).count()
-        
-        # Compter les écarts avec les filtres (seulement pour les "Transmise")
-        filtres_ecarts = {}
-        if date_debut_parsed:
-            filtres_ecarts['commande_gpv__date_creation__gte'] = date_debut_parsed
-        if date_fin_parsed:
-            filtres_ecarts['commande_gpv__date_creation__lte'] = date_fin_parsed
-        if code_magasin:
-            filtres_ecarts['commande_gpv__code_magasin__code__in'] = code_magasin
-        
-        # Compter les écarts par statut
-        total_ecarts_ouverts = EcartGPV.objects.filter(**filtres_ecarts).filter(statut='ouvert').count()
-        total_ecarts_resolus = EcartGPV.objects.filter(**filtres_ecarts).filter(statut='resolu').count()
-        total_ecarts_ignores = EcartGPV.objects.filter(**filtres_ecarts).filter(statut='ignore').count()
-        total_ecarts_quantite_0 = EcartGPV.objects.filter(**filtres_ecarts).filter(statut='quantite_0').count()
-        
-        # Logique de calcul :
-        # - Les écarts "ouverts" = commandes non intégrées
-        # - Les écarts "résolus" = commandes considérées comme intégrées (même si pas encore dans Cyrus)
-        # - Les écarts "ignorés" = commandes considérées comme intégrées
-        # - Les écarts "quantite_0" = NE COMPTENT PAS dans les statistiques (exclus du total)
-        # 
-        # Total pour les statistiques = total_gpv_transmise - total_ecarts_quantite_0 (exclure les quantite_0)
-        # Commandes intégrées = total_gpv_transmise - total_ecarts_ouverts - total_ecarts_quantite_0
-        # (les écarts résolus et ignorés sont déjà comptés comme intégrés dans cette formule)
-        
-        # Exclure les commandes avec écart "quantite_0" du total affiché
-        total_gpv_pour_stats = total_gpv_transmise - total_ecarts_quantite_0
-        
-        # Commandes intégrées = total - écarts ouverts - écarts quantite_0
-        # (les écarts résolus et ignorés sont déjà dans le total, donc ils sont comptés comme intégrés)
-        commandes_integres = total_gpv_transmise - total_ecarts_ouverts - total_ecarts_quantite_0
-        commandes_non_integres = total_ecarts_ouverts
-        
-        # Calculer les taux basés sur le total sans les quantite_0
-        taux_integration = round((commandes_integres / total_gpv_pour_stats * 100) if total_gpv_pour_stats > 0 else 0, 2)
-        taux_non_integration = round((commandes_non_integres / total_gpv_pour_stats * 100) if total_gpv_pour_stats > 0 else 0, 2)
-        
-        # Normaliser les statistiques pour correspondre au template
-        # Utiliser total_gpv_pour_stats pour exclure les quantite_0 du total affiché
-        stats = {
-            'total_source': total_gpv_pour_stats,  # Total sans les quantite_0
-            'total_target': total_cyrus,
-            'integres': commandes_integres,  # Seulement les "Transmise" intégrées
-            'non_integres': commandes_non_integres,  # Calcul réel : total - intégrées
-            'taux_integration': taux_integration,
-            'taux_non_integration': taux_non_integration,
-        }
-        
-        # Optimiser les requêtes : précharger les écarts
-        commandes_gpv = CommandeGPV.objects.filter(**filtres_gpv).select_related('code_magasin').prefetch_related(
-            Prefetch('ecart', queryset=EcartGPV.objects.all())
-        ).order_by('-date_creation', 'numero_commande')
-        
-        # Limiter le nombre de commandes pour l'affichage (pagination implicite)
-        # Charger seulement les 200 premières pour améliorer les performances
-        commandes_gpv_limited = list(commandes_gpv[:200])
-        
-        # Créer un dictionnaire des commandes Cyrus pour lookup rapide
-        # Filtrer seulement les commandes "Transmise" pour le lookup Cyrus
-        cyrus_lookup = {}
-        cyrus_pair_lookup = set()
-        commandes_transmise = [cmd for cmd in commandes_gpv_limited if (cmd.statut or '').strip().upper() in ['TRANSMISE', 'TRANSMIS']]
-        if commandes_transmise:
-            # Récupérer les clés uniques des commandes GPV transmises
-            gpv_keys = []
-            gpv_pairs = []
-            for cmd in commandes_transmise:
-                gpv_keys.append((cmd.date_creation, cmd.numero_commande, cmd.code_magasin.code))
-                gpv_pairs.append((cmd.numero_commande, cmd.code_magasin.code))
-            
-            # Construire une requête optimisée avec Q objects
-            # Utiliser toutes les clés pour vérifier toutes les commandes affichées
-            if gpv_keys:
-                # Construire la requête Q par lots de 50 pour éviter les requêtes SQL trop complexes
-                # mais traiter toutes les commandes affichées
-                cyrus_commands_list = []
-                for i in range(0, len(gpv_keys), 50):
-                    batch_keys = gpv_keys[i:i+50]
-                    q_objects = Q()
-                    for date, numero, code in batch_keys:
-                        q_objects |= Q(date_commande=date, numero_commande=numero, code_magasin__code=code)
-                    
-                    batch_cyrus = CommandeCyrus.objects.filter(q_objects).select_related('code_magasin')
-                    cyrus_commands_list.extend(batch_cyrus)
-                
-                for cyrus_cmd in cyrus_commands_list:
-                    key = (cyrus_cmd.date_commande, cyrus_cmd.numero_commande, cyrus_cmd.code_magasin.code)
-                    cyrus_lookup[key] = cyrus_cmd
-            
-            # Lookup fallback : numéro + magasin (date différente)
-            if gpv_pairs:
-                gpv_pairs = list({pair for pair in gpv_pairs})
-                cyrus_pairs_list = []
-                for i in range(0, len(gpv_pairs), 50):
-                    batch_pairs = gpv_pairs[i:i+50]
-                    q_objects = Q()
-                    for numero, code in batch_pairs:
-                        q_objects |= Q(numero_commande=numero, code_magasin__code=code)
-                    if q_objects:
-                        cyrus_pairs_list.extend(
-                            CommandeCyrus.objects.filter(q_objects).select_related('code_magasin')
-                        )
-                for cyrus_cmd in cyrus_pairs_list:
-                    cyrus_pair_lookup.add((cyrus_cmd.numero_commande, cyrus_cmd.code_magasin.code))
-        
-        # Préparer les données pour l'affichage
-        commandes_integres_list = []
-        commandes_non_integres_list = []
-        
-        for cmd_gpv in commandes_gpv_limited:
-            # Normaliser le statut
-            statut_gpv = (cmd_gpv.statut or '').strip().upper()
-            doit_etre_dans_cyrus = (statut_gpv == 'TRANSMISE' or statut_gpv == 'TRANSMIS')
-            
-            # Vérifier si intégrée dans Cyrus (lookup rapide dans le dictionnaire)
-            cmd_cyrus = None
-            if doit_etre_dans_cyrus:
-                key = (cmd_gpv.date_creation, cmd_gpv.numero_commande, cmd_gpv.code_magasin.code)
-                cmd_cyrus = cyrus_lookup.get(key)
-                if cmd_cyrus is None:
-                    pair_key = (cmd_gpv.numero_commande, cmd_gpv.code_magasin.code)
-                    if pair_key in cyrus_pair_lookup:
-                        cmd_cyrus = True
-            
-            # Récupérer l'écart (déjà préchargé avec prefetch_related)
+        # Présence dans Cyrus (numéro + magasin) et statut d'intégration calculés en SQL,
+        # non intégrées en premier, pagination sur l'ensemble filtré
+        commandes_gpv = commandes_gpv_rapprochees(
+            date_debut_parsed, date_fin_parsed, code_magasin,
+            non_integres_seulement=(show == 'non_integres'),
+        )
+        page_obj = Paginator(commandes_gpv, 50).get_page(request.GET.get('page'))
+
+        commandes_data = []
+        for cmd_gpv in page_obj:
+            # L'écart n'a de sens que pour les commandes qui doivent être dans Cyrus
             ecart = None
-            if doit_etre_dans_cyrus:
+            if cmd_gpv.doit_etre_dans_cyrus:
                 try:
                     ecart = cmd_gpv.ecart
-                except:
+                except EcartGPV.DoesNotExist:
                     ecart = None
-            
-            # Si l'écart est résolu, considérer comme intégré même si pas dans Cyrus
-            # Si l'écart est quantite_0, ne pas le compter (ni intégré ni non intégré)
-            is_integre = False
-            if doit_etre_dans_cyrus:
-                if ecart:
-                    if ecart.statut == 'resolu':
-                        is_integre = True  # Écart résolu = considéré comme intégré
-                    elif ecart.statut == 'quantite_0':
-                        continue  # Écart quantite_0 = exclu de l'affichage
-                    elif ecart.statut == 'ignore':
-                        is_integre = True  # Écart ignoré = considéré comme intégré
-                    else:
-                        is_integre = cmd_cyrus is not None  # Écart ouvert = vérifier si dans Cyrus
-                else:
-                    is_integre = cmd_cyrus is not None  # Pas d'écart = vérifier si dans Cyrus
-            else:
-                # Si le statut n'est pas "Transmise", ne pas créer d'écart et considérer comme intégré
-                is_integre = True
-            
-            item = {
+            commandes_data.append({
                 'gpv': cmd_gpv,
-                'cyrus': cmd_cyrus,
-                'integre': is_integre,
+                'cyrus': cmd_gpv.doit_etre_dans_cyrus and cmd_gpv.dans_cyrus,
+                'integre': cmd_gpv.integre,
                 'ecart': ecart,
-                'doit_etre_dans_cyrus': doit_etre_dans_cyrus,
-            }
-            
-            # Séparer les intégrées et non intégrées
-            if is_integre:
-                commandes_integres_list.append(item)
-            else:
-                commandes_non_integres_list.append(item)
-        
-        # Mettre les non intégrées en premier, puis les intégrées (ou seulement non intégrées selon le filtre)
-        if show == 'non_integres':
-            commandes_data = commandes_non_integres_list
-        else:
-            commandes_data = commandes_non_integres_list + commandes_integres_list
+                'doit_etre_dans_cyrus': cmd_gpv.doit_etre_dans_cyrus,
+            })
         titre_tableau = "Comparaison GPV vs Cyrus"
         
     elif type_donnees == 'commandes_legend':
@@ -520,62 +242,6 @@ def dashboard(request):
         if date_fin_parsed:
             filtres_legend['date_commande__lte'] = date_fin_parsed
 
-        # Statistiques basées uniquement sur les commandes exportées
-        total_legend_exportee = CommandeLegend.objects.filter(exportee=True, **filtres_legend).count()
-
-        # Total Cyrus sur la même période (comparaison sans code magasin)
-        filtres_cyrus = {}
-        if date_debut_parsed:
-            filtres_cyrus['date_commande__gte'] = date_debut_parsed
-        if date_fin_parsed:
-            filtres_cyrus['date_commande__lte'] = date_fin_parsed
-        total_cyrus = CommandeCyrus.objects.filter(**filtres_cyrus).count()
-
-        # Compter les écarts Legend par statut
-        filtres_ecarts = {'commande_legend__exportee': True}
-        if date_debut_parsed:
-            filtres_ecarts['commande_legend__date_commande__gte'] = date_debut_parsed
-        if date_fin_parsed:
-            filtres_ecarts['commande_legend__date_commande__lte'] = date_fin_parsed
-        
-        total_ecarts_ouverts = EcartLegend.objects.filter(**filtres_ecarts).filter(statut='ouvert').count()
-        total_ecarts_resolus = EcartLegend.objects.filter(**filtres_ecarts).filter(statut='resolu').count()
-        total_ecarts_ignores = EcartLegend.objects.filter(**filtres_ecarts).filter(statut='ignore').count()
-        total_ecarts_quantite_0 = EcartLegend.objects.filter(**filtres_ecarts).filter(statut='quantite_0').count()
-        
-        # Logique de calcul :
-        # - Les écarts "ouverts" = commandes non intégrées
-        # - Les écarts "résolus" = commandes considérées comme intégrées (même si pas encore dans Cyrus)
-        # - Les écarts "ignorés" = commandes considérées comme intégrées
-        # - Les écarts "quantite_0" = NE COMPTENT PAS dans les statistiques (exclus du total)
-        # 
-        # Total pour les statistiques = total_legend_exportee - total_ecarts_quantite_0 (exclure les quantite_0)
-        # Commandes intégrées = total_legend_exportee - total_ecarts_ouverts - total_ecarts_quantite_0
-        # (les écarts résolus et ignorés sont déjà comptés comme intégrés dans cette formule)
-        
-        # Exclure les commandes avec écart "quantite_0" du total affiché
-        total_legend_pour_stats = total_legend_exportee - total_ecarts_quantite_0
-        
-        # Commandes intégrées = total - écarts ouverts - écarts quantite_0
-        # (les écarts résolus et ignorés sont déjà dans le total, donc ils sont comptés comme intégrés)
-        commandes_integres = total_legend_exportee - total_ecarts_ouverts - total_ecarts_quantite_0
-        commandes_non_integres = total_ecarts_ouverts
-
-        # Calculer les taux basés sur le total sans les quantite_0
-        taux_integration = round((commandes_integres / total_legend_pour_stats * 100) if total_legend_pour_stats > 0 else 0, 2)
-        taux_non_integration = round((commandes_non_integres / total_legend_pour_stats * 100) if total_legend_pour_stats > 0 else 0, 2)
-
-        # Normaliser les statistiques pour correspondre au template
-        # Utiliser total_legend_pour_stats pour exclure les quantite_0 du total affiché
-        stats = {
-            'total_source': total_legend_pour_stats,  # Total sans les quantite_0
-            'total_target': total_cyrus,
-            'integres': commandes_integres,
-            'non_integres': commandes_non_integres,
-            'taux_integration': taux_integration,
-            'taux_non_integration': taux_non_integration,
-        }
-
         # Préparer les données pour l'affichage
         commandes_legend = CommandeLegend.objects.filter(**filtres_legend).prefetch_related(
             Prefetch('ecart', queryset=EcartLegend.objects.all())
@@ -677,63 +343,11 @@ def dashboard(request):
         
     elif type_donnees == 'factures':
         # TODO: À implémenter quand les modèles Factures seront créés
-        stats = {
-            'total_source': 0,
-            'total_target': 0,
-            'integres': 0,
-            'non_integres': 0,
-            'taux_integration': 0,
-            'taux_non_integration': 0,
-        }
         titre_tableau = "Comparaison Factures Asten vs Cyrus"
         
     elif type_donnees == 'br':
         # BR ASTEN (statut IC fourni dans le fichier)
-        # IMPORTANT: Les statistiques en haut affichent TOUJOURS le total global (sans filtre de date)
         # Par défaut, on affiche tous les BR non intégrés (sans filtre de date)
-        
-        # Calculer les statistiques GLOBALES (sans filtre de date) pour l'affichage en haut
-        filtres_br_global = {}
-        if code_magasin:
-            filtres_br_global['code_magasin__code__in'] = code_magasin
-        
-        br_queryset_global = BRAsten.objects.filter(**filtres_br_global)
-        br_quantite_0_global = br_queryset_global.filter(
-            Q(statut_ic__icontains='Quantité 0') | 
-            Q(statut_ic__icontains='quantite_0') |
-            Q(statut_ic__icontains='Quantite 0')
-        ).count()
-        
-        total_asten_global = br_queryset_global.count()
-        total_asten_pour_stats_global = total_asten_global - br_quantite_0_global
-        
-        br_trouvees_count_global = br_queryset_global.filter(ic_integre=True).exclude(
-            Q(statut_ic__icontains='Quantité 0') | 
-            Q(statut_ic__icontains='quantite_0') |
-            Q(statut_ic__icontains='Quantite 0')
-        ).count()
-        br_non_trouvees_count_global = br_queryset_global.filter(ic_integre=False).exclude(
-            Q(statut_ic__icontains='Quantité 0') | 
-            Q(statut_ic__icontains='quantite_0') |
-            Q(statut_ic__icontains='Quantite 0')
-        ).count()
-
-        # Calculer les taux basés sur le total global
-        # Utiliser plus de décimales pour les petits pourcentages
-        taux_integration_global = round((br_trouvees_count_global / total_asten_pour_stats_global * 100) if total_asten_pour_stats_global > 0 else 0, 3)
-        taux_non_integration_global = round((br_non_trouvees_count_global / total_asten_pour_stats_global * 100) if total_asten_pour_stats_global > 0 else 0, 3)
-
-        # Statistiques globales pour l'affichage en haut
-        stats = {
-            'total_source': total_asten_pour_stats_global,  # Total global sans les quantite_0
-            'total_target': br_trouvees_count_global,
-            'integres': br_trouvees_count_global,
-            'non_integres': br_non_trouvees_count_global,
-            'trouvees': br_trouvees_count_global,
-            'non_trouvees': br_non_trouvees_count_global,
-            'taux_integration': taux_integration_global,
-            'taux_non_integration': taux_non_integration_global,
-        }
 
         # Pour les tableaux : TOUJOURS afficher tous les BR non intégrés par défaut (SANS filtre de date)
         # Même si une période est sélectionnée, on affiche tous les BR non intégrés
@@ -764,34 +378,129 @@ def dashboard(request):
             br_non_trouvees = br_queryset_base.filter(ic_integre=False).select_related('code_magasin').order_by('-date_br', 'numero_br')[:200]
         commandes_data = []
         titre_tableau = "BR ASTEN (Statut IC)"
-    
+
+    return {
+        'commandes': commandes_data,
+        'page_obj': page_obj,
+        'br_trouvees': br_trouvees,
+        'br_non_trouvees': br_non_trouvees,
+        'titre_tableau': titre_tableau,
+        'statut_ic': statut_ic,
+    }
+
+
+async def dashboard(request):
+    """
+    Vue principale du dashboard (asynchrone) : le tableau est calculé dans un thread du pool ;
+    les cartes de statistiques ne sont calculées que si leur fragment n'est pas en cache.
+    """
+    await sync_to_async(_actualiser_dashboard)(request)
+    filtres = _filtres_dashboard(request)
+    type_donnees = filtres['type_donnees']
+    version_donnees = await sync_to_async(get_cle_cache_donnees)()
+
+    # Cartes calculées à la lecture, donc seulement si le fragment {% cache ... dashboard_stats ... %}
+    # n'est pas en cache (durée et hit / miss mesurés par la balise, templatetags/cache_mesure.py)
+    stats = SimpleLazyObject(lambda: _stats_dashboard(filtres))
+    tableau = (await calculer_en_parallele({'tableau': lambda: _tableau_dashboard(request, filtres)}, request))['tableau']
+
+    # Paramètres GET à conserver dans les liens de pagination
+    parametres_pagination = request.GET.copy()
+    parametres_pagination.pop('page', None)
+    querystring_pagination = parametres_pagination.urlencode()
+
     context = {
         'stats': stats,
-        'commandes': commandes_data,
-        'br_trouvees': br_trouvees if type_donnees == 'br' else None,
-        'br_non_trouvees': br_non_trouvees if type_donnees == 'br' else None,
-        'magasins': magasins,
+        'version_donnees': version_donnees,
+        'duree_cache_fragments': settings.CACHE_FRAGMENTS_DUREE,
+        'commandes': tableau['commandes'],
+        'page_obj': tableau['page_obj'],
+        'querystring_pagination': querystring_pagination,
+        'br_trouvees': tableau['br_trouvees'],
+        'br_non_trouvees': tableau['br_non_trouvees'],
+        # Liste des magasins pour le filtre
+        'magasins': Magasin.objects.all().order_by('code'),
         'type_donnees': type_donnees,
-        'titre_tableau': titre_tableau,
+        'titre_tableau': tableau['titre_tableau'],
         'stats_label_source': 'Asten' if type_donnees in ['commandes_asten', 'br'] else 'Source',
         'stats_label_target': 'IC' if type_donnees == 'br' else 'Cyrus',
         'filtres': {
-            'date_debut': date_debut or '',
-            'date_fin': date_fin or '',
-            'magasin': code_magasin if code_magasin else [],
+            'date_debut': filtres['date_debut'] or '',
+            'date_fin': filtres['date_fin'] or '',
+            'magasin': filtres['code_magasin'] if filtres['code_magasin'] else [],
             'type_donnees': type_donnees,
-            'statut_ic': statut_ic if type_donnees == 'br' else '',
+            'statut_ic': tableau['statut_ic'] if type_donnees == 'br' else '',
         },
-        'periode': periode,
-        'show': show,
+        'periode': filtres['periode'],
+        'show': filtres['show'],
     }
-    
-    return render(request, 'dashboard/dashboard.html', context)
+
+    # Rendu synchrone : les querysets restants (magasins, BR) sont évalués dans le template
+    return await sync_to_async(render)(request, 'dashboard/dashboard.html', context)
 
 
-def accueil(request):
-    """Vue d'accueil affichant toutes les statistiques en un coup d'œil"""
-    from django.db.models import Q, Exists, OuterRef
+def _stats_accueil(fonction_statistiques, date_debut, date_fin):
+    """Statistiques d'une source au format des cartes de l'accueil"""
+    try:
+        stats = fonction_statistiques(date_debut, date_fin)
+    except Exception:
+        return {'total': 0, 'integres': 0, 'non_integres': 0, 'taux_integration': 0, 'taux_non_integration': 0}
+    return {
+        'total': stats['total_source'],
+        'integres': stats['integres'],
+        'non_integres': stats['non_integres'],
+        'taux_integration': stats['taux_integration'],
+        'taux_non_integration': stats['taux_non_integration'],
+    }
+
+
+def _stats_remontees(date_debut, date_fin):
+    """Répartition des remontées (tickets) par statut sur la période, en une requête d'agrégat"""
+    try:
+        filtres_remontees = {}
+        if date_debut:
+            filtres_remontees['date_creation__date__gte'] = date_debut
+        if date_fin:
+            filtres_remontees['date_creation__date__lte'] = date_fin
+
+        comptes = Ticket.objects.filter(**filtres_remontees).aggregate(
+            total=Count('id'),
+            resolu=Count('id', filter=Q(statut=Ticket.STATUT_RESOLU)),
+            en_cours=Count('id', filter=Q(statut=Ticket.STATUT_EN_COURS)),
+            en_attente=Count('id', filter=Q(statut=Ticket.STATUT_EN_ATTENTE)),
+            ferme=Count('id', filter=Q(statut=Ticket.STATUT_FERME)),
+        )
+        total_remontees = comptes['total']
+        resolu_remontees = comptes['resolu']
+        non_resolu_remontees = total_remontees - resolu_remontees - comptes['ferme']
+        taux_resolu_remontees = round((resolu_remontees / total_remontees * 100) if total_remontees > 0 else 0, 2)
+        return {
+            'total': total_remontees,
+            'resolu': resolu_remontees,
+            'en_cours': comptes['en_cours'],
+            'en_attente': comptes['en_attente'],
+            'ferme': comptes['ferme'],
+            'non_resolu': non_resolu_remontees,
+            'taux_resolu': taux_resolu_remontees,
+        }
+    except Exception:
+        return {
+            'total': 0,
+            'resolu': 0,
+            'en_cours': 0,
+            'en_attente': 0,
+            'ferme': 0,
+            'non_resolu': 0,
+            'taux_resolu': 0,
+            'taux_non_resolu': 0
+        }
+
+
+async def accueil(request):
+    """
+    Vue d'accueil affichant toutes les statistiques en un coup d'œil (asynchrone) : les cartes
+    Asten, GPV, Legend et BR ne sont calculées que si leur fragment n'est pas en cache.
+    """
     from datetime import datetime, timedelta
     from django.utils import timezone
     
@@ -836,201 +545,45 @@ def accueil(request):
             except:
                 date_fin = None
     
-    # Calculer les statistiques pour chaque type de données
-    stats_asten = {}
-    stats_gpv = {}
-    stats_legend = {}
-    stats_br = {}
-    stats_factures = {}
-    
-    # ASTEN
-    try:
-        filtres_asten = {}
-        if date_debut:
-            filtres_asten['date_commande__gte'] = date_debut
-        if date_fin:
-            filtres_asten['date_commande__lte'] = date_fin
-        
-        total_asten = CommandeAsten.objects.filter(**filtres_asten).count()
-        
-        filtres_ecarts_asten = {}
-        if date_debut:
-            filtres_ecarts_asten['commande_asten__date_commande__gte'] = date_debut
-        if date_fin:
-            filtres_ecarts_asten['commande_asten__date_commande__lte'] = date_fin
-        
-        total_ecarts_ouverts_asten = EcartCommande.objects.filter(**filtres_ecarts_asten).filter(statut='ouvert').count()
-        total_ecarts_quantite_0_asten = EcartCommande.objects.filter(**filtres_ecarts_asten).filter(statut='quantite_0').count()
-        total_asten_pour_stats = total_asten - total_ecarts_quantite_0_asten
-        commandes_integres_asten = total_asten - total_ecarts_ouverts_asten - total_ecarts_quantite_0_asten
-        commandes_non_integres_asten = total_ecarts_ouverts_asten
-        taux_integration_asten = round((commandes_integres_asten / total_asten_pour_stats * 100) if total_asten_pour_stats > 0 else 0, 2)
-        taux_non_integration_asten = round((commandes_non_integres_asten / total_asten_pour_stats * 100) if total_asten_pour_stats > 0 else 0, 2)
-        stats_asten = {
-            'total': total_asten_pour_stats,
-            'integres': commandes_integres_asten,
-            'non_integres': commandes_non_integres_asten,
-            'taux_integration': taux_integration_asten,
-            'taux_non_integration': taux_non_integration_asten,
-        }
-    except:
-        stats_asten = {'total': 0, 'integres': 0, 'non_integres': 0, 'taux_integration': 0, 'taux_non_integration': 0}
-    
-    # GPV
-    try:
-        filtres_gpv = {'statut__iexact': 'Transmise'}
-        if date_debut:
-            filtres_gpv['date_creation__gte'] = date_debut
-        if date_fin:
-            filtres_gpv['date_creation__lte'] = date_fin
-        
-        total_gpv_transmise = CommandeGPV.objects.filter(**filtres_gpv).count()
-        
-        filtres_ecarts_gpv = {}
-        if date_debut:
-            filtres_ecarts_gpv['commande_gpv__date_creation__gte'] = date_debut
-        if date_fin:
-            filtres_ecarts_gpv['commande_gpv__date_creation__lte'] = date_fin
-        
-        total_ecarts_ouverts_gpv = EcartGPV.objects.filter(**filtres_ecarts_gpv).filter(statut='ouvert').count()
-        total_ecarts_quantite_0_gpv = EcartGPV.objects.filter(**filtres_ecarts_gpv).filter(statut='quantite_0').count()
-        total_gpv_pour_stats = total_gpv_transmise - total_ecarts_quantite_0_gpv
-        commandes_integres_gpv = total_gpv_transmise - total_ecarts_ouverts_gpv - total_ecarts_quantite_0_gpv
-        commandes_non_integres_gpv = total_ecarts_ouverts_gpv
-        taux_integration_gpv = round((commandes_integres_gpv / total_gpv_pour_stats * 100) if total_gpv_pour_stats > 0 else 0, 2)
-        taux_non_integration_gpv = round((commandes_non_integres_gpv / total_gpv_pour_stats * 100) if total_gpv_pour_stats > 0 else 0, 2)
-        stats_gpv = {
-            'total': total_gpv_pour_stats,
-            'integres': commandes_integres_gpv,
-            'non_integres': commandes_non_integres_gpv,
-            'taux_integration': taux_integration_gpv,
-            'taux_non_integration': taux_non_integration_gpv,
-        }
-    except:
-        stats_gpv = {'total': 0, 'integres': 0, 'non_integres': 0, 'taux_integration': 0, 'taux_non_integration': 0}
-    
-    # LEGEND
-    try:
-        filtres_legend = {'exportee': True}
-        if date_debut:
-            filtres_legend['date_commande__gte'] = date_debut
-        if date_fin:
-            filtres_legend['date_commande__lte'] = date_fin
-        
-        total_legend_exportee = CommandeLegend.objects.filter(**filtres_legend).count()
-        
-        filtres_ecarts_legend = {'commande_legend__exportee': True}
-        if date_debut:
-            filtres_ecarts_legend['commande_legend__date_commande__gte'] = date_debut
-        if date_fin:
-            filtres_ecarts_legend['commande_legend__date_commande__lte'] = date_fin
-        
-        total_ecarts_ouverts_legend = EcartLegend.objects.filter(**filtres_ecarts_legend).filter(statut='ouvert').count()
-        total_ecarts_quantite_0_legend = EcartLegend.objects.filter(**filtres_ecarts_legend).filter(statut='quantite_0').count()
-        total_legend_pour_stats = total_legend_exportee - total_ecarts_quantite_0_legend
-        commandes_integres_legend = total_legend_exportee - total_ecarts_ouverts_legend - total_ecarts_quantite_0_legend
-        commandes_non_integres_legend = total_ecarts_ouverts_legend
-        taux_integration_legend = round((commandes_integres_legend / total_legend_pour_stats * 100) if total_legend_pour_stats > 0 else 0, 2)
-        taux_non_integration_legend = round((commandes_non_integres_legend / total_legend_pour_stats * 100) if total_legend_pour_stats > 0 else 0, 2)
-        stats_legend = {
-            'total': total_legend_pour_stats,
-            'integres': commandes_integres_legend,
-            'non_integres': commandes_non_integres_legend,
-            'taux_integration': taux_integration_legend,
-            'taux_non_integration': taux_non_integration_legend,
-        }
-    except:
-        stats_legend = {'total': 0, 'integres': 0, 'non_integres': 0, 'taux_integration': 0, 'taux_non_integration': 0}
-    
-    # BR
-    try:
-        filtres_br = {}
-        if date_debut:
-            filtres_br['date_br__gte'] = date_debut
-        if date_fin:
-            filtres_br['date_br__lte'] = date_fin
-        
-        br_quantite_0 = BRAsten.objects.filter(**filtres_br).filter(
-            Q(statut_ic__icontains='Quantité 0') | 
-            Q(statut_ic__icontains='quantite_0') |
-            Q(statut_ic__icontains='Quantite 0')
-        ).count()
-        total_br = BRAsten.objects.filter(**filtres_br).count()
-        total_br_pour_stats = total_br - br_quantite_0
-        br_trouvees = BRAsten.objects.filter(**filtres_br, ic_integre=True).exclude(
-            Q(statut_ic__icontains='Quantité 0') | 
-            Q(statut_ic__icontains='quantite_0') |
-            Q(statut_ic__icontains='Quantite 0')
-        ).count()
-        br_non_trouvees = BRAsten.objects.filter(**filtres_br, ic_integre=False).exclude(
-            Q(statut_ic__icontains='Quantité 0') | 
-            Q(statut_ic__icontains='quantite_0') |
-            Q(statut_ic__icontains='Quantite 0')
-        ).count()
-        taux_integration_br = round((br_trouvees / total_br_pour_stats * 100) if total_br_pour_stats > 0 else 0, 2)
-        taux_non_integration_br = round((br_non_trouvees / total_br_pour_stats * 100) if total_br_pour_stats > 0 else 0, 2)
-        stats_br = {
-            'total': total_br_pour_stats,
-            'integres': br_trouvees,
-            'non_integres': br_non_trouvees,
-            'taux_integration': taux_integration_br,
-            'taux_non_integration': taux_non_integration_br,
-        }
-    except:
-        stats_br = {'total': 0, 'integres': 0, 'non_integres': 0, 'taux_integration': 0, 'taux_non_integration': 0}
-    
+    date_debut_str = date_debut.strftime('%Y-%m-%d') if date_debut else ''
+    date_fin_str = date_fin.strftime('%Y-%m-%d') if date_fin else ''
+    version_donnees = await sync_to_async(get_cle_cache_donnees)()
+
+    # Statistiques de chaque type de données, calculées à la lecture : une carte servie depuis le
+    # cache des fragments n'est pas recalculée (valeur paresseuse jamais lue par le template).
+    # Durée et hit / miss de chaque carte mesurés par la balise {% cache %} (templatetags/cache_mesure.py)
+    stats_sources = {
+        source: SimpleLazyObject(partial(_stats_accueil, fonction_statistiques, date_debut, date_fin))
+        for source, fonction_statistiques in (
+            ('asten', statistiques_asten),
+            ('gpv', statistiques_gpv),
+            ('legend', statistiques_legend),
+            ('br', statistiques_br),
+        )
+    }
+    # REMONTÉES (Tickets) : pas de fragment en cache, toujours calculées
+    stats_sources.update(await calculer_en_parallele(
+        {'remontees': partial(_stats_remontees, date_debut, date_fin)}, request
+    ))
+
     # FACTURES (pour l'instant vide, à implémenter plus tard)
     stats_factures = {'total': 0, 'integres': 0, 'non_integres': 0, 'taux_integration': 0, 'taux_non_integration': 0}
-    
-    # REMONTÉES (Tickets)
-    try:
-        filtres_remontees = {}
-        if date_debut:
-            filtres_remontees['date_creation__date__gte'] = date_debut
-        if date_fin:
-            filtres_remontees['date_creation__date__lte'] = date_fin
-        
-        total_remontees = Ticket.objects.filter(**filtres_remontees).count()
-        resolu_remontees = Ticket.objects.filter(**filtres_remontees, statut=Ticket.STATUT_RESOLU).count()
-        en_cours_remontees = Ticket.objects.filter(**filtres_remontees, statut=Ticket.STATUT_EN_COURS).count()
-        en_attente_remontees = Ticket.objects.filter(**filtres_remontees, statut=Ticket.STATUT_EN_ATTENTE).count()
-        ferme_remontees = Ticket.objects.filter(**filtres_remontees, statut=Ticket.STATUT_FERME).count()
-        non_resolu_remontees = total_remontees - resolu_remontees - ferme_remontees
-        taux_resolu_remontees = round((resolu_remontees / total_remontees * 100) if total_remontees > 0 else 0, 2)
-        stats_remontees = {
-            'total': total_remontees,
-            'resolu': resolu_remontees,
-            'en_cours': en_cours_remontees,
-            'en_attente': en_attente_remontees,
-            'ferme': ferme_remontees,
-            'non_resolu': non_resolu_remontees,
-            'taux_resolu': taux_resolu_remontees,
-        }
-    except:
-        stats_remontees = {
-            'total': 0, 
-            'resolu': 0, 
-            'en_cours': 0, 
-            'en_attente': 0, 
-            'ferme': 0, 
-            'non_resolu': 0, 
-            'taux_resolu': 0,
-            'taux_non_resolu': 0
-        }
-    
+
     context = {
-        'stats_asten': stats_asten,
-        'stats_gpv': stats_gpv,
-        'stats_legend': stats_legend,
-        'stats_br': stats_br,
+        'version_donnees': version_donnees,
+        'duree_cache_fragments': settings.CACHE_FRAGMENTS_DUREE,
+        'stats_asten': stats_sources['asten'],
+        'stats_gpv': stats_sources['gpv'],
+        'stats_legend': stats_sources['legend'],
+        'stats_br': stats_sources['br'],
         'stats_factures': stats_factures,
-        'stats_remontees': stats_remontees,
+        'stats_remontees': stats_sources['remontees'],
         'periode': periode,
-        'date_debut': date_debut.strftime('%Y-%m-%d') if date_debut else '',
-        'date_fin': date_fin.strftime('%Y-%m-%d') if date_fin else '',
+        'date_debut': date_debut_str,
+        'date_fin': date_fin_str,
     }
-    
-    return render(request, 'dashboard/accueil.html', context)
+
+    return await sync_to_async(render)(request, 'dashboard/accueil.html', context)
 
 
 @require_http_methods(["POST"])
@@ -1112,6 +665,7 @@ def detail_ecart(request, ecart_id):
                 if commentaire:
                     ecart.commentaire = commentaire
                 ecart.save()
+                enregistrer_modification_manuelle()
                 
                 if nouveau_statut == 'resolu':
                     messages.success(request, "L'écart a été marqué comme résolu. La commande sera comptée comme intégrée. Les pourcentages seront mis à jour sur le dashboard.")
@@ -1148,191 +702,13 @@ def liste_ecarts(request):
     date_debut_parsed = parse_date(date_debut) if date_debut else None
     date_fin_parsed = parse_date(date_fin) if date_fin else None
     
-    # Construire les filtres pour Asten
-    filtres_asten = {}
-    filtres_gpv = {}
-    filtres_legend = {}
-    
-    # Filtrer par statut seulement si un statut spécifique est sélectionné
-    if statut and statut != '':
-        filtres_asten['statut'] = statut
-        filtres_gpv['statut'] = statut
-        filtres_legend['statut'] = statut
-    
-    if date_debut_parsed:
-        filtres_asten['commande_asten__date_commande__gte'] = date_debut_parsed
-        filtres_gpv['commande_gpv__date_creation__gte'] = date_debut_parsed
-        filtres_legend['commande_legend__date_commande__gte'] = date_debut_parsed
-    if date_fin_parsed:
-        filtres_asten['commande_asten__date_commande__lte'] = date_fin_parsed
-        filtres_gpv['commande_gpv__date_creation__lte'] = date_fin_parsed
-        filtres_legend['commande_legend__date_commande__lte'] = date_fin_parsed
-    if code_magasin:
-        filtres_asten['commande_asten__code_magasin__code'] = code_magasin
-        filtres_gpv['commande_gpv__code_magasin__code'] = code_magasin
-    
-    # Récupérer les écarts Asten (exclure les résolus)
-    filtres_asten_exclus = filtres_asten.copy()
-    if not statut or statut == '':
-        # Par défaut, exclure les écarts résolus
-        filtres_asten_exclus['statut__in'] = ['ouvert', 'ignore']
-    ecarts_asten = EcartCommande.objects.filter(**filtres_asten_exclus).select_related(
-        'commande_asten__code_magasin'
-    ).order_by('-date_creation')
-    
-    # Récupérer les écarts GPV (exclure les résolus)
-    filtres_gpv_exclus = filtres_gpv.copy()
-    if not statut or statut == '':
-        # Par défaut, exclure les écarts résolus
-        filtres_gpv_exclus['statut__in'] = ['ouvert', 'ignore']
-    ecarts_gpv = EcartGPV.objects.filter(**filtres_gpv_exclus).select_related(
-        'commande_gpv__code_magasin'
-    ).order_by('-date_creation')
-
-    # Récupérer les écarts Legend (exclure les résolus)
-    filtres_legend_exclus = filtres_legend.copy()
-    if not statut or statut == '':
-        # Par défaut, exclure les écarts résolus
-        filtres_legend_exclus['statut__in'] = ['ouvert', 'ignore']
-    ecarts_legend = EcartLegend.objects.filter(**filtres_legend_exclus).select_related(
-        'commande_legend'
-    ).order_by('-date_creation')
-    
-    
-    # Combiner les écarts avec un indicateur de type
-    # Exclure les écarts résolus automatiquement (statut "resolu" ET commande existe dans Cyrus)
-    ecarts_combined = []
-    
-    for ecart in ecarts_asten:
-        # Vérifier si la commande existe dans Cyrus
-        existe_cyrus = CommandeCyrus.objects.filter(
-            date_commande=ecart.commande_asten.date_commande,
-            numero_commande=ecart.commande_asten.numero_commande,
-            code_magasin=ecart.commande_asten.code_magasin
-        ).exists()
-        
-        # Ne pas afficher les écarts résolus automatiquement (résolu ET existe dans Cyrus)
-        # Afficher seulement : ouverts, ignorés, et résolus manuellement (résolu mais n'existe pas dans Cyrus)
-        if ecart.statut == 'resolu' and existe_cyrus:
-            # Écart résolu automatiquement, ne pas l'afficher
-            continue
-        
-        ecarts_combined.append({
-            'type': 'asten',
-            'ecart': ecart,
-            'id': ecart.id,
-            'date_commande': ecart.commande_asten.date_commande,
-            'numero_commande': ecart.commande_asten.numero_commande,
-            'code_magasin': ecart.commande_asten.code_magasin,
-            'montant': ecart.commande_asten.montant,
-            'date_creation': ecart.date_creation,
-            'statut': ecart.statut,
-        })
-    
-    for ecart in ecarts_gpv:
-        # Vérifier si la commande existe dans Cyrus
-        existe_cyrus = CommandeCyrus.objects.filter(
-            Q(date_commande=ecart.commande_gpv.date_creation) |
-            Q(numero_commande=ecart.commande_gpv.numero_commande, code_magasin=ecart.commande_gpv.code_magasin),
-            numero_commande=ecart.commande_gpv.numero_commande,
-            code_magasin=ecart.commande_gpv.code_magasin
-        ).exists()
-        
-        # Ne pas afficher les écarts résolus automatiquement (résolu ET existe dans Cyrus)
-        # Afficher seulement : ouverts, ignorés, et résolus manuellement (résolu mais n'existe pas dans Cyrus)
-        if ecart.statut == 'resolu' and existe_cyrus:
-            # Écart résolu automatiquement, ne pas l'afficher
-            continue
-        
-        ecarts_combined.append({
-            'type': 'gpv',
-            'ecart': ecart,
-            'id': ecart.id,
-            'date_commande': ecart.commande_gpv.date_creation,  # Utiliser date_creation pour GPV
-            'numero_commande': ecart.commande_gpv.numero_commande,
-            'code_magasin': ecart.commande_gpv.code_magasin,
-            'montant': None,  # GPV n'a pas de montant
-            'date_creation': ecart.date_creation,
-            'statut': ecart.statut,
-        })
-
-    # Fonction de normalisation pour comparer les numéros
-    def normalize_numero(numero):
-        if not numero:
-            return ''
-        numero_str = str(numero).strip()
-        digits = ''.join(ch for ch in numero_str if ch.isdigit())
-        if digits:
-            return digits.lstrip('0') or '0'
-        return numero_str
-
-    for ecart in ecarts_legend:
-        # Normaliser le numéro Legend
-        numero_legend_normalise = normalize_numero(ecart.commande_legend.numero_commande)
-        
-        # Vérifier si la commande existe dans Cyrus avec normalisation
-        existe_cyrus = False
-        for cyrus_cmd in CommandeCyrus.objects.filter(date_commande=ecart.commande_legend.date_commande):
-            if normalize_numero(cyrus_cmd.numero_commande) == numero_legend_normalise:
-                existe_cyrus = True
-                break
-        
-        if not existe_cyrus:
-            # Fallback: chercher par numéro seulement (sans date)
-            for cyrus_cmd in CommandeCyrus.objects.all():
-                if normalize_numero(cyrus_cmd.numero_commande) == numero_legend_normalise:
-                    existe_cyrus = True
-                    break
-
-        # Ne pas afficher les écarts résolus automatiquement (résolu ET existe dans Cyrus)
-        # Afficher seulement : ouverts, ignorés, et résolus manuellement (résolu mais n'existe pas dans Cyrus)
-        if ecart.statut == 'resolu' and existe_cyrus:
-            continue
-
-        ecarts_combined.append({
-            'type': 'legend',
-            'ecart': ecart,
-            'id': ecart.id,
-            'date_commande': ecart.commande_legend.date_commande,
-            'numero_commande': ecart.commande_legend.numero_commande,
-            'depot_origine': ecart.commande_legend.depot_origine,
-            'depot_destination': ecart.commande_legend.depot_destination,
-            'montant': None,
-            'date_creation': ecart.date_creation,
-            'statut': ecart.statut,
-        })
-    
-    # Filtrer par type si spécifié
-    if type_ecart and type_ecart != '':
-        ecarts_combined = [e for e in ecarts_combined if e['type'] == type_ecart]
-    
-    # Trier : non intégrés (statut 'ouvert') en premier, puis les autres
-    # Priorité : 1. statut 'ouvert' (non intégré), 2. date de création (plus récent en premier)
-    from django.utils import timezone
-    def sort_key(ecart):
-        # Si statut 'ouvert', priorité 0 (en premier), sinon priorité 1
-        priority = 0 if ecart['statut'] == 'ouvert' else 1
-        # Convertir la date en timestamp pour le tri
-        date_creation = ecart['date_creation']
-        try:
-            if isinstance(date_creation, datetime):
-                if timezone.is_aware(date_creation):
-                    date_timestamp = date_creation.timestamp()
-                else:
-                    date_timestamp = timezone.make_aware(date_creation).timestamp()
-            elif hasattr(date_creation, 'timestamp'):
-                date_timestamp = date_creation.timestamp()
-            else:
-                # Si c'est une date naive, la convertir
-                if isinstance(date_creation, datetime):
-                    date_timestamp = timezone.make_aware(date_creation).timestamp()
-                else:
-                    date_timestamp = 0
-        except:
-            date_timestamp = 0
-        return (priority, -date_timestamp)
-    
-    ecarts_combined.sort(key=sort_key)
+    ecarts_combined = lister_ecarts(
+        date_debut=date_debut_parsed,
+        date_fin=date_fin_parsed,
+        code_magasin=code_magasin,
+        statut=statut,
+        type_ecart=type_ecart,
+    )
 
     paginator = Paginator(ecarts_combined, 50)
     page_number = request.GET.get('page', 1)
@@ -1582,6 +958,7 @@ def detail_br_asten(request, br_id):
             if avis:
                 br.avis = avis
             br.save()
+            enregistrer_modification_manuelle()
             
             messages.success(request, f"Le statut du BR {br.numero_br} a été mis à jour avec succès. Les statistiques ont été recalculées.")
             
@@ -1799,6 +1176,7 @@ def detail_ecart_gpv(request, ecart_id):
                 if commentaire:
                     ecart.commentaire = commentaire
                 ecart.save()
+                enregistrer_modification_manuelle()
                 
                 if nouveau_statut == 'resolu':
                     messages.success(request, "L'écart a été marqué comme résolu. La commande sera comptée comme intégrée. Les pourcentages seront mis à jour sur le dashboard.")
@@ -1853,6 +1231,7 @@ def detail_ecart_legend(request, ecart_id):
                 if commentaire:
                     ecart.commentaire = commentaire
                 ecart.save()
+                enregistrer_modification_manuelle()
                 
                 if nouveau_statut == 'resolu':
                     messages.success(request, "L'écart a été marqué comme résolu. La commande sera comptée comme intégrée. Les pourcentages seront mis à jour sur le dashboard.")
@@ -2141,6 +1520,27 @@ def configuration_systeme(request):
     return render(request, 'dashboard/configuration_systeme.html', {})
 
 
+@staff_member_required
+def performances(request):
+    """
+    Endpoints les plus lents sur les N dernières heures (journal d'instrumentation).
+    Réservé au personnel ; vide tant que INSTRUMENTATION_ACTIVE n'est pas activé.
+    """
+    try:
+        heures = int(request.GET.get('heures', 24))
+    except (TypeError, ValueError):
+        heures = 24
+    heures = max(1, min(heures, 24 * 30))
+
+    context = {
+        'endpoints': pires_endpoints(heures=heures),
+        'heures': heures,
+        'choix_heures': sorted({1, 6, 24, 72, 168, heures}),
+        'instrumentation_active': settings.INSTRUMENTATION_ACTIVE,
+    }
+    return render(request, 'dashboard/performances.html', context)
+
+
 def gestion_magasins(request):
     """
     Page de gestion des magasins.
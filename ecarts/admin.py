@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import EcartCommande, EcartGPV, EcartLegend
+from .models import EcartCommande, EcartGPV, EcartLegend, RecalculEcarts
 
 
 @admin.register(EcartCommande)
@@ -41,3 +41,11 @@ class EcartLegendAdmin(admin.ModelAdmin):
     readonly_fields = ('date_creation', 'date_modification')
     date_hierarchy = 'date_creation'
 
+
+
+@admin.register(RecalculEcarts)
+class RecalculEcartsAdmin(admin.ModelAdmin):
+    list_display = ('date_recalcul', 'type_recalcul', 'ecarts_crees', 'ecarts_resolus')
+    list_filter = ('type_recalcul', 'date_recalcul')
+    readonly_fields = ('date_recalcul',)
+    date_hierarchy = 'date_recalcul'
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecarts', '0006_alter_ecartcommande_statut_alter_ecartgpv_statut_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecalculEcarts',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_recalcul', models.CharField(choices=[('automatique', 'Recalcul automatique'), ('manuel', 'Modification manuelle')], default='automatique', max_length=20, verbose_name='Type de recalcul')),
+                ('date_recalcul', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Date du recalcul')),
+                ('ecarts_crees', models.IntegerField(default=0, verbose_name='Écarts créés')),
+                ('ecarts_resolus', models.IntegerField(default=0, verbose_name='Écarts résolus')),
+            ],
+            options={
+                'verbose_name': 'Recalcul des écarts',
+                'verbose_name_plural': 'Recalculs des écarts',
+                'ordering': ['-date_recalcul'],
+            },
+        ),
+    ]
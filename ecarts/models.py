@@ -126,3 +126,28 @@ class EcartLegend(models.Model):
     def __str__(self):
         return f"Écart Legend - {self.commande_legend.numero_commande} - {self.commande_legend.depot_origine}"
 
+
+
+class RecalculEcarts(models.Model):
+    """Journal des recalculs et des modifications manuelles des écarts"""
+    TYPE_CHOICES = [
+        ('automatique', 'Recalcul automatique'),
+        ('manuel', 'Modification manuelle'),
+    ]
+    type_recalcul = models.CharField(
+        max_length=20,
+        choices=TYPE_CHOICES,
+        default='automatique',
+        verbose_name="Type de recalcul"
+    )
+    date_recalcul = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Date du recalcul")
+    ecarts_crees = models.IntegerField(default=0, verbose_name="Écarts créés")
+    ecarts_resolus = models.IntegerField(default=0, verbose_name="Écarts résolus")
+
+    class Meta:
+        verbose_name = "Recalcul des écarts"
+        verbose_name_plural = "Recalculs des écarts"
+        ordering = ['-date_recalcul']
+
+    def __str__(self):
+        return f"{self.get_type_recalcul_display()} - {self.date_recalcul}"
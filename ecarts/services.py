@@ -1,10 +1,14 @@
 from django.db import transaction
-from django.db.models import Exists, OuterRef, Q
+from django.db.models import BooleanField, Case, Count, Exists, Max, OuterRef, Q, Value, When
+from django.db.models.functions import Trim, Upper
 from asten.models import CommandeAsten
+from core.models import Magasin
+from br.models import BRAsten
 from cyrus.models import CommandeCyrus
 from gpv.models import CommandeGPV
+from imports.models import ImportFichier
 from legend.models import CommandeLegend
-from ecarts.models import EcartCommande, EcartGPV, EcartLegend
+from ecarts.models import EcartCommande, EcartGPV, EcartLegend, RecalculEcarts
 
 
 def recalculer_ecarts():
@@ -205,11 +209,34 @@ def recalculer_ecarts():
                     )
                     ecarts_legend_crees += 1
 
-        return {
+        resultat = {
             'ecarts_crees': ecarts_crees + ecarts_gpv_crees + ecarts_legend_crees,
             'ecarts_resolus': ecarts_resolus + ecarts_gpv_resolus + ecarts_legend_resolus
         }
 
+        # Tracer le recalcul : sa date sert de version des données (ETag / Last-Modified de l'API)
+        RecalculEcarts.objects.create(type_recalcul='automatique', **resultat)
+
+        return resultat
+
+
+def enregistrer_modification_manuelle():
+    """
+    Trace une modification manuelle (statut d'écart, statut IC d'un BR).
+    Les statistiques changent sans import ni recalcul : on fait avancer la version des données.
+    """
+    RecalculEcarts.objects.create(type_recalcul='manuel')
+
+
+def get_version_donnees():
+    """
+    Retourne la version des données sous forme de tuple (dernier import, dernier recalcul).
+    Deux agrégats légers seulement : utilisée pour les validateurs HTTP (ETag / Last-Modified).
+    """
+    dernier_import = ImportFichier.objects.aggregate(date=Max('date_import'))['date']
+    dernier_recalcul = RecalculEcarts.objects.aggregate(date=Max('date_recalcul'))['date']
+    return dernier_import, dernier_recalcul
+
 
 def get_statistiques(date_debut=None, date_fin=None, code_magasin=None):
     """
@@ -274,3 +301,344 @@ def get_statistiques(date_debut=None, date_fin=None, code_magasin=None):
         'taux_non_integration': taux_non_integration,
     }
 
+
+
+def get_cle_cache_donnees():
+    """
+    Clé courte identifiant l'état des données affichées (imports, recalculs, magasins),
+    utilisée dans les clés du cache des fragments de templates
+    """
+    dernier_import, dernier_recalcul = get_version_donnees()
+    magasins = Magasin.objects.aggregate(nombre=Count('code'), derniere_modification=Max('date_modification'))
+    return '|'.join(str(valeur) for valeur in (
+        dernier_import, dernier_recalcul, magasins['nombre'], magasins['derniere_modification'],
+    ))
+
+
+def _taux(valeur, total, decimales=2):
+    return round((valeur / total * 100) if total > 0 else 0, decimales)
+
+
+def _statistiques_depuis_ecarts(total_source, total_cible, ecarts_queryset):
+    """
+    Calcule les statistiques d'une source à partir de ses écarts.
+    - Les écarts "ouverts" = commandes non intégrées
+    - Les écarts "résolus" et "ignorés" = commandes considérées comme intégrées
+    - Les écarts "quantite_0" = exclus du total (ni intégrés ni non intégrés)
+    """
+    compteurs = ecarts_queryset.aggregate(
+        ouverts=Count('id', filter=Q(statut='ouvert')),
+        quantite_0=Count('id', filter=Q(statut='quantite_0')),
+    )
+    total_pour_stats = total_source - compteurs['quantite_0']
+    integres = total_source - compteurs['ouverts'] - compteurs['quantite_0']
+    non_integres = compteurs['ouverts']
+    return {
+        'total_source': total_pour_stats,
+        'total_target': total_cible,
+        'integres': integres,
+        'non_integres': non_integres,
+        'taux_integration': _taux(integres, total_pour_stats),
+        'taux_non_integration': _taux(non_integres, total_pour_stats),
+    }
+
+
+def statistiques_asten(date_debut=None, date_fin=None, codes_magasins=None):
+    """Statistiques Asten vs Cyrus (format du dashboard)"""
+    filtres_asten = {}
+    filtres_cyrus = {}
+    filtres_ecarts = {}
+    if date_debut:
+        filtres_asten['date_commande__gte'] = date_debut
+        filtres_cyrus['date_commande__gte'] = date_debut
+        filtres_ecarts['commande_asten__date_commande__gte'] = date_debut
+    if date_fin:
+        filtres_asten['date_commande__lte'] = date_fin
+        filtres_cyrus['date_commande__lte'] = date_fin
+        filtres_ecarts['commande_asten__date_commande__lte'] = date_fin
+    if codes_magasins:
+        filtres_asten['code_magasin__code__in'] = codes_magasins
+        filtres_cyrus['code_magasin__code__in'] = codes_magasins
+        filtres_ecarts['commande_asten__code_magasin__code__in'] = codes_magasins
+
+    return _statistiques_depuis_ecarts(
+        CommandeAsten.objects.filter(**filtres_asten).count(),
+        CommandeCyrus.objects.filter(**filtres_cyrus).count(),
+        EcartCommande.objects.filter(**filtres_ecarts),
+    )
+
+
+def statistiques_gpv(date_debut=None, date_fin=None, codes_magasins=None):
+    """Statistiques GPV vs Cyrus : seules les commandes "Transmise" doivent être dans Cyrus"""
+    filtres_gpv = {'statut__iexact': 'Transmise'}
+    filtres_cyrus = {}
+    filtres_ecarts = {}
+    if date_debut:
+        filtres_gpv['date_creation__gte'] = date_debut
+        filtres_cyrus['date_commande__gte'] = date_debut
+        filtres_ecarts['commande_gpv__date_creation__gte'] = date_debut
+    if date_fin:
+        filtres_gpv['date_creation__lte'] = date_fin
+        filtres_cyrus['date_commande__lte'] = date_fin
+        filtres_ecarts['commande_gpv__date_creation__lte'] = date_fin
+    if codes_magasins:
+        filtres_gpv['code_magasin__code__in'] = codes_magasins
+        filtres_cyrus['code_magasin__code__in'] = codes_magasins
+        filtres_ecarts['commande_gpv__code_magasin__code__in'] = codes_magasins
+
+    return _statistiques_depuis_ecarts(
+        CommandeGPV.objects.filter(**filtres_gpv).count(),
+        CommandeCyrus.objects.filter(**filtres_cyrus).count(),
+        EcartGPV.objects.filter(**filtres_ecarts),
+    )
+
+
+def statistiques_legend(date_debut=None, date_fin=None):
+    """Statistiques Legend vs Cyrus : seules les commandes exportées sont éligibles (pas de code magasin)"""
+    filtres_legend = {'exportee': True}
+    filtres_cyrus = {}
+    filtres_ecarts = {'commande_legend__exportee': True}
+    if date_debut:
+        filtres_legend['date_commande__gte'] = date_debut
+        filtres_cyrus['date_commande__gte'] = date_debut
+        filtres_ecarts['commande_legend__date_commande__gte'] = date_debut
+    if date_fin:
+        filtres_legend['date_commande__lte'] = date_fin
+        filtres_cyrus['date_commande__lte'] = date_fin
+        filtres_ecarts['commande_legend__date_commande__lte'] = date_fin
+
+    return _statistiques_depuis_ecarts(
+        CommandeLegend.objects.filter(**filtres_legend).count(),
+        CommandeCyrus.objects.filter(**filtres_cyrus).count(),
+        EcartLegend.objects.filter(**filtres_ecarts),
+    )
+
+
+def statistiques_br(date_debut=None, date_fin=None, codes_magasins=None, decimales=2):
+    """Statistiques BR Asten (statut IC fourni dans le fichier), en un seul passage sur la table"""
+    filtres_br = {}
+    if date_debut:
+        filtres_br['date_br__gte'] = date_debut
+    if date_fin:
+        filtres_br['date_br__lte'] = date_fin
+    if codes_magasins:
+        filtres_br['code_magasin__code__in'] = codes_magasins
+
+    compteurs = BRAsten.objects.filter(**filtres_br).aggregate(
+        total=Count('id'),
+        quantite_0=Count('id', filter=Q(est_quantite_0=True)),
+        trouvees=Count('id', filter=Q(ic_integre=True, est_quantite_0=False)),
+        non_trouvees=Count('id', filter=Q(ic_integre=False, est_quantite_0=False)),
+    )
+    total_pour_stats = compteurs['total'] - compteurs['quantite_0']
+    return {
+        'total_source': total_pour_stats,
+        'total_target': compteurs['trouvees'],
+        'integres': compteurs['trouvees'],
+        'non_integres': compteurs['non_trouvees'],
+        'trouvees': compteurs['trouvees'],
+        'non_trouvees': compteurs['non_trouvees'],
+        'taux_integration': _taux(compteurs['trouvees'], total_pour_stats, decimales),
+        'taux_non_integration': _taux(compteurs['non_trouvees'], total_pour_stats, decimales),
+    }
+
+
+def normaliser_numero_commande(numero):
+    """Normalise un numéro de commande pour la comparaison (enlève les zéros en tête)"""
+    if not numero:
+        return ''
+    numero_str = str(numero).strip()
+    digits = ''.join(ch for ch in numero_str if ch.isdigit())
+    if digits:
+        return digits.lstrip('0') or '0'
+    return numero_str
+
+
+def lister_ecarts(date_debut=None, date_fin=None, code_magasin=None, statut='', type_ecart=''):
+    """
+    Construit la liste combinée des écarts (Asten, GPV et Legend) affichée par liste_ecarts et l'API.
+    Les écarts résolus automatiquement (statut "resolu" ET commande présente dans Cyrus) sont exclus.
+    Tri : écarts ouverts en premier, puis date de création décroissante.
+    """
+    filtres_asten = {}
+    filtres_gpv = {}
+    filtres_legend = {}
+
+    # Filtrer par statut seulement si un statut spécifique est sélectionné ;
+    # par défaut, exclure les écarts résolus
+    statuts = [statut] if statut else ['ouvert', 'ignore']
+    filtres_asten['statut__in'] = statuts
+    filtres_gpv['statut__in'] = statuts
+    filtres_legend['statut__in'] = statuts
+
+    if date_debut:
+        filtres_asten['commande_asten__date_commande__gte'] = date_debut
+        filtres_gpv['commande_gpv__date_creation__gte'] = date_debut
+        filtres_legend['commande_legend__date_commande__gte'] = date_debut
+    if date_fin:
+        filtres_asten['commande_asten__date_commande__lte'] = date_fin
+        filtres_gpv['commande_gpv__date_creation__lte'] = date_fin
+        filtres_legend['commande_legend__date_commande__lte'] = date_fin
+    if code_magasin:
+        filtres_asten['commande_asten__code_magasin__code'] = code_magasin
+        filtres_gpv['commande_gpv__code_magasin__code'] = code_magasin
+
+    ecarts_combined = []
+
+    if not type_ecart or type_ecart == 'asten':
+        ecarts_asten = EcartCommande.objects.filter(**filtres_asten).select_related(
+            'commande_asten__code_magasin'
+        ).annotate(
+            existe_cyrus=Exists(CommandeCyrus.objects.filter(
+                date_commande=OuterRef('commande_asten__date_commande'),
+                numero_commande=OuterRef('commande_asten__numero_commande'),
+                code_magasin=OuterRef('commande_asten__code_magasin'),
+            ))
+        )
+        for ecart in ecarts_asten:
+            if ecart.statut == 'resolu' and ecart.existe_cyrus:
+                continue
+            ecarts_combined.append({
+                'type': 'asten',
+                'ecart': ecart,
+                'id': ecart.id,
+                'date_commande': ecart.commande_asten.date_commande,
+                'numero_commande': ecart.commande_asten.numero_commande,
+                'code_magasin': ecart.commande_asten.code_magasin,
+                'montant': ecart.commande_asten.montant,
+                'date_creation': ecart.date_creation,
+                'statut': ecart.statut,
+            })
+
+    if not type_ecart or type_ecart == 'gpv':
+        # Fallback : si la date diffère, considérer intégrée si numéro+magasin existe
+        ecarts_gpv = EcartGPV.objects.filter(**filtres_gpv).select_related(
+            'commande_gpv__code_magasin'
+        ).annotate(
+            existe_cyrus=Exists(CommandeCyrus.objects.filter(
+                numero_commande=OuterRef('commande_gpv__numero_commande'),
+                code_magasin=OuterRef('commande_gpv__code_magasin'),
+            ))
+        )
+        for ecart in ecarts_gpv:
+            if ecart.statut == 'resolu' and ecart.existe_cyrus:
+                continue
+            ecarts_combined.append({
+                'type': 'gpv',
+                'ecart': ecart,
+                'id': ecart.id,
+                'date_commande': ecart.commande_gpv.date_creation,  # Utiliser date_creation pour GPV
+                'numero_commande': ecart.commande_gpv.numero_commande,
+                'code_magasin': ecart.commande_gpv.code_magasin,
+                'montant': None,  # GPV n'a pas de montant
+                'date_creation': ecart.date_creation,
+                'statut': ecart.statut,
+            })
+
+    if not type_ecart or type_ecart == 'legend':
+        ecarts_legend = list(EcartLegend.objects.filter(**filtres_legend).select_related('commande_legend'))
+        # Les numéros Cyrus sont normalisés à l'import : une seule requête suffit
+        # (comparaison par numéro seulement, toutes dates confondues)
+        numeros_legend = {
+            normaliser_numero_commande(ecart.commande_legend.numero_commande) for ecart in ecarts_legend
+            if ecart.statut == 'resolu'
+        }
+        numeros_cyrus = set()
+        if numeros_legend:
+            numeros_cyrus = set(CommandeCyrus.objects.filter(
+                numero_commande__in=numeros_legend
+            ).values_list('numero_commande', flat=True))
+        for ecart in ecarts_legend:
+            existe_cyrus = normaliser_numero_commande(ecart.commande_legend.numero_commande) in numeros_cyrus
+            if ecart.statut == 'resolu' and existe_cyrus:
+                continue
+            ecarts_combined.append({
+                'type': 'legend',
+                'ecart': ecart,
+                'id': ecart.id,
+                'date_commande': ecart.commande_legend.date_commande,
+                'numero_commande': ecart.commande_legend.numero_commande,
+                'depot_origine': ecart.commande_legend.depot_origine,
+                'depot_destination': ecart.commande_legend.depot_destination,
+                'montant': None,
+                'date_creation': ecart.date_creation,
+                'statut': ecart.statut,
+            })
+
+    ecarts_combined.sort(key=lambda e: (0 if e['statut'] == 'ouvert' else 1, -e['date_creation'].timestamp()))
+    return ecarts_combined
+
+
+def commandes_asten_rapprochees(date_debut=None, date_fin=None, codes_magasins=None, non_integres_seulement=False):
+    """
+    Commandes Asten annotées avec leur présence dans Cyrus (EXISTS corrélé sur date + numéro + magasin)
+    et leur état d'intégration, triées non intégrées d'abord : le queryset est directement paginable.
+    Un écart "resolu" ou "ignore" vaut intégration ; les écarts "quantite_0" sont exclus.
+    """
+    filtres = {}
+    if date_debut:
+        filtres['date_commande__gte'] = date_debut
+    if date_fin:
+        filtres['date_commande__lte'] = date_fin
+    if codes_magasins:
+        filtres['code_magasin__code__in'] = codes_magasins
+
+    queryset = CommandeAsten.objects.filter(**filtres).exclude(
+        ecart__statut='quantite_0'
+    ).select_related('code_magasin', 'ecart').annotate(
+        dans_cyrus=Exists(CommandeCyrus.objects.filter(
+            date_commande=OuterRef('date_commande'),
+            numero_commande=OuterRef('numero_commande'),
+            code_magasin=OuterRef('code_magasin'),
+        )),
+    ).annotate(
+        integre=Case(
+            When(Q(ecart__statut__in=['resolu', 'ignore']) | Q(dans_cyrus=True), then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ),
+    )
+    if non_integres_seulement:
+        queryset = queryset.filter(integre=False)
+    return queryset.order_by('integre', '-date_commande', 'numero_commande')
+
+
+def commandes_gpv_rapprochees(date_debut=None, date_fin=None, codes_magasins=None, non_integres_seulement=False):
+    """
+    Commandes GPV annotées comme commandes_asten_rapprochees. Seules les commandes "Transmise"
+    doivent être dans Cyrus ; la présence est vérifiée sur numéro + magasin (la date GPV peut
+    différer de la date Cyrus), les autres statuts sont considérés comme intégrés.
+    """
+    filtres = {}
+    if date_debut:
+        filtres['date_creation__gte'] = date_debut
+    if date_fin:
+        filtres['date_creation__lte'] = date_fin
+    if codes_magasins:
+        filtres['code_magasin__code__in'] = codes_magasins
+
+    queryset = CommandeGPV.objects.filter(**filtres).select_related('code_magasin', 'ecart').annotate(
+        statut_normalise=Upper(Trim('statut')),
+        dans_cyrus=Exists(CommandeCyrus.objects.filter(
+            numero_commande=OuterRef('numero_commande'),
+            code_magasin=OuterRef('code_magasin'),
+        )),
+    ).annotate(
+        doit_etre_dans_cyrus=Case(
+            When(statut_normalise__in=['TRANSMISE', 'TRANSMIS'], then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ),
+    ).exclude(
+        doit_etre_dans_cyrus=True, ecart__statut='quantite_0'
+    ).annotate(
+        integre=Case(
+            When(doit_etre_dans_cyrus=False, then=Value(True)),
+            When(Q(ecart__statut__in=['resolu', 'ignore']) | Q(dans_cyrus=True), then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ),
+    )
+    if non_integres_seulement:
+        queryset = queryset.filter(integre=False)
+    return queryset.order_by('integre', '-date_creation', 'numero_commande')
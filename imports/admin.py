@@ -6,9 +6,14 @@ from .models import ImportFichier
 class ImportFichierAdmin(admin.ModelAdmin):
     list_display = (
         'type_fichier', 'nom_fichier', 'statut', 
-        'nombre_lignes', 'nombre_nouveaux', 'nombre_dupliques', 'date_import'
+        'nombre_lignes', 'nombre_nouveaux', 'nombre_mis_a_jour', 'nombre_inchanges',
+        'nombre_dupliques', 'date_import'
     )
     list_filter = ('type_fichier', 'statut', 'date_import')
     search_fields = ('nom_fichier',)
-    readonly_fields = ('date_import', 'nombre_lignes', 'nombre_nouveaux', 'nombre_dupliques')
+    readonly_fields = (
+        'date_import', 'nombre_lignes', 'nombre_nouveaux', 'nombre_mis_a_jour',
+        'nombre_inchanges', 'nombre_dupliques',
+        'format_signature', 'encodage', 'delimiteur', 'guillemet', 'entete',
+    )
     date_hierarchy = 'date_import'
@@ -0,0 +1,164 @@
+"""
+Archive colonnaire des lignes importées.
+
+Pendant un import, chaque lot enregistré en base (les valeurs normalisées : dates analysées, numéros
+et codes magasin nettoyés) est aussi écrit dans un fichier Parquet :
+    ARCHIVE_IMPORTS_DIR/source=<type>/mois=<AAAA-MM>/<nom du fichier>.parquet
+Le fichier n'est publié (renommé) qu'une fois l'import terminé et sa transaction validée, donc avant
+la suppression du fichier source par le scanner ; un import annulé (rollback) ne publie rien. replay_import reconstruit les tables depuis ces archives sans relire ni
+réanalyser les CSV.
+
+pyarrow est optionnel : s'il n'est pas installé, les imports fonctionnent sans être archivés.
+"""
+import logging
+from pathlib import Path
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+SUFFIXE_ARCHIVE = '.parquet'
+
+
+def modeles_archives():
+    """type_fichier -> (modèle, champs de la clé naturelle), comme dans les importeurs"""
+    from asten.models import CommandeAsten
+    from br.models import BRAsten
+    from cyrus.models import CommandeCyrus
+    from gpv.models import CommandeGPV
+    from legend.models import CommandeLegend
+
+    return {
+        'asten': (CommandeAsten, ('date_commande', 'numero_commande', 'code_magasin_id')),
+        'cyrus': (CommandeCyrus, ('date_commande', 'numero_commande', 'code_magasin_id')),
+        'gpv': (CommandeGPV, ('date_creation', 'numero_commande', 'code_magasin_id')),
+        'legend': (CommandeLegend, ('date_commande', 'numero_commande', 'depot_origine')),
+        'br_asten': (BRAsten, ('numero_br', 'date_br', 'code_magasin_id')),
+    }
+
+
+def _type_arrow(pa, champ):
+    if isinstance(champ, models.ForeignKey):
+        return _type_arrow(pa, champ.target_field)
+    if isinstance(champ, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(champ, models.DateField):
+        return pa.date32()
+    if isinstance(champ, models.BooleanField):
+        return pa.bool_()
+    if isinstance(champ, (models.DecimalField, models.FloatField)):
+        # Montants à 2 décimales : un double les représente exactement à l'affichage
+        return pa.float64()
+    if isinstance(champ, models.IntegerField):
+        return pa.int64()
+    return pa.string()
+
+
+def chemins_archives(types=None, mois=None, noms=None):
+    """Archives publiées, filtrées par type de fichier, mois (AAAA-MM) et nom de fichier source"""
+    racine = Path(settings.ARCHIVE_IMPORTS_DIR)
+    if not racine.exists():
+        return []
+    chemins = []
+    for chemin in sorted(racine.glob(f'source=*/mois=*/*{SUFFIXE_ARCHIVE}')):
+        type_fichier = chemin.parent.parent.name.split('=', 1)[1]
+        if types and type_fichier not in types:
+            continue
+        if mois and chemin.parent.name.split('=', 1)[1] not in mois:
+            continue
+        if noms and chemin.name[:-len(SUFFIXE_ARCHIVE)] not in noms:
+            continue
+        chemins.append(chemin)
+    return chemins
+
+
+def type_archive(chemin):
+    """Type de fichier (asten, cyrus...) d'une archive, d'après sa partition"""
+    return Path(chemin).parent.parent.name.split('=', 1)[1]
+
+
+class ArchiveImport:
+    """
+    Écriture de l'archive d'un import. Sans effet si l'archivage est désactivé, si pyarrow manque
+    ou après une erreur d'écriture : l'archive ne doit jamais faire échouer l'import.
+    """
+
+    def __init__(self, type_fichier, nom_fichier, modele):
+        self.type_fichier = type_fichier
+        self.nom_fichier = nom_fichier
+        self.modele = modele
+        self.ecrivain = None
+        self.schema = None
+        self.actif = getattr(settings, 'ARCHIVE_IMPORTS_ACTIVE', True)
+        if self.actif:
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                logger.warning("pyarrow n'est pas installé : imports non archivés")
+                self.actif = False
+        mois = timezone.localdate().strftime('%Y-%m')
+        dossier = Path(settings.ARCHIVE_IMPORTS_DIR) / f'source={type_fichier}' / f'mois={mois}'
+        self.chemin = dossier / f'{nom_fichier}{SUFFIXE_ARCHIVE}'
+        self.chemin_temporaire = dossier / f'.{nom_fichier}{SUFFIXE_ARCHIVE}.en_cours'
+
+    def ajouter(self, lignes):
+        """Ajoute un lot de lignes ({attname: valeur}, les valeurs enregistrées en base)"""
+        if not self.actif or not lignes:
+            return
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self.ecrivain is None:
+                champs = [self.modele._meta.get_field(nom) for nom in lignes[0]]
+                self.schema = pa.schema([(champ.attname, _type_arrow(pa, champ)) for champ in champs])
+                self.chemin_temporaire.parent.mkdir(parents=True, exist_ok=True)
+                self.ecrivain = pq.ParquetWriter(
+                    self.chemin_temporaire, self.schema,
+                    compression=getattr(settings, 'ARCHIVE_IMPORTS_COMPRESSION', 'zstd'),
+                )
+            colonnes = {nom: [ligne.get(nom) for ligne in lignes] for nom in self.schema.names}
+            self.ecrivain.write_table(pa.table(colonnes, schema=self.schema))
+        except Exception:
+            logger.exception("Archivage de l'import %s impossible, fichier non archivé", self.nom_fichier)
+            self.abandonner()
+
+    def terminer(self):
+        """
+        Ferme l'archive et la publie à la validation de la transaction en cours (immédiatement hors
+        transaction) : elle remplace alors celle d'un import précédent du même fichier. Après un
+        rollback, seul le fichier temporaire caché subsiste ; replay_import ne le lit pas et le
+        prochain import du même fichier l'écrase.
+        """
+        if not self.actif or self.ecrivain is None:
+            return
+        try:
+            self.ecrivain.close()
+            self.ecrivain = None
+        except Exception:
+            logger.exception("Archivage de l'import %s impossible, fichier non archivé", self.nom_fichier)
+            self.abandonner()
+            return
+        transaction.on_commit(self._publier)
+
+    def _publier(self):
+        try:
+            for ancienne in chemins_archives(types=[self.type_fichier], noms=[self.nom_fichier]):
+                ancienne.unlink(missing_ok=True)
+            self.chemin_temporaire.replace(self.chemin)
+        except Exception:
+            logger.exception("Publication de l'archive de l'import %s impossible", self.nom_fichier)
+            self.abandonner()
+
+    def abandonner(self):
+        """Supprime l'archive en cours (import en erreur)"""
+        self.actif = False
+        if self.ecrivain is not None:
+            try:
+                self.ecrivain.close()
+            except Exception:
+                pass
+            self.ecrivain = None
+        self.chemin_temporaire.unlink(missing_ok=True)
@@ -0,0 +1,283 @@
+"""
+Chargement groupé des lignes importées.
+
+Les importeurs accumulent les lignes analysées par lots (dictionnaire clé naturelle -> valeurs)
+puis les enregistrent ici :
+- PostgreSQL : COPY du lot dans une table temporaire puis fusion en SQL sur la clé naturelle
+  (INSERT ... ON CONFLICT DO NOTHING, UPDATE ... FROM pour les mises à jour) ;
+- autres bases (SQLite) : un SELECT des clés existantes puis bulk_create.
+Un lot refusé par la base (ex. valeur plus longue que la colonne, vérifiée par PostgreSQL pendant
+le COPY) est rejoué ligne à ligne : seules les lignes fautives sont écartées, comme avec
+l'enregistrement ligne à ligne d'origine (voir enregistrer_isole).
+Le rejeu des archives (inserer_valeurs) insère des valeurs déjà prêtes sans instancier de modèles.
+"""
+from django.db import DataError, IntegrityError, connection, transaction
+from django.utils import timezone
+
+# Nombre de lignes distinctes accumulées avant chaque enregistrement groupé
+TAILLE_LOT = 2000
+
+
+# Erreurs propres aux valeurs d'une ligne : le lot est alors rejoué ligne à ligne. Les autres
+# (connexion perdue, table absente...) font échouer l'import comme avant.
+ERREURS_LIGNE = (DataError, IntegrityError, ValueError, TypeError)
+
+
+def copy_disponible():
+    """Vrai si la base permet le chargement par COPY (PostgreSQL)"""
+    return connection.vendor == 'postgresql'
+
+
+def _colonnes_insertion(modele, valeurs):
+    """Champs à insérer : ceux fournis + les dates automatiques (auto_now / auto_now_add)"""
+    maintenant = timezone.now()
+    champs = []
+    automatiques = {}
+    for champ in modele._meta.concrete_fields:
+        if champ.primary_key and champ.auto_created:
+            continue
+        if champ.attname in valeurs:
+            champs.append(champ)
+        elif getattr(champ, 'auto_now', False) or getattr(champ, 'auto_now_add', False):
+            champs.append(champ)
+            automatiques[champ.attname] = maintenant
+    return champs, automatiques
+
+
+def _cles_existantes(modele, lot, champs_cle):
+    """Clés du lot déjà présentes en base (un seul SELECT filtré sur les deux premiers champs de la clé)"""
+    filtres = {f'{champ}__in': {cle[i] for cle in lot} for i, champ in enumerate(champs_cle[:2])}
+    return set(modele.objects.filter(**filtres).values_list(*champs_cle)) & set(lot)
+
+
+class _TableIntermediaire:
+    """Table temporaire aux colonnes de la table cible, remplie par COPY (PostgreSQL uniquement)"""
+
+    def __init__(self, modele, champs, lignes):
+        self.table = modele._meta.db_table
+        self.nom = f'tmp_{self.table}'
+        self.colonnes = ', '.join(connection.ops.quote_name(champ.column) for champ in champs)
+        self.lignes = lignes
+
+    def __enter__(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.nom}')
+            cursor.execute(f'CREATE TEMP TABLE {self.nom} AS SELECT {self.colonnes} FROM {self.table} WITH NO DATA')
+            with cursor.cursor.copy(f'COPY {self.nom} ({self.colonnes}) FROM STDIN') as copie:
+                for ligne in self.lignes:
+                    copie.write_row(ligne)
+        return self
+
+    def __exit__(self, *exc):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.nom}')
+
+
+def _lignes_copy(champs, lot, automatiques):
+    for valeurs in lot.values():
+        yield [valeurs[champ.attname] if champ.attname in valeurs else automatiques[champ.attname] for champ in champs]
+
+
+def _condition_cle(champs_cle, modele, alias_cible, alias_source):
+    colonnes = [modele._meta.get_field(champ).column for champ in champs_cle]
+    return ' AND '.join(f'{alias_cible}.{colonne} = {alias_source}.{colonne}' for colonne in colonnes)
+
+
+def inserer_absents(modele, lot, champs_cle):
+    """
+    get_or_create groupé : insère les lignes de `lot` ({clé naturelle: {attname: valeur}}) dont la
+    clé n'existe pas encore, sans toucher aux lignes existantes. Renvoie le nombre de lignes créées.
+    """
+    if not lot:
+        return 0
+    premieres_valeurs = next(iter(lot.values()))
+    champs, automatiques = _colonnes_insertion(modele, premieres_valeurs)
+
+    with transaction.atomic():
+        if copy_disponible():
+            colonnes_cle = ', '.join(modele._meta.get_field(champ).column for champ in champs_cle)
+            with _TableIntermediaire(modele, champs, _lignes_copy(champs, lot, automatiques)) as intermediaire:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'INSERT INTO {intermediaire.table} ({intermediaire.colonnes}) '
+                        f'SELECT {intermediaire.colonnes} FROM {intermediaire.nom} '
+                        f'ON CONFLICT ({colonnes_cle}) DO NOTHING'
+                    )
+                    return cursor.rowcount
+
+        existantes = _cles_existantes(modele, lot, champs_cle)
+        nouveaux = [modele(**valeurs) for cle, valeurs in lot.items() if cle not in existantes]
+        modele.objects.bulk_create(nouveaux, batch_size=500)
+        return len(nouveaux)
+
+
+def _adaptateur(champ):
+    """Conversion d'une valeur Python déjà normalisée vers la base, sans passer par un modèle"""
+    if champ.get_internal_type() == 'DateTimeField':
+        return connection.ops.adapt_datetimefield_value
+    if champ.get_internal_type() == 'DateField':
+        return connection.ops.adapt_datefield_value
+    return None
+
+
+def inserer_valeurs(modele, colonnes, champs_cle, champs_maj=()):
+    """
+    Insertion groupée de valeurs déjà prêtes pour la base (rejeu d'une archive) : `colonnes` est
+    {attname: liste de valeurs}. Sans instancier de modèles : un seul INSERT ... ON CONFLICT exécuté
+    pour toutes les lignes (COPY + fusion sur PostgreSQL). Les lignes existantes sont ignorées, ou
+    reçoivent `champs_maj` s'ils sont fournis (dernière occurrence gagnante). Renvoie le nombre de
+    lignes insérées ou mises à jour.
+    """
+    noms = list(colonnes)
+    if not noms or not colonnes[noms[0]]:
+        return 0
+    champs, automatiques = _colonnes_insertion(modele, colonnes)
+    nombre = len(colonnes[noms[0]])
+    par_copy = copy_disponible()
+    series = []
+    for champ in champs:
+        valeurs = colonnes[champ.attname] if champ.attname in colonnes else [automatiques[champ.attname]] * nombre
+        adapter = None if par_copy else _adaptateur(champ)
+        series.append([adapter(valeur) for valeur in valeurs] if adapter else valeurs)
+    lignes = list(zip(*series))
+
+    if par_copy:
+        lot = {}
+        for ligne in lignes:
+            valeurs = dict(zip((champ.attname for champ in champs), ligne))
+            cle = tuple(valeurs[champ] for champ in champs_cle)
+            if champs_maj:
+                lot[cle] = valeurs
+            else:
+                lot.setdefault(cle, valeurs)
+        if champs_maj:
+            crees, mis_a_jour = fusionner_lot(modele, lot, champs_cle, champs_maj)
+            return crees + mis_a_jour
+        return inserer_absents(modele, lot, champs_cle)
+
+    quote = connection.ops.quote_name
+    colonnes_sql = ', '.join(quote(champ.column) for champ in champs)
+    colonnes_cle = ', '.join(quote(modele._meta.get_field(champ).column) for champ in champs_cle)
+    if champs_maj:
+        action = 'DO UPDATE SET ' + ', '.join(
+            f'{quote(modele._meta.get_field(champ).column)} = excluded.{quote(modele._meta.get_field(champ).column)}'
+            for champ in champs_maj
+        )
+    else:
+        action = 'DO NOTHING'
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {modele._meta.db_table} ({colonnes_sql}) VALUES ({", ".join(["%s"] * len(champs))}) '
+            f'ON CONFLICT ({colonnes_cle}) {action}',
+            lignes,
+        )
+        return cursor.rowcount
+
+
+def fusionner_lot(modele, lot, champs_cle, champs_compares, champs_derives=(), champs_toujours_maj=()):
+    """
+    Upsert groupé par COPY (PostgreSQL) : les lignes existantes dont un des `champs_compares` diffère
+    reçoivent ces champs et les `champs_derives` ; `champs_toujours_maj` est recopié sur toutes les
+    lignes existantes ; les lignes absentes sont insérées. Renvoie (nombre créées, nombre mises à jour).
+    """
+    if not lot:
+        return 0, 0
+    premieres_valeurs = next(iter(lot.values()))
+    champs, automatiques = _colonnes_insertion(modele, premieres_valeurs)
+    colonnes_cle = ', '.join(modele._meta.get_field(champ).column for champ in champs_cle)
+    jointure = _condition_cle(champs_cle, modele, 'cible', 'source')
+
+    def mise_a_jour(table_source, a_copier, a_comparer):
+        colonnes = [modele._meta.get_field(champ).column for champ in a_copier]
+        differences = [modele._meta.get_field(champ).column for champ in a_comparer]
+        return (
+            f'UPDATE {modele._meta.db_table} AS cible SET '
+            + ', '.join(f'{colonne} = source.{colonne}' for colonne in colonnes)
+            + f' FROM {table_source} AS source WHERE {jointure} AND ('
+            + ' OR '.join(f'cible.{colonne} IS DISTINCT FROM source.{colonne}' for colonne in differences)
+            + ')'
+        )
+
+    with transaction.atomic():
+        with _TableIntermediaire(modele, champs, _lignes_copy(champs, lot, automatiques)) as intermediaire:
+            with connection.cursor() as cursor:
+                cursor.execute(mise_a_jour(
+                    intermediaire.nom,
+                    [*champs_compares, *champs_derives, *champs_toujours_maj],
+                    champs_compares,
+                ))
+                mis_a_jour = cursor.rowcount
+                if champs_toujours_maj:
+                    cursor.execute(mise_a_jour(intermediaire.nom, champs_toujours_maj, champs_toujours_maj))
+                cursor.execute(
+                    f'INSERT INTO {intermediaire.table} ({intermediaire.colonnes}) '
+                    f'SELECT {intermediaire.colonnes} FROM {intermediaire.nom} '
+                    f'ON CONFLICT ({colonnes_cle}) DO NOTHING'
+                )
+                return cursor.rowcount, mis_a_jour
+
+
+def enregistrer_isole(enregistrer, lot):
+    """
+    Appelle enregistrer(lot) ({clé: valeurs}) dans un point de sauvegarde. Si la base refuse le lot
+    pour une erreur de valeur, chaque ligne est réessayée seule. Renvoie (liste des résultats
+    d'enregistrer, {clé rejetée: erreur}).
+    """
+    try:
+        with transaction.atomic():
+            return [enregistrer(lot)], {}
+    except ERREURS_LIGNE as e:
+        if len(lot) == 1:
+            return [], {next(iter(lot)): e}
+    resultats, rejetees = [], {}
+    for cle, valeurs in lot.items():
+        try:
+            with transaction.atomic():
+                resultats.append(enregistrer({cle: valeurs}))
+        except ERREURS_LIGNE as e:
+            rejetees[cle] = e
+    return resultats, rejetees
+
+
+class LotInsertion:
+    """
+    get_or_create groupé pour les importeurs : les lignes sont accumulées par clé naturelle
+    (la première occurrence du fichier l'emporte, comme avec get_or_create) et insérées par lots.
+    nombre_nouveaux / nombre_dupliques suivent le comptage de l'ancien traitement ligne à ligne.
+    Les lignes refusées par la base sont écartées (nombre_rejetes) sans faire échouer le lot.
+    Chaque lot enregistré est aussi ajouté à `archive` (imports/archives.py) si elle est fournie.
+    """
+
+    def __init__(self, modele, champs_cle, taille=TAILLE_LOT, archive=None):
+        self.modele = modele
+        self.archive = archive
+        self.champs_cle = champs_cle
+        self.taille = taille
+        self.en_attente = {}
+        self.lignes_en_attente = 0
+        self.nombre_nouveaux = 0
+        self.nombre_dupliques = 0
+        self.nombre_rejetes = 0
+
+    def ajouter(self, valeurs):
+        cle = tuple(valeurs[champ] for champ in self.champs_cle)
+        self.en_attente.setdefault(cle, valeurs)
+        self.lignes_en_attente += 1
+        if len(self.en_attente) >= self.taille:
+            self.enregistrer()
+
+    def enregistrer(self):
+        lot, lignes = self.en_attente, self.lignes_en_attente
+        self.en_attente, self.lignes_en_attente = {}, 0
+        if not lot:
+            return
+        resultats, rejetees = enregistrer_isole(lambda sous_lot: inserer_absents(self.modele, sous_lot, self.champs_cle), lot)
+        for cle, erreur in rejetees.items():
+            print(f"Ligne rejetée {cle}: {erreur}")
+            del lot[cle]
+        crees = sum(resultats)
+        if self.archive is not None:
+            self.archive.ajouter(list(lot.values()))
+        self.nombre_nouveaux += crees
+        self.nombre_rejetes += len(rejetees)
+        self.nombre_dupliques += lignes - crees - len(rejetees)
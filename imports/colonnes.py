@@ -0,0 +1,76 @@
+"""
+Colonnes des fichiers importés, résolues une fois par fichier.
+
+L'en-tête est normalisé (BOM, espaces, casse pour Cyrus) et chaque champ logique est associé aux
+positions de ses noms de colonne candidats, dans l'ordre de priorité. Dans la boucle des lignes,
+un seul itemgetter extrait toutes les valeurs utiles de la liste renvoyée par csv.reader : plus de
+dictionnaire reconstruit ni de clé normalisée à chaque ligne.
+"""
+from operator import itemgetter
+
+
+def normaliser_entete(nom):
+    """Nom de colonne sans BOM (premier champ des exports Excel) ni espaces autour"""
+    return str(nom).lstrip('\ufeff').strip()
+
+
+def normaliser_entete_cyrus(nom):
+    """Colonnes Cyrus : majuscules, sans aucun espace (`QCDUID TOTAL` -> `QCDUIDTOTAL`)"""
+    return normaliser_entete(nom).upper().replace(' ', '')
+
+
+def noms_colonnes(candidats):
+    """Tous les noms de colonne d'un dictionnaire de candidats (reconnaissance de l'en-tête)"""
+    return [nom for noms in candidats.values() for nom in noms]
+
+
+def est_vide(valeur):
+    if valeur.__class__ is str:  # cas des CSV : évite la conversion
+        return not valeur.strip()
+    return valeur is None or str(valeur).strip() == ''
+
+
+class ColonnesCompilees:
+    """
+    Accès positionnel aux champs d'un fichier : `candidats` associe chaque champ logique à ses noms
+    de colonne possibles (la première colonne présente et non vide l'emporte).
+    lire(ligne) renvoie une séquence d'une valeur par champ, dans l'ordre de `candidats` ; '' pour un
+    champ sans colonne. Une colonne en double garde la dernière position, comme csv.DictReader.
+    """
+
+    def __init__(self, entete, candidats, normaliser=normaliser_entete):
+        positions = {normaliser(nom): i for i, nom in enumerate(entete)}
+        self.largeur = len(entete)
+        indices = []
+        # (début, longueur) de chaque champ dans le tuple extrait : plusieurs colonnes présentes
+        # pour un champ sont départagées à la lecture (première non vide)
+        self._tranches = []
+        for noms in candidats.values():
+            trouves = list(dict.fromkeys(positions[normaliser(nom)] for nom in noms if normaliser(nom) in positions))
+            # Champ absent du fichier : lu dans la colonne vide ajoutée en fin de ligne
+            self._tranches.append((len(indices), len(trouves) or 1))
+            indices.extend(trouves or [self.largeur])
+        self._multiples = any(longueur > 1 for _, longueur in self._tranches)
+        self._extraire = itemgetter(*indices) if len(indices) > 1 else (lambda ligne: (ligne[indices[0]],))
+        self._complement = [''] * self.largeur
+
+    def lire(self, ligne):
+        """Valeurs des champs d'une ligne (liste de csv.reader, complétée si elle est trop courte)"""
+        if len(ligne) != self.largeur:
+            ligne = ligne[:self.largeur] + self._complement[len(ligne):self.largeur]
+        ligne.append('')
+        valeurs = self._extraire(ligne)
+        if not self._multiples:
+            return valeurs
+        resultat = []
+        for debut, longueur in self._tranches:
+            if longueur == 1:
+                resultat.append(valeurs[debut])
+                continue
+            for valeur in valeurs[debut:debut + longueur]:
+                if not est_vide(valeur):
+                    break
+            else:
+                valeur = ''
+            resultat.append(valeur)
+        return resultat
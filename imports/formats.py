@@ -0,0 +1,144 @@
+"""
+Format des fichiers CSV importés : encodage, délimiteur, guillemets et présence d'un en-tête.
+
+Le début de chaque fichier (TAILLE_ECHANTILLON octets) est lu une seule fois : il sert à la
+détection puis est réinjecté devant le reste du flux, sans seek ni seconde lecture (le flux peut
+être décompressé à la volée, voir imports/sources.py). Le format est enregistré sur l'ImportFichier
+avec la signature de la première ligne : un fichier de même forme (même type, même en-tête)
+reprend le dialecte du dernier import réussi sans analyser l'échantillon.
+
+L'encodage est déterminé sur l'échantillon déjà lu (BOM, sinon UTF-8 valide, sinon Windows-1252 des
+exports Cyrus). Les octets invalides rencontrés plus loin dans un fichier UTF-8 sont lus en
+Windows-1252 au lieu de faire échouer la ligne.
+"""
+import codecs
+import csv
+import hashlib
+import io
+
+from imports.colonnes import normaliser_entete
+from imports.sources import EXTENSIONS_CSV, ouvrir_flux
+
+# Octets lus pour la détection (quelques dizaines de lignes)
+TAILLE_ECHANTILLON = 8 * 1024
+
+DELIMITEURS = ';,\t|'
+
+ENCODAGE_SECOURS = 'cp1252'
+
+
+def _secours_cp1252(erreur):
+    """Gestionnaire d'erreurs de décodage : octets invalides relus en Windows-1252"""
+    octets = erreur.object[erreur.start:erreur.end]
+    return octets.decode(ENCODAGE_SECOURS, errors='replace'), erreur.end
+
+
+codecs.register_error('imports_cp1252', _secours_cp1252)
+
+
+def detecter_encodage(echantillon):
+    """Encodage d'après les premiers octets : BOM, sinon UTF-8 s'il est valide, sinon Windows-1252"""
+    if echantillon.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if echantillon.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    try:
+        # Décodeur incrémental : un caractère coupé en fin d'échantillon n'est pas une erreur
+        codecs.getincrementaldecoder('utf-8')().decode(echantillon, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return ENCODAGE_SECOURS
+
+
+def signature_format(type_fichier, echantillon):
+    """Empreinte de la première ligne (l'en-tête) : deux fichiers de même forme ont la même"""
+    premiere_ligne = echantillon.split(b'\n', 1)[0].rstrip(b'\r')
+    return hashlib.sha1(type_fichier.encode() + b'\0' + premiere_ligne).hexdigest()
+
+
+def detecter_dialecte(texte, colonnes_attendues=(), normaliser=normaliser_entete):
+    """
+    Délimiteur, guillemet et présence d'un en-tête d'après les lignes complètes de `texte`.
+    csv.Sniffer choisit parmi DELIMITEURS ; si son choix est absent de la première ligne, la règle
+    historique s'applique (point-virgule s'il y en a un, sinon virgule). L'en-tête est reconnu à la
+    présence d'une des `colonnes_attendues` dans la première ligne.
+    """
+    lignes = texte.splitlines()
+    premiere = lignes[0] if lignes else ''
+    delimiteur, guillemet = None, '"'
+    try:
+        dialecte = csv.Sniffer().sniff('\n'.join(lignes[:50]), delimiters=DELIMITEURS)
+        delimiteur, guillemet = dialecte.delimiter, dialecte.quotechar or '"'
+    except csv.Error:
+        pass
+    if not delimiteur or delimiteur not in premiere:
+        delimiteur, guillemet = (';' if ';' in premiere else ','), '"'
+    cellules = next(csv.reader([premiere], delimiter=delimiteur, quotechar=guillemet), [])
+    attendues = {normaliser(nom) for nom in colonnes_attendues}
+    return {
+        'delimiteur': delimiteur,
+        'guillemet': guillemet,
+        'entete': any(normaliser(cellule) in attendues for cellule in cellules),
+    }
+
+
+class _FluxPrefixe(io.RawIOBase):
+    """Flux binaire qui rend d'abord l'échantillon déjà lu, puis la suite du flux d'origine"""
+
+    def __init__(self, prefixe, flux):
+        self.prefixe = memoryview(prefixe)
+        self.flux = flux
+
+    def readable(self):
+        return True
+
+    def readinto(self, tampon):
+        if self.prefixe:
+            taille = min(len(tampon), len(self.prefixe))
+            tampon[:taille] = self.prefixe[:taille]
+            self.prefixe = self.prefixe[taille:]
+            return taille
+        return self.flux.readinto(tampon)
+
+
+def ouvrir_csv(flux, import_obj, colonnes_attendues=(), normaliser=normaliser_entete):
+    """
+    Lecteur csv.reader sur un flux binaire, au format détecté ou repris d'un import précédent de
+    même signature. Le format est reporté sur `import_obj` (enregistré avec lui). Renvoie
+    (lecteur, format) ; format = {'encodage', 'delimiteur', 'guillemet', 'entete'}.
+    """
+    from imports.models import ImportFichier
+
+    echantillon = flux.read(TAILLE_ECHANTILLON)
+    encodage = detecter_encodage(echantillon)
+    signature = signature_format(import_obj.type_fichier, echantillon)
+    connu = ImportFichier.objects.filter(
+        type_fichier=import_obj.type_fichier, format_signature=signature, statut='termine'
+    ).exclude(delimiteur='').order_by('-date_import').values('delimiteur', 'guillemet', 'entete').first()
+    if connu:
+        dialecte = connu
+    else:
+        texte = codecs.getincrementaldecoder(encodage)(errors='imports_cp1252').decode(echantillon, final=False)
+        if len(echantillon) == TAILLE_ECHANTILLON:
+            texte = texte[:texte.rfind('\n') + 1] or texte  # dernière ligne coupée ignorée
+        dialecte = detecter_dialecte(texte, colonnes_attendues, normaliser)
+    format_fichier = {'encodage': encodage, **dialecte}
+
+    # Format du premier fichier (ou membre d'archive) conservé sur l'import
+    if not import_obj.format_signature:
+        import_obj.format_signature = signature
+        import_obj.encodage = encodage
+        import_obj.delimiteur = dialecte['delimiteur']
+        import_obj.guillemet = dialecte['guillemet']
+        import_obj.entete = dialecte['entete']
+
+    binaire = io.BufferedReader(_FluxPrefixe(echantillon, flux), buffer_size=64 * 1024)
+    texte = io.TextIOWrapper(binaire, encoding=encodage, errors='imports_cp1252')
+    lecteur = csv.reader(texte, delimiter=dialecte['delimiteur'], quotechar=dialecte['guillemet'])
+    return lecteur, format_fichier
+
+
+def lire_csv(chemin_fichier, import_obj, colonnes_attendues=(), normaliser=normaliser_entete):
+    """(lecteur, format) pour chaque CSV du fichier source : brut, compressé ou membre d'archive .zip"""
+    for _, flux in ouvrir_flux(chemin_fichier, EXTENSIONS_CSV):
+        yield ouvrir_csv(flux, import_obj, colonnes_attendues, normaliser)
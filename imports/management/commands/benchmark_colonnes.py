@@ -0,0 +1,86 @@
+import csv
+import io
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from imports.colonnes import ColonnesCompilees
+from imports.services import COLONNES_ASTEN, COLONNES_BR
+
+# En-têtes des fichiers synthétiques (BOM en tête, comme les exports Excel) et générateurs de lignes
+SCENARIOS = {
+    'asten': (
+        COLONNES_ASTEN,
+        ['\ufeffMagasin', 'Référence commande', 'Référence commande externe', 'Date commande', 'Date livraison', 'Statut', 'Fournisseur', 'Montant'],
+        lambda i, g: [str(9000 + i % 500), f'CMD{i:08d}', f'EXT{i}', '09/01/2026 12:08:03', '10/01/2026', 'Validée', 'F1', f'{g.uniform(10, 5000):.2f}'],
+    ),
+    'br': (
+        COLONNES_BR,
+        ['\ufeffMagasin', 'Date réception', 'Date validation', 'N° DE BR', 'Fournisseur'],
+        lambda i, g: [str(9000 + i % 500), '02/01/2026', '' if g.random() < 0.3 else '03/01/2026', str(100000 + i), 'F1'],
+    ),
+}
+
+
+def _valeur_premiere(row_normalized, candidats):
+    """Recherche par ligne de l'ancien traitement (référence de la mesure)"""
+    for key in candidats:
+        valeur = row_normalized.get(key)
+        if valeur is not None and str(valeur).strip() != '':
+            return str(valeur).strip()
+    return ''
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark de la lecture des colonnes : dictionnaire normalisé reconstruit à chaque ligne "
+        "(csv.DictReader) contre colonnes compilées une fois par fichier (csv.reader + accès par position)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lignes', type=int, default=1_000_000, help='Lignes par fichier synthétique (défaut : 1000000)')
+        parser.add_argument('--graine', type=int, default=42, help='Graine du générateur (défaut : 42)')
+
+    def handle(self, *args, **options):
+        for nom, (candidats, entete, generer) in SCENARIOS.items():
+            generateur = random.Random(options['graine'])
+            tampon = io.StringIO()
+            writer = csv.writer(tampon, delimiter=';')
+            writer.writerow(entete)
+            for i in range(options['lignes']):
+                writer.writerow(generer(i, generateur))
+            texte = tampon.getvalue()
+
+            candidats = {champ: list(noms) for champ, noms in candidats.items()}
+            duree_ligne, valeurs_ligne = self._mesurer(lambda: self._par_ligne(texte, candidats))
+            duree_compile, valeurs_compile = self._mesurer(lambda: self._compile(texte, candidats))
+            if valeurs_ligne != valeurs_compile:
+                self.stdout.write(self.style.ERROR(f'{nom} : valeurs différentes entre les deux lectures'))
+
+            self.stdout.write(
+                f"{nom:<6} {options['lignes']} lignes : par ligne {duree_ligne:.2f} s "
+                f"({options['lignes'] / duree_ligne:,.0f} l/s), compilé {duree_compile:.2f} s "
+                f"({options['lignes'] / duree_compile:,.0f} l/s) — x{duree_ligne / duree_compile:.1f}"
+            )
+
+    def _mesurer(self, traitement):
+        debut = time.perf_counter()
+        valeurs = traitement()
+        return time.perf_counter() - debut, valeurs
+
+    def _par_ligne(self, texte, candidats):
+        dernieres = None
+        for row in csv.DictReader(io.StringIO(texte), delimiter=';'):
+            row_normalized = {str(k).lstrip('\ufeff').strip(): v for k, v in row.items()}
+            dernieres = tuple(_valeur_premiere(row_normalized, noms) for noms in candidats.values())
+        return dernieres
+
+    def _compile(self, texte, candidats):
+        reader = csv.reader(io.StringIO(texte), delimiter=';')
+        colonnes = ColonnesCompilees(next(reader), candidats)
+        dernieres = None
+        for ligne in reader:
+            if not ligne:
+                continue
+            dernieres = tuple(str(valeur).strip() for valeur in colonnes.lire(ligne))
+        return dernieres
@@ -0,0 +1,98 @@
+import csv
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+from core.models import Magasin
+from imports.chargement import copy_disponible
+from imports.services import importer_fichier_asten, importer_fichier_br_asten
+
+# Magasins synthétiques (codes hors de la numérotation réelle)
+CODES_MAGASINS_BENCH = [str(9000 + i) for i in range(500)]
+
+
+def ecrire_fichier_asten(chemin, lignes, codes, generateur):
+    """Fichier Asten synthétique (~5 % de lignes répétées) sur les magasins `codes`"""
+    debut = date(2026, 1, 1)
+    with open(chemin, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(['Magasin', 'Référence commande', 'Date commande', 'Statut', 'Montant'])
+        for i in range(lignes):
+            # ~5 % de lignes répétées dans le fichier
+            numero = i if generateur.random() > 0.05 else generateur.randrange(i + 1)
+            jour = debut + timedelta(days=numero % 90)
+            writer.writerow([
+                codes[numero % len(codes)],
+                f'CMD{numero:08d}',
+                f"{jour.strftime('%d/%m/%Y')} 10:00:00",
+                generateur.choice(['Validée', 'En cours', 'Livrée']),
+                f'{generateur.uniform(10, 5000):.2f}'.replace('.', ','),
+            ])
+
+
+def ecrire_fichier_br(chemin, lignes, codes, generateur):
+    """Fichier BR synthétique : un BR distinct par ligne"""
+    debut = date(2026, 1, 1)
+    with open(chemin, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(['N° de bon de livraison', 'Date', 'Magasin', 'Statut IC'])
+        for i in range(lignes):
+            writer.writerow([
+                str(100000 + i),
+                (debut + timedelta(days=i % 90)).strftime('%d/%m/%Y'),
+                codes[i % len(codes)],
+                generateur.choice(['Intégré', 'Non intégré']),
+            ])
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure les imports Asten et BR sur des fichiers synthétiques (identiques d'une base à l'autre "
+        "pour une même graine) : import initial puis ré-import du même fichier. Rien n'est conservé en base."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lignes', type=int, default=20000, help='Lignes par fichier (défaut : 20000)')
+        parser.add_argument('--magasins', type=int, default=50, help='Nombre de magasins, 500 au plus (défaut : 50)')
+        parser.add_argument('--graine', type=int, default=42, help='Graine du générateur (défaut : 42)')
+        parser.add_argument('--dossier', help='Dossier où écrire les fichiers (défaut : dossier temporaire supprimé)')
+
+    def handle(self, *args, **options):
+        generateur = random.Random(options['graine'])
+        codes = CODES_MAGASINS_BENCH[:options['magasins']]
+
+        with tempfile.TemporaryDirectory() as dossier_temporaire:
+            dossier = options['dossier'] or dossier_temporaire
+            os.makedirs(dossier, exist_ok=True)
+            fichier_asten = os.path.join(dossier, 'bench_asten.csv')
+            fichier_br = os.path.join(dossier, 'bench_br.csv')
+            ecrire_fichier_asten(fichier_asten, options['lignes'], codes, generateur)
+            ecrire_fichier_br(fichier_br, options['lignes'], codes, generateur)
+
+            moteur = f"{connection.vendor} ({'COPY + fusion SQL' if copy_disponible() else 'SELECT + bulk_create'})"
+            self.stdout.write(f"Base : {moteur} — {options['lignes']} lignes par fichier")
+
+            # Archivage désactivé : rien à publier pour des données synthétiques, et seul le
+            # chargement en base est mesuré
+            with override_settings(ARCHIVE_IMPORTS_ACTIVE=False), transaction.atomic():
+                Magasin.objects.bulk_create([Magasin(code=code, nom=f'Bench {code}') for code in codes], ignore_conflicts=True)
+                for libelle, importer, chemin in (
+                    ('Asten', importer_fichier_asten, fichier_asten),
+                    ('BR Asten', importer_fichier_br_asten, fichier_br),
+                ):
+                    for passe in ('import initial', 'ré-import'):
+                        debut = time.perf_counter()
+                        import_obj = importer(chemin)
+                        duree = time.perf_counter() - debut
+                        self.stdout.write(
+                            f"{libelle:<9} {passe:<15} {duree:7.2f} s  "
+                            f"{import_obj.nombre_lignes / duree:9.0f} lignes/s  "
+                            f"nouveaux={import_obj.nombre_nouveaux} doublons={import_obj.nombre_dupliques}"
+                        )
+                # Mesure uniquement : aucune donnée synthétique n'est conservée
+                transaction.set_rollback(True)
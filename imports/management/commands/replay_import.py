@@ -0,0 +1,100 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from core.models import Magasin
+from imports.archives import chemins_archives, modeles_archives, type_archive, SUFFIXE_ARCHIVE
+from imports.chargement import inserer_valeurs
+from imports.models import ImportFichier
+
+# Lignes lues par lot dans l'archive et insérées en une seule requête
+TAILLE_REJEU = 20000
+
+# Champs recopiés sur les lignes existantes, comme le fait l'import (dernière occurrence gagnante)
+CHAMPS_MAJ = {'br_asten': ('statut_ic', 'ic_integre', 'est_quantite_0', 'fichier_source')}
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit les tables de commandes / BR depuis l'archive Parquet des imports "
+        "(ARCHIVE_IMPORTS_DIR), sans relire ni réanalyser les fichiers source"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', action='append', choices=list(modeles_archives()), help='Type de fichier à rejouer (répétable ; défaut : tous)')
+        parser.add_argument('--mois', action='append', help='Mois d\'import AAAA-MM (répétable ; défaut : tous)')
+        parser.add_argument('--fichier', action='append', help='Nom du fichier source (répétable)')
+        parser.add_argument('--purger', action='store_true', help='Supprime d\'abord les lignes issues de ces fichiers (reconstruction exacte)')
+        parser.add_argument('--recalculer', action='store_true', help='Recalcule les écarts après le rejeu')
+
+    def handle(self, *args, **options):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise CommandError("pyarrow est nécessaire pour lire les archives (pip install pyarrow)")
+
+        chemins = chemins_archives(options['source'], options['mois'], options['fichier'])
+        if not chemins:
+            self.stdout.write(self.style.WARNING("Aucune archive ne correspond."))
+            return
+
+        modeles = modeles_archives()
+        codes_magasins = set(Magasin.objects.values_list('code', flat=True))
+        debut = time.perf_counter()
+        total = 0
+        for chemin in chemins:
+            type_fichier = type_archive(chemin)
+            modele, champs_cle = modeles[type_fichier]
+            nom_fichier = chemin.name[:-len(SUFFIXE_ARCHIVE)]
+            debut_fichier = time.perf_counter()
+
+            with transaction.atomic():
+                if options['purger']:
+                    modele.objects.filter(fichier_source=nom_fichier).delete()
+                nombre_lignes = 0
+                avant = modele.objects.count()
+                for batch in pq.ParquetFile(chemin).iter_batches(batch_size=TAILLE_REJEU):
+                    colonnes = batch.to_pydict()
+                    nombre_lignes += batch.num_rows
+                    self._creer_magasins(colonnes, codes_magasins)
+                    # Commandes : la première occurrence l'emporte (get_or_create de l'import) ;
+                    # BR : la dernière (mise à jour du statut IC par l'import)
+                    inserer_valeurs(modele, colonnes, champs_cle, CHAMPS_MAJ.get(type_fichier, ()))
+                nombre_nouveaux = modele.objects.count() - avant
+
+                # Le rejeu remplace l'import d'origine dans l'historique (et fait avancer la version des données)
+                ImportFichier.objects.filter(type_fichier=type_fichier, nom_fichier=nom_fichier).delete()
+                ImportFichier.objects.create(
+                    type_fichier=type_fichier,
+                    nom_fichier=nom_fichier,
+                    chemin_fichier=str(chemin),
+                    nombre_lignes=nombre_lignes,
+                    nombre_nouveaux=nombre_nouveaux,
+                    nombre_dupliques=nombre_lignes - nombre_nouveaux,
+                    statut='termine',
+                )
+            total += nombre_lignes
+            self.stdout.write(
+                f"{type_fichier:<9} {nom_fichier} : {nombre_lignes} lignes, {nombre_nouveaux} créées "
+                f"en {time.perf_counter() - debut_fichier:.2f} s"
+            )
+
+        duree = time.perf_counter() - debut
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {len(chemins)} archive(s), {total} lignes rejouées en {duree:.1f} s ({total / duree:.0f} lignes/s)"
+        ))
+
+        if options['recalculer']:
+            from ecarts.services import recalculer_ecarts
+
+            resultat = recalculer_ecarts()
+            self.stdout.write(f"Écarts : {resultat['ecarts_crees']} créés, {resultat['ecarts_resolus']} résolus")
+
+    def _creer_magasins(self, colonnes, codes_magasins):
+        """Magasins supprimés depuis l'import d'origine : recréés comme le fait l'import BR"""
+        if 'code_magasin_id' not in colonnes:
+            return  # Legend : dépôt d'origine en texte libre
+        inconnus = set(colonnes['code_magasin_id']) - codes_magasins
+        if inconnus:
+            Magasin.objects.bulk_create([Magasin(code=code, nom=code) for code in inconnus], ignore_conflicts=True)
+            codes_magasins.update(inconnus)
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-19 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importfichier',
+            name='nombre_mis_a_jour',
+            field=models.IntegerField(default=0, verbose_name='Nombre de lignes mises à jour'),
+        ),
+        migrations.AddField(
+            model_name='importfichier',
+            name='nombre_inchanges',
+            field=models.IntegerField(default=0, verbose_name='Nombre de lignes inchangées'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('imports', '0002_importfichier_nombre_mis_a_jour_nombre_inchanges'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importfichier',
+            name='format_signature',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=40, verbose_name='Signature du format'),
+        ),
+        migrations.AddField(
+            model_name='importfichier',
+            name='encodage',
+            field=models.CharField(blank=True, default='', max_length=20, verbose_name='Encodage'),
+        ),
+        migrations.AddField(
+            model_name='importfichier',
+            name='delimiteur',
+            field=models.CharField(blank=True, default='', max_length=1, verbose_name='Délimiteur'),
+        ),
+        migrations.AddField(
+            model_name='importfichier',
+            name='guillemet',
+            field=models.CharField(blank=True, default='', max_length=1, verbose_name='Guillemet'),
+        ),
+        migrations.AddField(
+            model_name='importfichier',
+            name='entete',
+            field=models.BooleanField(blank=True, null=True, verbose_name='Avec en-tête'),
+        ),
+    ]
@@ -19,6 +19,8 @@ class ImportFichier(models.Model):
     nombre_lignes = models.IntegerField(default=0, verbose_name="Nombre de lignes importées")
     nombre_nouveaux = models.IntegerField(default=0, verbose_name="Nombre de nouvelles commandes")
     nombre_dupliques = models.IntegerField(default=0, verbose_name="Nombre de doublons ignorés")
+    nombre_mis_a_jour = models.IntegerField(default=0, verbose_name="Nombre de lignes mises à jour")
+    nombre_inchanges = models.IntegerField(default=0, verbose_name="Nombre de lignes inchangées")
     
     statut = models.CharField(
         max_length=20,
@@ -33,6 +35,13 @@ class ImportFichier(models.Model):
     
     message_erreur = models.TextField(null=True, blank=True, verbose_name="Message d'erreur")
 
+    # Format CSV détecté (imports/formats.py), repris par les fichiers de même signature
+    format_signature = models.CharField(max_length=40, blank=True, default='', db_index=True, verbose_name="Signature du format")
+    encodage = models.CharField(max_length=20, blank=True, default='', verbose_name="Encodage")
+    delimiteur = models.CharField(max_length=1, blank=True, default='', verbose_name="Délimiteur")
+    guillemet = models.CharField(max_length=1, blank=True, default='', verbose_name="Guillemet")
+    entete = models.BooleanField(null=True, blank=True, verbose_name="Avec en-tête")
+
     class Meta:
         verbose_name = "Import de fichier"
         verbose_name_plural = "Imports de fichiers"
@@ -1,7 +1,7 @@
-import csv
+import io
 import os
-import pandas as pd
-from datetime import datetime
+import sys
+from datetime import datetime, timedelta
 from pathlib import Path
 from django.conf import settings
 from django.db import transaction
@@ -15,8 +15,13 @@ try:
     from legend.models import CommandeLegend
 except Exception:
     CommandeLegend = None
-from br.models import BRAsten
+from br.models import BRAsten, statut_est_quantite_0
 from imports.models import ImportFichier
+from imports.archives import ArchiveImport
+from imports.chargement import LotInsertion, copy_disponible, enregistrer_isole, fusionner_lot
+from imports.colonnes import ColonnesCompilees, est_vide, noms_colonnes, normaliser_entete_cyrus
+from imports.formats import lire_csv, ouvrir_csv
+from imports.sources import EXTENSIONS_CSV, EXTENSIONS_EXCEL, lister_fichiers_source, ouvrir_flux
 
 
 def parse_date_cyrus(date_str):
@@ -89,13 +94,11 @@ def parse_date_br(date_str):
     if not date_str:
         return None
     
-    # Gérer les valeurs NaN/NaT de pandas
-    try:
-        import pandas as pd
-        if pd.isna(date_str):
-            return None
-    except:
-        pass
+    # Gérer les valeurs NaN/NaT de pandas. Ces valeurs ne viennent que des fichiers Excel (lus avec
+    # pandas) : inutile d'importer pandas ici s'il n'est pas déjà chargé.
+    pd = sys.modules.get('pandas')
+    if pd is not None and pd.isna(date_str):
+        return None
     
     # Si c'est un Timestamp pandas
     if hasattr(date_str, 'to_pydatetime'):
@@ -111,17 +114,11 @@ def parse_date_br(date_str):
         except (AttributeError, ValueError):
             pass
     
-    # Si c'est un nombre (date Excel sérialisée)
+    # Si c'est un nombre (date Excel sérialisée : jours depuis le 30/12/1899)
     if isinstance(date_str, (int, float)):
         try:
-            # Excel date serial: 1 = 1900-01-01, mais pandas utilise 1900-01-01 comme 0
-            # On utilise pandas pour convertir si disponible
-            import pandas as pd
-            if isinstance(date_str, float) or isinstance(date_str, int):
-                # Convertir le nombre en date via pandas
-                date_obj = pd.to_datetime(date_str, origin='1899-12-30', unit='D')
-                return date_obj.date()
-        except (ValueError, TypeError, AttributeError):
+            return (datetime(1899, 12, 30) + timedelta(days=date_str)).date()
+        except (ValueError, TypeError, OverflowError):
             pass
     
     # Sinon, traiter comme une chaîne de caractères
@@ -141,14 +138,6 @@ def parse_date_br(date_str):
     return None
 
 
-def get_valeur_premiere(row_normalized, candidats):
-    for key in candidats:
-        valeur = row_normalized.get(key)
-        if valeur is not None and str(valeur).strip() != '':
-            return str(valeur).strip()
-    return ''
-
-
 def normalize_numero_br(valeur):
     if valeur is None:
         return ''
@@ -227,6 +216,21 @@ def parse_exportee_legend(valeur):
     return valeur in ['coché', 'coche', 'oui', 'true', '1', 'x']
 
 
+# Champ -> colonnes possibles du fichier Legend (voir imports/colonnes.py)
+COLONNES_LEGEND = {
+    'numero': ('Numéro',),
+    'depot_destination': ('Dépôt de destination',),
+    'depot_origine': ("Dépôt d'origine",),
+    'date': ('Date',),
+    'observation': ('Observation',),
+    'transfert': ('Transfert entre dépôt',),
+    'exportee': ('Exportée',),
+    'code_client': ('Code du client',),
+    'code_depot': ('Code du dépôt',),
+    'date_livraison_prevue': ('Date de livraison prévue',),
+}
+
+
 def importer_fichier_legend(chemin_fichier):
     """
     Importe un fichier CSV Legend dans la base de données.
@@ -240,78 +244,87 @@ def importer_fichier_legend(chemin_fichier):
         chemin_fichier=chemin_fichier,
         statut='en_cours'
     )
+    archive = ArchiveImport('legend', nom_fichier, CommandeLegend)
 
     try:
         nombre_lignes = 0
-        nombre_nouveaux = 0
-        nombre_dupliques = 0
-
-        with open(chemin_fichier, 'r', encoding='utf-8') as f:
-            first_line = f.readline()
-            delimiter = ';' if ';' in first_line else ','
-            f.seek(0)
-
-            reader = csv.DictReader(f, delimiter=delimiter)
-            for row in reader:
+        lot = LotInsertion(CommandeLegend, ('date_commande', 'numero_commande', 'depot_origine'), archive=archive)
+
+        # Encodage et délimiteur détectés une fois par fichier (ou repris d'un import de même forme)
+        for reader, _ in lire_csv(chemin_fichier, import_obj, noms_colonnes(COLONNES_LEGEND)):
+            # En-tête normalisé une fois (BOM, espaces), puis lecture par position
+            colonnes = ColonnesCompilees(next(reader, []), COLONNES_LEGEND)
+            for ligne in reader:
+                if not ligne:
+                    continue  # ligne vide, ignorée comme par csv.DictReader
                 nombre_lignes += 1
                 try:
-                    # Normaliser les clés pour gérer un éventuel BOM (﻿) et les espaces
-                    row_normalized = {str(k).lstrip('\ufeff').strip(): v for k, v in row.items()}
+                    (numero_brut, depot_destination, depot_origine, date_str, observation, transfert,
+                     exportee, code_client, code_depot, date_livraison_str) = (valeur.strip() for valeur in colonnes.lire(ligne))
 
-                    numero_brut = row_normalized.get('Numéro', '').strip()
                     numero_commande = extraire_numero_legend(numero_brut)
-                    depot_destination = row_normalized.get('Dépôt de destination', '').strip() or None
-                    depot_origine = row_normalized.get("Dépôt d'origine", '').strip() or None
-                    date_commande = parse_date_legend(row_normalized.get('Date', '').strip())
-                    observation = row_normalized.get('Observation', '').strip() or None
-                    transfert = row_normalized.get('Transfert entre dépôt', '').strip() or None
-                    exportee = parse_exportee_legend(row_normalized.get('Exportée', '').strip())
-                    code_client = row_normalized.get('Code du client', '').strip() or None
-                    code_depot = row_normalized.get('Code du dépôt', '').strip() or None
-                    date_livraison_prevue = parse_date_legend(row_normalized.get('Date de livraison prévue', '').strip())
+                    depot_destination = depot_destination or None
+                    depot_origine = depot_origine or None
+                    date_commande = parse_date_legend(date_str)
+                    observation = observation or None
+                    transfert = transfert or None
+                    exportee = parse_exportee_legend(exportee)
+                    code_client = code_client or None
+                    code_depot = code_depot or None
+                    date_livraison_prevue = parse_date_legend(date_livraison_str)
 
                     if not numero_commande or not date_commande or not depot_origine:
                         continue
 
-                    commande, created = CommandeLegend.objects.get_or_create(
-                        date_commande=date_commande,
-                        numero_commande=numero_commande,
-                        depot_origine=depot_origine,
-                        defaults={
-                            'numero_brut': numero_brut,
-                            'depot_destination': depot_destination,
-                            'observation': observation,
-                            'transfert': transfert,
-                            'exportee': exportee,
-                            'code_client': code_client,
-                            'code_depot': code_depot,
-                            'date_livraison_prevue': date_livraison_prevue,
-                            'fichier_source': nom_fichier,
-                        }
-                    )
-
-                    if created:
-                        nombre_nouveaux += 1
-                    else:
-                        nombre_dupliques += 1
+                    # Ajout au lot (insertion groupée des commandes absentes, voir imports/chargement.py)
+                    lot.ajouter({
+                        'date_commande': date_commande,
+                        'numero_commande': numero_commande,
+                        'depot_origine': depot_origine,
+                        'numero_brut': numero_brut,
+                        'depot_destination': depot_destination,
+                        'observation': observation,
+                        'transfert': transfert,
+                        'exportee': exportee,
+                        'code_client': code_client,
+                        'code_depot': code_depot,
+                        'date_livraison_prevue': date_livraison_prevue,
+                        'fichier_source': nom_fichier,
+                    })
                 except Exception as e:
                     print(f"Erreur ligne {nombre_lignes}: {e}")
                     continue
+        lot.enregistrer()
+        archive.terminer()
 
         import_obj.nombre_lignes = nombre_lignes
-        import_obj.nombre_nouveaux = nombre_nouveaux
-        import_obj.nombre_dupliques = nombre_dupliques
+        import_obj.nombre_nouveaux = lot.nombre_nouveaux
+        import_obj.nombre_dupliques = lot.nombre_dupliques
         import_obj.statut = 'termine'
         import_obj.save()
 
         return import_obj
     except Exception as e:
+        archive.abandonner()
         import_obj.statut = 'erreur'
         import_obj.message_erreur = str(e)
         import_obj.save()
         raise
 
 
+# Nombre de BR distincts accumulés avant chaque upsert groupé
+TAILLE_LOT_BR = 1000
+
+# Champ -> colonnes possibles des fichiers BR, par priorité (voir imports/colonnes.py)
+COLONNES_BR = {
+    'numero_br': ('N° de bon de livraison', 'N° de bon livraison', 'N° bon de livraison', 'Numero BL', 'Numéro BL', 'N° DE BR', 'N° BR'),
+    # Prioriser la date de validation, puis date de réception, puis date BR
+    'date_br': ('Date validation', 'Date réception', 'Date reception', 'Date', 'Date BR'),
+    'magasin': ('Magasin', 'Code magasin', 'Code Magasin'),
+    'statut_ic': ('Statut IC', 'Statut', 'Intégration IC', 'Integration IC'),
+}
+
+
 def importer_fichier_br_asten(chemin_fichier):
     """
     Importe un fichier BR ASTEN (CSV ou Excel).
@@ -330,26 +343,28 @@ def importer_fichier_br_asten(chemin_fichier):
         chemin_fichier=chemin_fichier,
         statut='en_cours'
     )
+    archive = ArchiveImport('br_asten', nom_fichier, BRAsten)
 
     try:
         nombre_lignes = 0
         nombre_nouveaux = 0
+        nombre_mis_a_jour = 0
+        nombre_inchanges = 0
         nombre_dupliques = 0
+        codes_magasins_connus = set()
+        # (numero_br, date_br, code_magasin) -> (statut_ic, ic_integre) ; la dernière ligne du fichier l'emporte
+        en_attente = {}
 
-        def enregistrer_br(row_normalized, statut_ic_force=None, ic_integre_force=None):
-            nonlocal nombre_lignes, nombre_nouveaux, nombre_dupliques
+        def enregistrer_br(valeurs, statut_ic_force=None, ic_integre_force=None):
+            """`valeurs` : (numéro, date, magasin, statut IC) lus par ColonnesCompilees(COLONNES_BR)"""
+            nonlocal nombre_lignes, nombre_dupliques
             nombre_lignes += 1
 
-            numero_br = normalize_numero_br(get_valeur_premiere(
-                row_normalized,
-                ['N° de bon de livraison', 'N° de bon livraison', 'N° bon de livraison', 'Numero BL', 'Numéro BL', 'N° DE BR', 'N° BR']
-            ))
-            # Prioriser la date de validation, puis date de réception, puis date BR
-            date_br_str = get_valeur_premiere(row_normalized, ['Date validation', 'Date réception', 'Date reception', 'Date', 'Date BR'])
-            code_magasin = normalize_code_magasin(get_valeur_premiere(row_normalized, ['Magasin', 'Code magasin', 'Code Magasin']))
-            statut_ic = statut_ic_force if statut_ic_force is not None else get_valeur_premiere(
-                row_normalized, ['Statut IC', 'Statut', 'Intégration IC', 'Integration IC']
-            )
+            numero_brut, date_br_str, magasin, statut_ic = ('' if est_vide(valeur) else str(valeur).strip() for valeur in valeurs)
+            numero_br = normalize_numero_br(numero_brut)
+            code_magasin = normalize_code_magasin(magasin)
+            if statut_ic_force is not None:
+                statut_ic = statut_ic_force
             # Si ic_integre_force est défini (feuille Excel), l'utiliser
             # Sinon, si statut_ic est vide, considérer comme intégré par défaut (pour les CSV sans statut)
             if ic_integre_force is not None:
@@ -365,40 +380,130 @@ def importer_fichier_br_asten(chemin_fichier):
             if not numero_br or not date_br or not code_magasin:
                 # Log pour debug : pourquoi la ligne est ignorée
                 if not numero_br:
-                    print(f"Ligne ignorée: numéro BR manquant (valeur: {row_normalized.get('N° de bon de livraison', 'N/A')})")
+                    print(f"Ligne ignorée: numéro BR manquant (valeur: {numero_brut or 'N/A'})")
                 elif not date_br:
                     print(f"Ligne ignorée: date BR invalide (valeur: {date_br_str}, type: {type(date_br_str)})")
                 elif not code_magasin:
-                    print(f"Ligne ignorée: code magasin manquant (valeur: {row_normalized.get('Magasin', 'N/A')})")
+                    print(f"Ligne ignorée: code magasin manquant (valeur: {magasin or 'N/A'})")
                 return
 
-            magasin, _ = Magasin.objects.get_or_create(
-                code=code_magasin,
-                defaults={'nom': code_magasin}
-            )
+            cle = (numero_br, date_br, code_magasin)
+            if cle in en_attente:
+                nombre_dupliques += 1  # même BR répété dans le fichier
+            en_attente[cle] = (statut_ic, ic_integre)
+            if len(en_attente) >= TAILLE_LOT_BR:
+                enregistrer_lot_br()
+
+        def enregistrer_lot_br():
+            """
+            Upsert groupé d'un lot de BR sur la clé (numero_br, date_br, code_magasin) :
+            sous PostgreSQL un COPY + fusion SQL (imports/chargement.py), sinon un SELECT des BR
+            existants, un INSERT groupé des nouveaux, un UPDATE groupé des BR dont le statut IC
+            a changé (les BR inchangés ne reçoivent que le nouveau fichier_source).
+            """
+            nonlocal nombre_nouveaux, nombre_mis_a_jour, nombre_inchanges
+            if not en_attente:
+                return
+            lot = dict(en_attente)
+            en_attente.clear()
+
+            # Créer en une fois les magasins inconnus
+            codes_lot = {code for _, _, code in lot}
+            codes_inconnus = codes_lot - codes_magasins_connus
+            if codes_inconnus:
+                existants = set(Magasin.objects.filter(code__in=codes_inconnus).values_list('code', flat=True))
+                Magasin.objects.bulk_create(
+                    [Magasin(code=code, nom=code) for code in codes_inconnus - existants],
+                    ignore_conflicts=True,
+                )
+                codes_magasins_connus.update(codes_inconnus)
 
-            br, created = BRAsten.objects.get_or_create(
-                numero_br=numero_br,
-                date_br=date_br,
-                code_magasin=magasin,
-                defaults={
-                    'fichier_source': nom_fichier,
+            valeurs = {
+                (numero_br, date_br, code_magasin): {
+                    'numero_br': numero_br,
+                    'date_br': date_br,
+                    'code_magasin_id': code_magasin,
                     'statut_ic': statut_ic,
                     'ic_integre': ic_integre,
+                    'est_quantite_0': statut_est_quantite_0(statut_ic),
+                    'fichier_source': nom_fichier,
                 }
-            )
-            if created:
-                nombre_nouveaux += 1
-            else:
-                nombre_dupliques += 1
-                if br.statut_ic != statut_ic or br.ic_integre != ic_integre or br.fichier_source != nom_fichier:
+                for (numero_br, date_br, code_magasin), (statut_ic, ic_integre) in lot.items()
+            }
+            if copy_disponible():
+                # PostgreSQL : COPY du lot dans une table temporaire puis fusion en SQL sur la clé naturelle
+                # (lot refusé par la base : rejoué ligne à ligne, seules les lignes fautives sont écartées)
+                resultats, rejetees = enregistrer_isole(lambda sous_lot: fusionner_lot(
+                    BRAsten,
+                    sous_lot,
+                    ('numero_br', 'date_br', 'code_magasin_id'),
+                    champs_compares=('statut_ic', 'ic_integre'),
+                    champs_derives=('est_quantite_0',),
+                    champs_toujours_maj=('fichier_source',),
+                ), valeurs)
+                for cle, erreur in rejetees.items():
+                    print(f"Ligne rejetée {cle}: {erreur}")
+                    del valeurs[cle]
+                archive.ajouter(list(valeurs.values()))
+                crees = sum(crees for crees, _ in resultats)
+                mis_a_jour = sum(mis_a_jour for _, mis_a_jour in resultats)
+                nombre_nouveaux += crees
+                nombre_mis_a_jour += mis_a_jour
+                nombre_inchanges += len(valeurs) - crees - mis_a_jour
+                return
+
+            archive.ajouter(list(valeurs.values()))
+
+            br_existants = {
+                (br.numero_br, br.date_br, br.code_magasin_id): br
+                for br in BRAsten.objects.filter(
+                    numero_br__in={numero for numero, _, _ in lot},
+                    code_magasin_id__in=codes_lot,
+                ).only('id', 'numero_br', 'date_br', 'code_magasin', 'statut_ic', 'ic_integre', 'fichier_source')
+            }
+
+            nouveaux = []
+            modifies = []
+            source_a_mettre_a_jour = []
+            for (numero_br, date_br, code_magasin), (statut_ic, ic_integre) in lot.items():
+                br = br_existants.get((numero_br, date_br, code_magasin))
+                if br is None:
+                    nouveaux.append(BRAsten(
+                        numero_br=numero_br,
+                        date_br=date_br,
+                        code_magasin_id=code_magasin,
+                        statut_ic=statut_ic,
+                        ic_integre=ic_integre,
+                        est_quantite_0=statut_est_quantite_0(statut_ic),
+                        fichier_source=nom_fichier,
+                    ))
+                elif br.statut_ic != statut_ic or br.ic_integre != ic_integre:
                     br.statut_ic = statut_ic
                     br.ic_integre = ic_integre
+                    br.est_quantite_0 = statut_est_quantite_0(statut_ic)
                     br.fichier_source = nom_fichier
-                    br.save(update_fields=['statut_ic', 'ic_integre', 'fichier_source'])
+                    modifies.append(br)
+                else:
+                    nombre_inchanges += 1
+                    if br.fichier_source != nom_fichier:
+                        source_a_mettre_a_jour.append(br.pk)
+
+            # bulk_create / bulk_update ne passent pas par save() : est_quantite_0 est renseigné ci-dessus
+            with transaction.atomic():
+                BRAsten.objects.bulk_create(nouveaux, batch_size=500)
+                BRAsten.objects.bulk_update(
+                    modifies, ['statut_ic', 'ic_integre', 'est_quantite_0', 'fichier_source'], batch_size=500
+                )
+                if source_a_mettre_a_jour:
+                    BRAsten.objects.filter(pk__in=source_a_mettre_a_jour).update(fichier_source=nom_fichier)
+            nombre_nouveaux += len(nouveaux)
+            nombre_mis_a_jour += len(modifies)
 
-        if chemin_fichier.lower().endswith(('.xlsx', '.xls')):
-            xl = pd.ExcelFile(chemin_fichier)
+        def traiter_excel(classeur):
+            # pandas (lourd à importer) n'est chargé que pour les fichiers Excel
+            import pandas as pd
+
+            xl = pd.ExcelFile(classeur)
             # Vérifier s'il y a des feuilles avec "BRS" ou "BR" dans le nom
             feuilles_avec_br = [s for s in xl.sheet_names if 'BRS' in s.upper() or ('BR' in s.upper() and not s.upper().startswith('BR'))]
             traiter_toutes_les_feuilles = len(feuilles_avec_br) == 0
@@ -435,8 +540,8 @@ def importer_fichier_br_asten(chemin_fichier):
                         statut_ic_force = 'Intégré'
                         ic_integre_force = True
 
-                # Lire le fichier Excel
-                df = pd.read_excel(chemin_fichier, sheet_name=sheet_name)
+                # Lire la feuille (classeur déjà ouvert)
+                df = xl.parse(sheet_name)
                 
                 # Si toutes les colonnes sont "Unnamed", essayer de détecter les colonnes
                 if all(str(col).startswith('Unnamed') for col in df.columns):
@@ -470,44 +575,66 @@ def importer_fichier_br_asten(chemin_fichier):
                         except:
                             pass
                 
-                for _, row in df.iterrows():
+                # Colonnes résolues une fois par feuille ; lignes complètement vides ignorées
+                colonnes = ColonnesCompilees(list(df.columns), COLONNES_BR)
+                for ligne in df.dropna(how='all').values.tolist():
                     try:
-                        # Ignorer les lignes complètement vides
-                        if row.isna().all():
-                            continue
-                        row_normalized = {str(k).lstrip('\ufeff').strip(): v for k, v in row.items()}
-                        enregistrer_br(row_normalized, statut_ic_force, ic_integre_force)
+                        enregistrer_br(colonnes.lire(ligne), statut_ic_force, ic_integre_force)
                     except Exception as e:
                         print(f"Erreur ligne feuille {sheet_name}: {e}")
                         continue
-        else:
-            with open(chemin_fichier, 'r', encoding='utf-8') as f:
-                first_line = f.readline()
-                delimiter = ';' if ';' in first_line else ','
-                f.seek(0)
-
-                reader = csv.DictReader(f, delimiter=delimiter)
-                for row in reader:
-                    try:
-                        row_normalized = {str(k).lstrip('\ufeff').strip(): v for k, v in row.items()}
-                        enregistrer_br(row_normalized)
-                    except Exception as e:
-                        print(f"Erreur ligne {nombre_lignes}: {e}")
-                        continue
+
+        def traiter_csv(reader):
+            colonnes = ColonnesCompilees(next(reader, []), COLONNES_BR)
+            for ligne in reader:
+                if not ligne:
+                    continue  # ligne vide, ignorée comme par csv.DictReader
+                try:
+                    enregistrer_br(colonnes.lire(ligne))
+                except Exception as e:
+                    print(f"Erreur ligne {nombre_lignes}: {e}")
+                    continue
+
+        # Fichier brut, compressé ou archive .zip (chaque membre CSV / Excel est importé)
+        for nom_membre, flux in ouvrir_flux(chemin_fichier, EXTENSIONS_CSV + EXTENSIONS_EXCEL):
+            if nom_membre.lower().endswith(EXTENSIONS_EXCEL):
+                # Un classeur se lit par accès aléatoire : membre d'archive chargé en mémoire
+                traiter_excel(flux if isinstance(flux, io.BufferedReader) else io.BytesIO(flux.read()))
+            else:
+                reader, _ = ouvrir_csv(flux, import_obj, noms_colonnes(COLONNES_BR))
+                traiter_csv(reader)
+
+        enregistrer_lot_br()
+        archive.terminer()
 
         import_obj.nombre_lignes = nombre_lignes
         import_obj.nombre_nouveaux = nombre_nouveaux
-        import_obj.nombre_dupliques = nombre_dupliques
+        import_obj.nombre_mis_a_jour = nombre_mis_a_jour
+        import_obj.nombre_inchanges = nombre_inchanges
+        # Doublons = BR déjà connus (mis à jour ou non) + répétitions dans le fichier
+        import_obj.nombre_dupliques = nombre_dupliques + nombre_mis_a_jour + nombre_inchanges
         import_obj.statut = 'termine'
         import_obj.save()
         return import_obj
     except Exception as e:
+        archive.abandonner()
         import_obj.statut = 'erreur'
         import_obj.message_erreur = str(e)
         import_obj.save()
         raise
 
 
+# Champ -> colonnes possibles du fichier Asten (voir imports/colonnes.py)
+COLONNES_ASTEN = {
+    'magasin': ('Magasin',),
+    'numero_commande': ('Référence commande',),
+    'date_commande': ('Date commande',),
+    'statut': ('Statut',),
+    # Montant optionnel : chaque colonne possible est lue, la première valeur numérique l'emporte
+    **{f'montant:{nom}': (nom,) for nom in ('QCDUID TOTAL', 'Montant', 'montant', 'Total')},
+}
+
+
 def importer_fichier_asten(chemin_fichier):
     """
     Importe un fichier CSV Asten dans la base de données
@@ -531,94 +658,92 @@ def importer_fichier_asten(chemin_fichier):
         chemin_fichier=chemin_fichier,
         statut='en_cours'
     )
+    archive = ArchiveImport('asten', nom_fichier, CommandeAsten)
     
     try:
         nombre_lignes = 0
-        nombre_nouveaux = 0
-        nombre_dupliques = 0
+        lot = LotInsertion(CommandeAsten, ('date_commande', 'numero_commande', 'code_magasin_id'), archive=archive)
+        codes_magasins = set(Magasin.objects.values_list('code', flat=True))
         
-        # Détecter le délimiteur (point-virgule ou virgule)
-        with open(chemin_fichier, 'r', encoding='utf-8') as f:
-            first_line = f.readline()
-            delimiter = ';' if ';' in first_line else ','
-            f.seek(0)
-            
-            reader = csv.DictReader(f, delimiter=delimiter)
+        # Encodage et délimiteur détectés une fois par fichier (ou repris d'un import de même forme)
+        for reader, _ in lire_csv(chemin_fichier, import_obj, noms_colonnes(COLONNES_ASTEN)):
+            # Colonnes résolues une fois sur l'en-tête, puis lues par position
+            colonnes = ColonnesCompilees(next(reader, []), COLONNES_ASTEN)
             
-            for row in reader:
+            for ligne in reader:
+                if not ligne:
+                    continue  # ligne vide, ignorée comme par csv.DictReader
                 nombre_lignes += 1
                 
                 try:
-                    # Parsing des données avec les noms de colonnes réels
-                    code_magasin = normalize_code_magasin(row.get('Magasin', '').strip())
-                    numero_commande = row.get('Référence commande', '').strip()
-                    date_commande_str = row.get('Date commande', '').strip()
-                    date_commande = parse_date_asten(date_commande_str)
+                    magasin, numero_commande, date_commande_str, statut, *montants = colonnes.lire(ligne)
+                    code_magasin = normalize_code_magasin(magasin.strip())
+                    numero_commande = numero_commande.strip()
+                    date_commande = parse_date_asten(date_commande_str.strip())
                     
                     if not date_commande or not numero_commande or not code_magasin:
                         continue
                     
                     # Vérifier que le magasin existe
-                    try:
-                        magasin = Magasin.objects.get(code=code_magasin)
-                    except Magasin.DoesNotExist:
+                    if code_magasin not in codes_magasins:
                         continue
                     
-                    # Récupérer les autres informations
-                    reference_externe = row.get('Référence commande externe', '').strip() or None
-                    date_livraison_str = row.get('Date livraison', '').strip()
-                    date_validation_str = row.get('Date validation', '').strip()
-                    statut = row.get('Statut', '').strip() or None
-                    cree_par = row.get('Créée par', '').strip() or None
-                    validee_par = row.get('Validée par', '').strip() or None
-                    fournisseur = row.get('Fournisseur', '').strip() or None
+                    statut = statut.strip() or None
                     
                     # Montant optionnel (chercher différentes colonnes possibles)
                     montant = None
-                    for col in ['QCDUID TOTAL', 'Montant', 'montant', 'Total']:
-                        if row.get(col):
+                    for valeur in montants:
+                        if valeur:
                             try:
-                                montant = float(str(row.get(col)).replace(',', '.'))
+                                montant = float(str(valeur).replace(',', '.'))
                                 break
                             except (ValueError, TypeError):
                                 pass
                     
-                    # Créer ou récupérer la commande (évite les doublons)
-                    commande, created = CommandeAsten.objects.get_or_create(
-                        date_commande=date_commande,
-                        numero_commande=numero_commande,
-                        code_magasin=magasin,
-                        defaults={
-                            'montant': montant,
-                            'statut': statut,
-                            'fichier_source': nom_fichier,
-                        }
-                    )
-                    
-                    if created:
-                        nombre_nouveaux += 1
-                    else:
-                        nombre_dupliques += 1
+                    # Ajout au lot : les commandes déjà connues ne sont pas modifiées (évite les doublons)
+                    lot.ajouter({
+                        'date_commande': date_commande,
+                        'numero_commande': numero_commande,
+                        'code_magasin_id': code_magasin,
+                        'montant': montant,
+                        'statut': statut,
+                        'fichier_source': nom_fichier,
+                    })
                         
                 except Exception as e:
                     print(f"Erreur ligne {nombre_lignes}: {e}")
                     continue
+        lot.enregistrer()
+        archive.terminer()
         
         import_obj.nombre_lignes = nombre_lignes
-        import_obj.nombre_nouveaux = nombre_nouveaux
-        import_obj.nombre_dupliques = nombre_dupliques
+        import_obj.nombre_nouveaux = lot.nombre_nouveaux
+        import_obj.nombre_dupliques = lot.nombre_dupliques
         import_obj.statut = 'termine'
         import_obj.save()
         
         return import_obj
         
     except Exception as e:
+        archive.abandonner()
         import_obj.statut = 'erreur'
         import_obj.message_erreur = str(e)
         import_obj.save()
         raise
 
 
+# Champ -> colonnes possibles du fichier Cyrus, en-tête normalisé (voir imports/colonnes.py)
+COLONNES_CYRUS = {
+    'code_magasin': ('NCID',),
+    'numero_commande': ('NCDE',),
+    'dcde': ('DCDE',),
+    'dcre': ('DCRE',),
+    'tycm': ('TYCM',),
+    'nom_magasin': ('NOMMAGASINNOMMAGASIN', 'NOMMAGASIN', 'NOMMAG'),
+    'qcduid_total': ('QCDUIDTOTAL',),
+}
+
+
 def importer_fichier_cyrus(chemin_fichier):
     """
     Importe un fichier CSV Cyrus dans la base de données
@@ -638,27 +763,23 @@ def importer_fichier_cyrus(chemin_fichier):
         chemin_fichier=chemin_fichier,
         statut='en_cours'
     )
+    archive = ArchiveImport('cyrus', nom_fichier, CommandeCyrus)
     
     try:
         nombre_lignes = 0
-        nombre_nouveaux = 0
-        nombre_dupliques = 0
+        lot = LotInsertion(CommandeCyrus, ('date_commande', 'numero_commande', 'code_magasin_id'), archive=archive)
+        codes_magasins = set(Magasin.objects.values_list('code', flat=True))
         
-        # Détecter le délimiteur (point-virgule ou virgule)
-        with open(chemin_fichier, 'r', encoding='utf-8') as f:
-            first_line = f.readline()
-            delimiter = ';' if ';' in first_line else ','
-            f.seek(0)
-
-            reader = csv.reader(f, delimiter=delimiter)
+        # Encodage (exports Windows-1252), délimiteur et présence de l'en-tête NCID / NCDE / DCDE
+        # détectés une fois par fichier, ou repris d'un import de même forme
+        for reader, format_csv in lire_csv(chemin_fichier, import_obj, ('NCID', 'NCDE', 'DCDE'), normaliser_entete_cyrus):
             header = next(reader, None)
             if header is None:
                 header = []
-            header_normalized = [str(h).strip().upper().replace(' ', '') for h in header]
-            has_header = any(h in header_normalized for h in ['NCID', 'NCDE', 'DCDE'])
+            has_header = format_csv['entete']
 
             def traiter_ligne(code_magasin, numero_commande, dcde_str, dcre_str, tycm, nom_magasin, qcduid_total):
-                nonlocal nombre_lignes, nombre_nouveaux, nombre_dupliques
+                nonlocal nombre_lignes
                 nombre_lignes += 1
 
                 # Normaliser le code magasin sur 3 caractères
@@ -682,9 +803,7 @@ def importer_fichier_cyrus(chemin_fichier):
                     return
 
                 # Vérifier que le magasin existe
-                try:
-                    magasin = Magasin.objects.get(code=code_magasin)
-                except Magasin.DoesNotExist:
+                if code_magasin not in codes_magasins:
                     print(f"Magasin '{code_magasin}' non trouvé pour la commande {numero_commande} du {dcde_str}. Ligne ignorée.")
                     return
 
@@ -699,44 +818,26 @@ def importer_fichier_cyrus(chemin_fichier):
                 # Utiliser TYCM comme statut
                 statut = tycm or None
 
-                commande, created = CommandeCyrus.objects.get_or_create(
-                    date_commande=date_commande,
-                    numero_commande=numero_commande,
-                    code_magasin=magasin,
-                    defaults={
-                        'montant': montant,
-                        'statut': statut,
-                        'fichier_source': nom_fichier,
-                    }
-                )
-                if created:
-                    nombre_nouveaux += 1
-                else:
-                    nombre_dupliques += 1
+                lot.ajouter({
+                    'date_commande': date_commande,
+                    'numero_commande': numero_commande,
+                    'code_magasin_id': code_magasin,
+                    'montant': montant,
+                    'statut': statut,
+                    'fichier_source': nom_fichier,
+                })
 
             if has_header:
-                dict_reader = csv.DictReader(f, delimiter=delimiter, fieldnames=header)
-                for row in dict_reader:
+                # Colonnes résolues une fois sur l'en-tête normalisé, puis lues par position
+                colonnes = ColonnesCompilees(header, COLONNES_CYRUS, normaliser=normaliser_entete_cyrus)
+                for cols in reader:
+                    if not cols:
+                        continue  # ligne vide, ignorée comme par csv.DictReader
                     try:
-                        row_normalized = {}
-                        for key, value in row.items():
-                            key_norm = str(key).strip().upper().replace(' ', '')
-                            row_normalized[key_norm] = str(value).strip() if value is not None else ''
-
-                        code_magasin = row_normalized.get('NCID', '')
-                        numero_commande = row_normalized.get('NCDE', '')
-                        dcde_str = row_normalized.get('DCDE', '')
-                        dcre_str = row_normalized.get('DCRE', '')
-                        tycm = row_normalized.get('TYCM', '') or None
-
-                        nom_magasin = None
-                        for key, value in row_normalized.items():
-                            if 'NOMMAGASIN' in key or 'NOMMAG' in key:
-                                nom_magasin = value or None
-                                break
-
-                        qcduid_total = row_normalized.get('QCDUIDTOTAL', '')
-                        traiter_ligne(code_magasin, numero_commande, dcde_str, dcre_str, tycm, nom_magasin, qcduid_total)
+                        code_magasin, numero_commande, dcde_str, dcre_str, tycm, nom_magasin, qcduid_total = (
+                            valeur.strip() for valeur in colonnes.lire(cols)
+                        )
+                        traiter_ligne(code_magasin, numero_commande, dcde_str, dcre_str, tycm or None, nom_magasin or None, qcduid_total)
                     except Exception as e:
                         print(f"Erreur ligne {nombre_lignes}: {e}")
                         continue
@@ -766,16 +867,19 @@ def importer_fichier_cyrus(chemin_fichier):
                     except Exception as e:
                         print(f"Erreur ligne: {e}")
                         continue
+        lot.enregistrer()
+        archive.terminer()
         
         import_obj.nombre_lignes = nombre_lignes
-        import_obj.nombre_nouveaux = nombre_nouveaux
-        import_obj.nombre_dupliques = nombre_dupliques
+        import_obj.nombre_nouveaux = lot.nombre_nouveaux
+        import_obj.nombre_dupliques = lot.nombre_dupliques
         import_obj.statut = 'termine'
         import_obj.save()
         
         return import_obj
         
     except Exception as e:
+        archive.abandonner()
         import_obj.statut = 'erreur'
         import_obj.message_erreur = str(e)
         import_obj.save()
@@ -810,7 +914,7 @@ def scanner_et_importer_fichiers():
             pass
     
     # Importer les fichiers Asten
-    fichiers_asten = list(dossier_asten.glob('*.csv')) + list(dossier_asten.glob('*.CSV'))
+    fichiers_asten = lister_fichiers_source(dossier_asten)
     for fichier in fichiers_asten:
         try:
             # Obtenir la date de modification du fichier
@@ -842,7 +946,7 @@ def scanner_et_importer_fichiers():
             print(f"Erreur import fichier {fichier.name}: {e}")
     
     # Importer les fichiers Cyrus
-    fichiers_cyrus = list(dossier_cyrus.glob('*.csv')) + list(dossier_cyrus.glob('*.CSV'))
+    fichiers_cyrus = lister_fichiers_source(dossier_cyrus)
     for fichier in fichiers_cyrus:
         try:
             # Obtenir la date de modification du fichier
@@ -877,7 +981,7 @@ def scanner_et_importer_fichiers():
             print(f"Erreur import fichier {fichier.name}: {e}")
     
     # Importer les fichiers GPV
-    fichiers_gpv = list(dossier_gpv.glob('*.csv')) + list(dossier_gpv.glob('*.CSV'))
+    fichiers_gpv = lister_fichiers_source(dossier_gpv)
     for fichier in fichiers_gpv:
         try:
             # Obtenir la date de modification du fichier
@@ -909,7 +1013,7 @@ def scanner_et_importer_fichiers():
             print(f"Erreur import fichier {fichier.name}: {e}")
 
     # Importer les fichiers Legend
-    fichiers_legend = list(dossier_legend.glob('*.csv')) + list(dossier_legend.glob('*.CSV'))
+    fichiers_legend = lister_fichiers_source(dossier_legend)
     for fichier in fichiers_legend:
         try:
             date_modif_fichier = datetime.fromtimestamp(fichier.stat().st_mtime)
@@ -936,11 +1040,7 @@ def scanner_et_importer_fichiers():
             print(f"Erreur import fichier Legend {fichier.name}: {e}")
 
     # Importer les fichiers BR Asten
-    fichiers_br_asten = (
-        list(dossier_br_asten.glob('*.csv')) + list(dossier_br_asten.glob('*.CSV')) +
-        list(dossier_br_asten.glob('*.xlsx')) + list(dossier_br_asten.glob('*.XLSX')) +
-        list(dossier_br_asten.glob('*.xls')) + list(dossier_br_asten.glob('*.XLS'))
-    )
+    fichiers_br_asten = lister_fichiers_source(dossier_br_asten, EXTENSIONS_CSV + EXTENSIONS_EXCEL)
     for fichier in fichiers_br_asten:
         try:
             date_modif_fichier = datetime.fromtimestamp(fichier.stat().st_mtime)
@@ -975,6 +1075,18 @@ def scanner_et_importer_fichiers():
     return fichiers_importes
 
 
+# Champ -> colonnes possibles du fichier GPV (voir imports/colonnes.py)
+COLONNES_GPV = {
+    'numero_commande': ('NUMERO COMMANDE',),
+    'code_magasin': ('CODE MAGASIN',),
+    'nom_magasin': ('NOM  MAGASIN',),
+    'date_creation': ('DATE CREATION',),
+    'date_validation': ('DATE VALIDATION',),
+    'date_transfert': ('DATE TRANSFERT',),
+    'statut': ('STATUT',),
+}
+
+
 def importer_fichier_gpv(chemin_fichier):
     """
     Importe un fichier CSV GPV dans la base de données
@@ -995,32 +1107,29 @@ def importer_fichier_gpv(chemin_fichier):
         chemin_fichier=chemin_fichier,
         statut='en_cours'
     )
+    archive = ArchiveImport('gpv', nom_fichier, CommandeGPV)
     
     try:
         nombre_lignes = 0
-        nombre_nouveaux = 0
-        nombre_dupliques = 0
+        lot = LotInsertion(CommandeGPV, ('date_creation', 'numero_commande', 'code_magasin_id'), archive=archive)
+        codes_magasins = set(Magasin.objects.values_list('code', flat=True))
         
-        # Détecter le délimiteur (point-virgule ou virgule)
-        with open(chemin_fichier, 'r', encoding='utf-8') as f:
-            first_line = f.readline()
-            delimiter = ';' if ';' in first_line else ','
-            f.seek(0)
+        # Encodage et délimiteur détectés une fois par fichier (ou repris d'un import de même forme)
+        for reader, _ in lire_csv(chemin_fichier, import_obj, noms_colonnes(COLONNES_GPV)):
+            # Colonnes résolues une fois sur l'en-tête, puis lues par position
+            colonnes = ColonnesCompilees(next(reader, []), COLONNES_GPV)
             
-            reader = csv.DictReader(f, delimiter=delimiter)
-            
-            for row in reader:
+            for ligne in reader:
+                if not ligne:
+                    continue  # ligne vide, ignorée comme par csv.DictReader
                 nombre_lignes += 1
                 
                 try:
-                    # Parsing des données avec les noms de colonnes réels
-                    numero_commande = row.get('NUMERO COMMANDE', '').strip()
-                    code_magasin = normalize_code_magasin(row.get('CODE MAGASIN', '').strip())
-                    nom_magasin = row.get('NOM  MAGASIN', '').strip() or None
-                    date_creation_str = row.get('DATE CREATION', '').strip()
-                    date_validation_str = row.get('DATE VALIDATION', '').strip()
-                    date_transfert_str = row.get('DATE TRANSFERT', '').strip()
-                    statut = row.get('STATUT', '').strip() or None
+                    (numero_commande, code_magasin, nom_magasin, date_creation_str,
+                     date_validation_str, date_transfert_str, statut) = (valeur.strip() for valeur in colonnes.lire(ligne))
+                    code_magasin = normalize_code_magasin(code_magasin)
+                    nom_magasin = nom_magasin or None
+                    statut = statut or None
                     
                     # Parser les dates
                     date_creation = parse_date_gpv(date_creation_str)
@@ -1031,43 +1140,37 @@ def importer_fichier_gpv(chemin_fichier):
                         continue
                     
                     # Vérifier que le magasin existe
-                    try:
-                        magasin = Magasin.objects.get(code=code_magasin)
-                    except Magasin.DoesNotExist:
+                    if code_magasin not in codes_magasins:
                         continue
                     
-                    # Créer ou récupérer la commande (évite les doublons)
-                    commande, created = CommandeGPV.objects.get_or_create(
-                        date_creation=date_creation,
-                        numero_commande=numero_commande,
-                        code_magasin=magasin,
-                        defaults={
-                            'nom_magasin': nom_magasin,
-                            'date_validation': date_validation,
-                            'date_transfert': date_transfert,
-                            'statut': statut,
-                            'fichier_source': nom_fichier,
-                        }
-                    )
-                    
-                    if created:
-                        nombre_nouveaux += 1
-                    else:
-                        nombre_dupliques += 1
+                    # Ajout au lot : les commandes déjà connues ne sont pas modifiées (évite les doublons)
+                    lot.ajouter({
+                        'date_creation': date_creation,
+                        'numero_commande': numero_commande,
+                        'code_magasin_id': code_magasin,
+                        'nom_magasin': nom_magasin,
+                        'date_validation': date_validation,
+                        'date_transfert': date_transfert,
+                        'statut': statut,
+                        'fichier_source': nom_fichier,
+                    })
                         
                 except Exception as e:
                     print(f"Erreur ligne {nombre_lignes}: {e}")
                     continue
+        lot.enregistrer()
+        archive.terminer()
         
         import_obj.nombre_lignes = nombre_lignes
-        import_obj.nombre_nouveaux = nombre_nouveaux
-        import_obj.nombre_dupliques = nombre_dupliques
+        import_obj.nombre_nouveaux = lot.nombre_nouveaux
+        import_obj.nombre_dupliques = lot.nombre_dupliques
         import_obj.statut = 'termine'
         import_obj.save()
         
         return import_obj
         
     except Exception as e:
+        archive.abandonner()
         import_obj.statut = 'erreur'
         import_obj.message_erreur = str(e)
         import_obj.save()
@@ -0,0 +1,80 @@
+"""
+Fichiers source des imports : fichiers bruts, compressés (.gz, .bz2) ou archives .zip.
+
+Les importeurs lisent les lignes directement dans le flux décompressé, sans fichier temporaire :
+n8n peut déposer `commandes.csv.gz` ou une archive `.zip` de plusieurs CSV (tous les membres sont
+importés) au lieu du CSV brut, soit 5 à 10 fois moins de transfert sur le partage réseau.
+"""
+import bz2
+import gzip
+import zipfile
+from pathlib import Path
+
+EXTENSIONS_CSV = ('.csv',)
+EXTENSIONS_EXCEL = ('.xlsx', '.xls')
+
+# Compression d'un fichier unique : suffixe -> ouverture en flux binaire
+COMPRESSIONS = {'.gz': gzip.open, '.bz2': bz2.open}
+
+
+def _sans_compression(nom):
+    """Nom sans le suffixe de compression (`a.csv.gz` -> `a.csv`)"""
+    nom = nom.lower()
+    for suffixe in COMPRESSIONS:
+        if nom.endswith(suffixe):
+            return nom[:-len(suffixe)]
+    return nom
+
+
+def est_fichier_source(nom, extensions=EXTENSIONS_CSV):
+    """Vrai pour `x.csv`, `x.csv.gz`, `x.csv.bz2` ou une archive `x.zip` (extensions sans casse)"""
+    return nom.lower().endswith('.zip') or _sans_compression(nom).endswith(extensions)
+
+
+def lister_fichiers_source(dossier, extensions=EXTENSIONS_CSV):
+    """Fichiers importables du dossier (remplace les glob('*.csv') / glob('*.CSV'))"""
+    dossier = Path(dossier)
+    if not dossier.exists():
+        return []
+    return sorted(
+        fichier for fichier in dossier.iterdir()
+        if fichier.is_file() and est_fichier_source(fichier.name, extensions)
+    )
+
+
+def ouvrir_flux(chemin_fichier, extensions=EXTENSIONS_CSV):
+    """
+    Génère (nom, flux binaire) pour chaque fichier à importer : le fichier lui-même, décompressé à
+    la volée s'il est .gz / .bz2, ou chaque membre d'une archive .zip ayant une des `extensions`.
+    Chaque flux est fermé quand on passe au suivant. Une archive sans aucun membre importable lève
+    ValueError : l'import est alors en erreur et le fichier source n'est pas supprimé par le scanner.
+    """
+    chemin = str(chemin_fichier)
+    nom = Path(chemin).name
+    if nom.lower().endswith('.zip'):
+        nombre_membres = 0
+        with zipfile.ZipFile(chemin) as archive:
+            for membre in archive.infolist():
+                nom_membre = Path(membre.filename).name
+                # Dossiers et métadonnées macOS ignorés
+                if membre.is_dir() or membre.filename.startswith('__MACOSX/') or nom_membre.startswith('.'):
+                    continue
+                if not _sans_compression(nom_membre).endswith(extensions):
+                    continue
+                nombre_membres += 1
+                with archive.open(membre) as flux:
+                    yield nom_membre, _decompresser(nom_membre, flux)
+        if not nombre_membres:
+            raise ValueError(f"Archive {nom} : aucun fichier {' / '.join(extensions)} à importer")
+        return
+
+    with open(chemin, 'rb') as flux:
+        yield nom, _decompresser(nom, flux)
+
+
+def _decompresser(nom, flux):
+    for suffixe, ouvrir in COMPRESSIONS.items():
+        if nom.lower().endswith(suffixe):
+            return ouvrir(flux)
+    return flux
+
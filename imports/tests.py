@@ -1,3 +1,187 @@
-from django.test import TestCase
+import io
+import tempfile
+import zipfile
+from contextlib import redirect_stdout
+from datetime import date
+from importlib.util import find_spec
+from pathlib import Path
+from unittest import skipUnless
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from br.models import BRAsten
+from core.models import Magasin
+from imports.archives import ArchiveImport, chemins_archives
+from imports.chargement import LotInsertion, copy_disponible, fusionner_lot, inserer_absents, inserer_valeurs
+from imports.models import ImportFichier
+from imports.services import importer_fichier_asten
+from imports.sources import ouvrir_flux
+from legend.models import CommandeLegend
+
+CLE_LEGEND = ('date_commande', 'numero_commande', 'depot_origine')
+CLE_BR = ('numero_br', 'date_br', 'code_magasin_id')
+
+
+def commande_legend(numero, **valeurs):
+    return {
+        'date_commande': date(2026, 1, 9),
+        'numero_commande': numero,
+        'depot_origine': 'D01',
+        'numero_brut': f'CMD-{numero}',
+        'exportee': False,
+        'fichier_source': 'legend.csv',
+        **valeurs,
+    }
+
+
+def br(numero, statut_ic='Intégré', ic_integre=True, fichier_source='br.csv'):
+    return {
+        'numero_br': numero,
+        'date_br': date(2026, 1, 2),
+        'code_magasin_id': '9001',
+        'statut_ic': statut_ic,
+        'ic_integre': ic_integre,
+        'est_quantite_0': False,
+        'fichier_source': fichier_source,
+    }
+
+
+class LotInsertionTests(TestCase):
+    """Insertion groupée des importeurs : une ligne refusée par la base n'écarte qu'elle-même"""
+
+    def test_ligne_refusee_ecartee_du_lot(self):
+        lot = LotInsertion(CommandeLegend, CLE_LEGEND, taille=100)
+        for i in range(5):
+            lot.ajouter(commande_legend(f'C{i}'))
+        lot.ajouter(commande_legend('C0'))  # répétée dans le fichier
+        lot.ajouter(commande_legend('C9', numero_brut=None))  # NOT NULL : refusée par la base
+        sortie = io.StringIO()
+        with redirect_stdout(sortie):
+            lot.enregistrer()
+
+        self.assertEqual(lot.nombre_nouveaux, 5)
+        self.assertEqual(lot.nombre_dupliques, 1)
+        self.assertEqual(lot.nombre_rejetes, 1)
+        self.assertIn('C9', sortie.getvalue())
+        self.assertEqual(
+            sorted(CommandeLegend.objects.values_list('numero_commande', flat=True)),
+            ['C0', 'C1', 'C2', 'C3', 'C4'],
+        )
+
+    def test_lot_suivant_ignore_les_existantes(self):
+        premier = LotInsertion(CommandeLegend, CLE_LEGEND)
+        premier.ajouter(commande_legend('C1'))
+        premier.enregistrer()
+        second = LotInsertion(CommandeLegend, CLE_LEGEND)
+        second.ajouter(commande_legend('C1', numero_brut='autre'))
+        second.ajouter(commande_legend('C2'))
+        second.enregistrer()
+
+        self.assertEqual((second.nombre_nouveaux, second.nombre_dupliques), (1, 1))
+        self.assertEqual(CommandeLegend.objects.get(numero_commande='C1').numero_brut, 'CMD-C1')
+
+
+class ArchiveZipTests(TestCase):
+    """Archive .zip déposée dans un dossier d'import"""
+
+    def setUp(self):
+        dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        self.chemin = Path(dossier.name, 'commandes.zip')
+        with zipfile.ZipFile(self.chemin, 'w') as archive:
+            archive.writestr('commandes.xlsx', b'classeur')
+            archive.writestr('__MACOSX/._commandes.csv', b'')
+
+    def test_aucun_membre_importable(self):
+        with self.assertRaises(ValueError):
+            list(ouvrir_flux(self.chemin))
+
+    def test_import_en_erreur(self):
+        with self.assertRaises(ValueError):
+            importer_fichier_asten(str(self.chemin))
+        self.assertEqual(ImportFichier.objects.get(nom_fichier='commandes.zip').statut, 'erreur')
+
+
+@skipUnless(find_spec('pyarrow'), "pyarrow non installé")
+class ArchiveImportTests(TestCase):
+    """Archive Parquet publiée seulement si la transaction de l'import est validée"""
+
+    def setUp(self):
+        dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        reglages = override_settings(ARCHIVE_IMPORTS_DIR=dossier.name, ARCHIVE_IMPORTS_ACTIVE=True)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+    def _archiver(self):
+        archive = ArchiveImport('legend', 'legend.csv', CommandeLegend)
+        archive.ajouter([commande_legend('C1'), commande_legend('C2')])
+        archive.terminer()
+
+    def test_publiee_a_la_validation(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._archiver()
+        self.assertEqual([chemin.name for chemin in chemins_archives()], ['legend.csv.parquet'])
+
+    def test_rien_publie_sans_validation(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self._archiver()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(chemins_archives(), [])
+
+
+@skipUnless(connection.vendor == 'postgresql', "Chargement par COPY : base PostgreSQL (DB_MOTEUR=postgresql)")
+class ChargementPostgresqlTests(TestCase):
+    """COPY dans la table intermédiaire puis fusion ON CONFLICT (profil PostgreSQL uniquement)"""
+
+    def setUp(self):
+        Magasin.objects.create(code='9001', nom='Magasin test')
+
+    def test_copy_disponible(self):
+        self.assertTrue(copy_disponible())
+
+    def test_inserer_absents(self):
+        lot = {tuple(valeurs[champ] for champ in CLE_LEGEND): valeurs for valeurs in (
+            commande_legend('C1'), commande_legend('C2'),
+        )}
+        self.assertEqual(inserer_absents(CommandeLegend, lot, CLE_LEGEND), 2)
+        self.assertEqual(inserer_absents(CommandeLegend, lot, CLE_LEGEND), 0)
+        self.assertEqual(CommandeLegend.objects.count(), 2)
+
+    def test_fusionner_lot(self):
+        def lot(*lignes):
+            return {tuple(valeurs[champ] for champ in CLE_BR): valeurs for valeurs in lignes}
+
+        options = {
+            'champs_compares': ('statut_ic', 'ic_integre'),
+            'champs_derives': ('est_quantite_0',),
+            'champs_toujours_maj': ('fichier_source',),
+        }
+        self.assertEqual(fusionner_lot(BRAsten, lot(br('B1'), br('B2')), CLE_BR, **options), (2, 0))
+        crees, mis_a_jour = fusionner_lot(
+            BRAsten,
+            lot(br('B1', 'Non intégré', False, 'br2.csv'), br('B2', fichier_source='br2.csv'), br('B3')),
+            CLE_BR,
+            **options,
+        )
+        self.assertEqual((crees, mis_a_jour), (1, 1))
+        self.assertFalse(BRAsten.objects.get(numero_br='B1').ic_integre)
+        self.assertEqual(BRAsten.objects.get(numero_br='B2').fichier_source, 'br2.csv')
+
+    def test_inserer_valeurs(self):
+        colonnes = {champ: [valeurs[champ] for valeurs in (br('B1'), br('B2'))] for champ in br('B1')}
+        self.assertEqual(inserer_valeurs(BRAsten, colonnes, CLE_BR), 2)
+        colonnes['statut_ic'] = ['Non intégré', 'Non intégré']
+        inserer_valeurs(BRAsten, colonnes, CLE_BR, ('statut_ic',))
+        self.assertEqual(set(BRAsten.objects.values_list('statut_ic', flat=True)), {'Non intégré'})
+
+    def test_valeur_trop_longue_ecartee_du_copy(self):
+        lot = LotInsertion(CommandeLegend, CLE_LEGEND)
+        lot.ajouter(commande_legend('C1'))
+        lot.ajouter(commande_legend('C2', numero_brut='X' * 150))  # max_length=100, vérifié par le COPY
+        with redirect_stdout(io.StringIO()):
+            lot.enregistrer()
+
+        self.assertEqual((lot.nombre_nouveaux, lot.nombre_rejetes), (1, 1))
+        self.assertEqual(list(CommandeLegend.objects.values_list('numero_commande', flat=True)), ['C1'])
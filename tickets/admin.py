@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Ticket, TicketCategorie, SuiviTicket, PieceJointe, HistoriqueStatut, Technicien
+from .models import Ticket, TicketCategorie, SuiviTicket, PieceJointe, HistoriqueStatut, Technicien, IndicateurSLA
 
 
 @admin.register(TicketCategorie)
@@ -11,7 +11,7 @@ class TicketCategorieAdmin(admin.ModelAdmin):
 class PieceJointeInline(admin.TabularInline):
     model = PieceJointe
     extra = 0
-    readonly_fields = ("date_upload",)
+    readonly_fields = ("nom_original", "empreinte", "taille", "date_upload")
 
 
 class SuiviInline(admin.TabularInline):
@@ -51,8 +51,9 @@ class SuiviTicketAdmin(admin.ModelAdmin):
 
 @admin.register(PieceJointe)
 class PieceJointeAdmin(admin.ModelAdmin):
-    list_display = ("suivi", "type_fichier", "date_upload")
+    list_display = ("suivi", "nom_original", "type_fichier", "taille", "date_upload")
     list_filter = ("type_fichier",)
+    search_fields = ("nom_original", "empreinte")
 
 
 @admin.register(HistoriqueStatut)
@@ -66,3 +67,8 @@ class TechnicienAdmin(admin.ModelAdmin):
     list_display = ("nom", "actif", "date_creation")
     search_fields = ("nom",)
 
+
+@admin.register(IndicateurSLA)
+class IndicateurSLAAdmin(admin.ModelAdmin):
+    list_display = ("dimension", "libelle", "nb_tickets", "nb_resolus", "premiere_reponse_h", "resolution_h", "date_calcul")
+    list_filter = ("dimension",)
@@ -0,0 +1,134 @@
+"""
+Aperçus (miniatures) des pièces jointes images.
+
+Générés après l'upload par un petit pool de threads (hors du cycle de la requête), stockés à côté
+des originaux sous tickets/apercus/<empreinte>.<webp|jpg> et servis avec un cache long : le nom
+dépend du contenu de l'original, l'aperçu d'une URL donnée ne change donc jamais.
+"""
+import io
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+DOSSIER_APERCUS = "tickets/apercus"
+
+_executeur = None
+
+
+def _get_executeur():
+    global _executeur
+    if _executeur is None:
+        _executeur = ThreadPoolExecutor(
+            max_workers=getattr(settings, "APERCUS_NB_WORKERS", 2),
+            thread_name_prefix="apercus",
+        )
+    return _executeur
+
+
+def _format_apercu():
+    """WebP si Pillow a été compilé avec, sinon JPEG"""
+    from PIL import features
+
+    return ("WEBP", "webp") if features.check("webp") else ("JPEG", "jpg")
+
+
+def generer_apercu(piece_id):
+    """Crée l'aperçu d'une pièce jointe image (ou réutilise celui d'un fichier identique) ; renvoie son nom"""
+    from .models import PieceJointe
+
+    piece = PieceJointe.objects.filter(pk=piece_id).first()
+    if piece is None or not piece.est_image or piece.apercu:
+        return piece.apercu if piece else ""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        logger.warning("Pillow n'est pas installé : aperçus des pièces jointes désactivés")
+        return ""
+
+    format_image, extension = _format_apercu()
+    stockage = piece.fichier.storage
+    nom = f"{DOSSIER_APERCUS}/{piece.empreinte or f'pj{piece.pk}'}.{extension}"
+
+    if not stockage.exists(nom):
+        try:
+            with piece.fichier.open("rb") as original, Image.open(original) as image:
+                image = ImageOps.exif_transpose(image)
+                taille = getattr(settings, "APERCUS_TAILLE", 360)
+                image.thumbnail((taille, taille))
+                if image.mode not in ("RGB", "RGBA") or format_image == "JPEG":
+                    image = image.convert("RGB")
+                tampon = io.BytesIO()
+                image.save(tampon, format_image, quality=80)
+        except (OSError, ValueError) as exc:
+            logger.warning("Aperçu impossible pour la pièce jointe %s : %s", piece_id, exc)
+            return ""
+        # Écriture directe au nom choisi (le stockage des pièces jointes renommerait par empreinte)
+        nom = _stockage_apercus(stockage).save(nom, ContentFile(tampon.getvalue()))
+
+    # Toutes les pièces jointes de même contenu partagent l'aperçu
+    pieces = PieceJointe.objects.filter(apercu="")
+    if piece.empreinte:
+        pieces = pieces.filter(empreinte=piece.empreinte)
+    else:
+        pieces = pieces.filter(pk=piece.pk)
+    pieces.update(apercu=nom)
+    return nom
+
+
+class StockageApercus(FileSystemStorage):
+    """
+    Aperçus écrits exactement au nom demandé, dérivé de l'empreinte de l'original : fichier
+    temporaire puis renommage atomique. Deux générations simultanées du même aperçu produisent le
+    même contenu ; la seconde remplace la première au lieu d'ajouter une copie suffixée orpheline.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        chemin = self.path(name)
+        dossier = os.path.dirname(chemin)
+        os.makedirs(dossier, exist_ok=True)
+        descripteur, chemin_temporaire = tempfile.mkstemp(dir=dossier, suffix=".tmp")
+        try:
+            with os.fdopen(descripteur, "wb") as destination:
+                for bloc in content.chunks():
+                    destination.write(bloc)
+            if self.file_permissions_mode is not None:
+                os.chmod(chemin_temporaire, self.file_permissions_mode)
+            os.replace(chemin_temporaire, chemin)
+        except BaseException:
+            if os.path.exists(chemin_temporaire):
+                os.remove(chemin_temporaire)
+            raise
+        return name
+
+
+def _stockage_apercus(stockage):
+    return StockageApercus(location=stockage.location, base_url=stockage.base_url)
+
+
+def _tache_apercu(piece_id):
+    close_old_connections()
+    try:
+        generer_apercu(piece_id)
+    except Exception:
+        logger.exception("Échec de la génération de l'aperçu de la pièce jointe %s", piece_id)
+    finally:
+        close_old_connections()
+
+
+def planifier_apercu(piece_id):
+    """Génère l'aperçu en arrière-plan une fois la transaction validée (ou immédiatement si désactivé)"""
+    if getattr(settings, "APERCUS_ARRIERE_PLAN", True):
+        transaction.on_commit(lambda: _get_executeur().submit(_tache_apercu, piece_id))
+    else:
+        transaction.on_commit(lambda: generer_apercu(piece_id))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from tickets.apercus import generer_apercu
+from tickets.models import PieceJointe
+
+
+class Command(BaseCommand):
+    help = "Génère les aperçus manquants des pièces jointes images (rattrapage des pièces existantes)"
+
+    def handle(self, *args, **options):
+        pieces = PieceJointe.objects.filter(apercu="", type_fichier=PieceJointe.TYPE_IMAGE).values_list("id", flat=True)
+        generes = 0
+        echecs = 0
+        for piece_id in pieces.iterator():
+            if generer_apercu(piece_id):
+                generes += 1
+            else:
+                echecs += 1
+        self.stdout.write(self.style.SUCCESS(f"✅ {generes} aperçu(s) généré(s), {echecs} image(s) illisible(s) ignorée(s)."))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+from tickets.services import IndicateursSLAIndisponibles, rafraichir_indicateurs_sla
+
+
+class Command(BaseCommand):
+    help = "Recalcule les indicateurs SLA (première réponse, résolution, temps par statut) depuis l'historique des statuts"
+
+    def handle(self, *args, **options):
+        try:
+            total = rafraichir_indicateurs_sla()
+        except IndicateursSLAIndisponibles as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} indicateur(s) SLA recalculé(s)."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from tickets.services import reconstruire_index_recherche, recherche_plein_texte_disponible
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'index de recherche plein texte des tickets (description, suivis, catégorie, magasin)"
+
+    def handle(self, *args, **options):
+        if not recherche_plein_texte_disponible():
+            self.stdout.write(self.style.WARNING("Base sans index plein texte : la recherche utilise un filtre simple."))
+            return
+        with transaction.atomic():
+            total = reconstruire_index_recherche()
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} ticket(s) indexés."))
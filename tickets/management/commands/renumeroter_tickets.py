@@ -1,29 +1,69 @@
 from django.core.management.base import BaseCommand
-from tickets.models import Ticket
+from django.db import connection, transaction
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+from tickets.models import CompteurTicket, Ticket
 
 
 class Command(BaseCommand):
     help = 'Renumérote tous les tickets avec des numéros séquentiels simples (1, 2, 3...)'
 
-    def handle(self, *args, **options):
-        tickets = Ticket.objects.all().order_by('id')
-        numero = 1
-        
-        for ticket in tickets:
-            ticket.numero_ticket = str(numero)
-            ticket.save(update_fields=['numero_ticket'])
-            self.stdout.write(
-                self.style.SUCCESS(f'Ticket ID {ticket.id} → #{numero}')
-            )
-            numero += 1
-        
-        self.stdout.write(
-            self.style.SUCCESS(f'\n✅ {numero - 1} tickets renumerotés avec succès!')
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Affiche les changements sans rien enregistrer',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Nombre de tickets par UPDATE groupé (défaut : 1000)',
         )
 
+    def handle(self, *args, **options):
+        taille_lot = max(1, options['batch_size'])
 
+        # Numérotation calculée en une seule lecture (ordre de création)
+        changements = []
+        total = 0
+        for total, (ticket_id, numero_actuel) in enumerate(
+            Ticket.objects.order_by('id').values_list('id', 'numero_ticket').iterator(chunk_size=5000),
+            start=1,
+        ):
+            if numero_actuel != str(total):
+                changements.append((ticket_id, str(total)))
 
+        if options['verbosity'] >= 2:
+            for ticket_id, numero in changements:
+                self.stdout.write(f'Ticket ID {ticket_id} → #{numero}')
 
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f'[dry-run] {len(changements)} ticket(s) sur {total} seraient renumérotés, '
+                f'compteur positionné à {total}.'
+            ))
+            return
 
+        ids_modifies = [ticket_id for ticket_id, _ in changements]
+        with transaction.atomic():
+            # 1) Numéros temporaires uniques pour éviter les collisions sur numero_ticket (unique)
+            #    pendant l'application des nouveaux numéros
+            for i in range(0, len(ids_modifies), taille_lot):
+                Ticket.objects.filter(pk__in=ids_modifies[i:i + taille_lot]).update(
+                    numero_ticket=Concat(Value('tmp-'), Cast('id', CharField()))
+                )
+            # 2) Numéros définitifs, par lots (UPDATE paramétré exécuté en executemany :
+            #    bulk_update génère un CASE par ligne, trop coûteux sur 100k tickets)
+            table = connection.ops.quote_name(Ticket._meta.db_table)
+            colonne = connection.ops.quote_name(Ticket._meta.get_field('numero_ticket').column)
+            sql = f'UPDATE {table} SET {colonne} = %s WHERE id = %s'
+            with connection.cursor() as cursor:
+                for i in range(0, len(changements), taille_lot):
+                    cursor.executemany(sql, [(numero, ticket_id) for ticket_id, numero in changements[i:i + taille_lot]])
+            # 3) Le compteur repart après le dernier numéro attribué
+            CompteurTicket.objects.update_or_create(nom='ticket', defaults={'valeur': total})
 
-
+        self.stdout.write(
+            self.style.SUCCESS(f'\n✅ {len(changements)} ticket(s) renumérotés sur {total}, compteur positionné à {total}.')
+        )
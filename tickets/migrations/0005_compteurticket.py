@@ -0,0 +1,38 @@
+# Generated by Django 6.0.1 on 2026-10-19 15:50
+
+from django.db import migrations, models
+from django.db.models import IntegerField, Max
+from django.db.models.functions import Cast
+
+
+def initialiser_compteur(apps, schema_editor):
+    """Le compteur repart du plus grand numéro numérique déjà attribué"""
+    Ticket = apps.get_model('tickets', 'Ticket')
+    CompteurTicket = apps.get_model('tickets', 'CompteurTicket')
+    numero_max = Ticket.objects.filter(numero_ticket__regex=r'^[0-9]+$').aggregate(
+        numero_max=Max(Cast('numero_ticket', IntegerField()))
+    )['numero_max'] or 0
+    CompteurTicket.objects.update_or_create(nom='ticket', defaults={'valeur': numero_max})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0004_remove_ticket_assigne_a_ticket_assigne_a'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompteurTicket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=50, unique=True)),
+                ('valeur', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Compteur de tickets',
+                'verbose_name_plural': 'Compteurs de tickets',
+            },
+        ),
+        migrations.RunPython(initialiser_compteur, migrations.RunPython.noop),
+    ]
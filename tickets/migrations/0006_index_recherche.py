@@ -0,0 +1,60 @@
+# Generated by Django 6.0.1 on 2026-10-19 16:30
+
+from django.db import migrations
+
+DOCUMENTS = """
+    SELECT t.id,
+           COALESCE(c.nom, '') || ' ' || m.code || ' ' || m.nom,
+           t.description || ' ' || COALESCE(
+               (SELECT {concat} FROM tickets_suiviticket s WHERE s.ticket_id = t.id), ''
+           )
+    FROM tickets_ticket t
+    JOIN core_magasin m ON m.code = t.magasin_id
+    LEFT JOIN tickets_ticketcategorie c ON c.id = t.categorie_id
+"""
+
+
+def creer_index_recherche(apps, schema_editor):
+    """Index plein texte des tickets : FTS5 sous SQLite, tsvector + GIN sous PostgreSQL"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE tickets_recherche USING fts5("
+            "entete, contenu, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO tickets_recherche (rowid, entete, contenu) "
+            + DOCUMENTS.format(concat="group_concat(s.message, ' ')")
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE TABLE tickets_recherche ("
+            "ticket_id bigint PRIMARY KEY, "
+            "entete text NOT NULL DEFAULT '', "
+            "contenu text NOT NULL DEFAULT '', "
+            "vecteur tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('french', entete), 'A') || setweight(to_tsvector('french', contenu), 'B')"
+            ") STORED)"
+        )
+        schema_editor.execute("CREATE INDEX tickets_recherche_vecteur_gin ON tickets_recherche USING GIN (vecteur)")
+        schema_editor.execute(
+            "INSERT INTO tickets_recherche (ticket_id, entete, contenu) "
+            + DOCUMENTS.format(concat="string_agg(s.message, ' ')")
+        )
+
+
+def supprimer_index_recherche(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP TABLE IF EXISTS tickets_recherche")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('tickets', '0005_compteurticket'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_index_recherche, supprimer_index_recherche),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:10
+
+import os
+
+import tickets.models
+import tickets.stockage
+from django.db import migrations, models
+
+
+def renseigner_nom_original(apps, schema_editor):
+    """Les pièces jointes existantes gardent leur chemin ; le nom affiché est celui du fichier"""
+    PieceJointe = apps.get_model('tickets', 'PieceJointe')
+    pieces = list(PieceJointe.objects.only('id', 'fichier'))
+    for piece in pieces:
+        piece.nom_original = os.path.basename(piece.fichier.name)[:255]
+    PieceJointe.objects.bulk_update(pieces, ['nom_original'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0006_index_recherche'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='piecejointe',
+            name='empreinte',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='piecejointe',
+            name='nom_original',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='piecejointe',
+            name='taille',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='piecejointe',
+            name='fichier',
+            field=models.FileField(max_length=255, storage=tickets.stockage.get_stockage_pieces_jointes, upload_to=tickets.models.chemin_piece_jointe),
+        ),
+        migrations.AddIndex(
+            model_name='piecejointe',
+            index=models.Index(fields=['fichier'], name='tickets_pie_fichier_47cfe4_idx'),
+        ),
+        migrations.RunPython(renseigner_nom_original, migrations.RunPython.noop),
+    ]
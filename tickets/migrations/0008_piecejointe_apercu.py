@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-19 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0007_piecejointe_empreinte_piecejointe_nom_original_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='piecejointe',
+            name='apercu',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
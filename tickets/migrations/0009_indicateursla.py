@@ -0,0 +1,44 @@
+# Generated by Django 6.0.1 on 2026-10-19 18:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0008_piecejointe_apercu'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndicateurSLA',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('magasin', 'Magasin'), ('categorie', 'Catégorie'), ('urgence', 'Urgence'), ('technicien', 'Technicien')], max_length=20)),
+                ('valeur', models.CharField(blank=True, default='', max_length=150)),
+                ('libelle', models.CharField(blank=True, default='', max_length=200)),
+                ('nb_tickets', models.PositiveIntegerField(default=0)),
+                ('nb_resolus', models.PositiveIntegerField(default=0)),
+                ('premiere_reponse_h', models.FloatField(blank=True, null=True, verbose_name='Délai de première réponse (h)')),
+                ('resolution_h', models.FloatField(blank=True, null=True, verbose_name='Délai de résolution (h)')),
+                ('duree_nouveau_h', models.FloatField(blank=True, null=True)),
+                ('duree_en_cours_h', models.FloatField(blank=True, null=True)),
+                ('duree_en_attente_h', models.FloatField(blank=True, null=True)),
+                ('duree_resolu_h', models.FloatField(blank=True, null=True)),
+                ('date_calcul', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Indicateur SLA',
+                'verbose_name_plural': 'Indicateurs SLA',
+                'ordering': ['dimension', '-nb_tickets'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='historiquestatut',
+            index=models.Index(fields=['ticket', 'date_changement'], name='tickets_his_ticket__862a8c_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='indicateursla',
+            constraint=models.UniqueConstraint(fields=('dimension', 'valeur'), name='tickets_indicateursla_dimension_valeur_uniq'),
+        ),
+    ]
@@ -1,7 +1,12 @@
 import os
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, IntegerField, Max
+from django.db.models.functions import Cast
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 from core.models import Magasin
+from .stockage import get_stockage_pieces_jointes, verrouiller_contenu
 
 
 class Technicien(models.Model):
@@ -32,6 +37,44 @@ class TicketCategorie(models.Model):
         return self.nom
 
 
+class CompteurTicket(models.Model):
+    """Compteur atomique des numéros de ticket (une ligne par séquence)"""
+    nom = models.CharField(max_length=50, unique=True)
+    valeur = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Compteur de tickets"
+        verbose_name_plural = "Compteurs de tickets"
+
+    def __str__(self):
+        return f"{self.nom} = {self.valeur}"
+
+    @staticmethod
+    def numero_max_existant():
+        """Plus grand numéro de ticket numérique déjà attribué (0 si aucun)"""
+        return Ticket.objects.filter(numero_ticket__regex=r"^[0-9]+$").aggregate(
+            numero_max=Max(Cast("numero_ticket", IntegerField()))
+        )["numero_max"] or 0
+
+    @classmethod
+    def prochain_numero(cls, nom="ticket"):
+        """
+        Incrémente le compteur et renvoie la nouvelle valeur (UPDATE ... SET valeur = valeur + 1 puis
+        lecture, dans la même transaction) : le verrou pris par l'UPDATE garantit qu'aucune
+        création concurrente ne peut obtenir le même numéro.
+        """
+        with transaction.atomic():
+            if not cls.objects.filter(nom=nom).update(valeur=F("valeur") + 1):
+                # Première utilisation : repartir du plus grand numéro existant
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(nom=nom, valeur=cls.numero_max_existant())
+                except IntegrityError:
+                    pass  # créé entre-temps par une autre requête
+                cls.objects.filter(nom=nom).update(valeur=F("valeur") + 1)
+            return cls.objects.filter(nom=nom).values_list("valeur", flat=True).get()
+
+
 class Ticket(models.Model):
     TYPE_INCIDENT = "incident"
     TYPE_DEMANDE = "demande"
@@ -89,26 +132,34 @@ class Ticket(models.Model):
     def __str__(self):
         return self.numero_ticket or f"Ticket #{self.pk}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valeurs lues en base, pour détecter à l'enregistrement un changement qui modifie les
+        # statistiques (répartition par statut, classement des magasins sur la période)
+        instance._valeurs_stats_initiales = instance._valeurs_stats()
+        return instance
+
+    # Champs dont dépendent les statistiques de tickets en cache (tickets.services)
+    CHAMPS_STATS = ("statut", "magasin_id", "date_creation")
+
+    def _valeurs_stats(self):
+        chargees = self.__dict__
+        return {champ: chargees[champ] for champ in self.CHAMPS_STATS if champ in chargees}
+
     def save(self, *args, **kwargs):
-        creating = self.pk is None
+        creation = self.pk is None
+        if creation and not self.numero_ticket:
+            # Numéro séquentiel simple (1, 2, 3...) attribué avant l'insertion par le compteur atomique
+            self.numero_ticket = str(CompteurTicket.prochain_numero())
         super().save(*args, **kwargs)
-        if creating and not self.numero_ticket:
-            # Générer un numéro séquentiel simple (1, 2, 3...)
-            # Trouver le numéro maximum existant et ajouter 1
-            tickets_existants = Ticket.objects.exclude(pk=self.pk).exclude(numero_ticket__isnull=True).exclude(numero_ticket='')
-            max_numero = 0
-            for ticket in tickets_existants:
-                try:
-                    # Essayer de convertir le numéro en entier
-                    num = int(ticket.numero_ticket)
-                    if num > max_numero:
-                        max_numero = num
-                except (ValueError, TypeError):
-                    # Si le numéro n'est pas un nombre, ignorer
-                    pass
-            numero = str(max_numero + 1)
-            Ticket.objects.filter(pk=self.pk).update(numero_ticket=numero)
-            self.numero_ticket = numero
+        valeurs = self._valeurs_stats()
+        initiales = getattr(self, "_valeurs_stats_initiales", {})
+        if creation or any(initiales.get(champ) != valeur for champ, valeur in valeurs.items()):
+            from .services import invalider_stats_tickets
+
+            transaction.on_commit(invalider_stats_tickets)
+        self._valeurs_stats_initiales = valeurs
 
     def set_statut(self, nouveau_statut, utilisateur=""):
         ancien_statut = self.statut
@@ -128,6 +179,43 @@ class Ticket(models.Model):
         )
 
 
+@receiver(post_delete, sender=Ticket)
+def invalider_stats_apres_suppression(sender, instance, **kwargs):
+    from .services import desindexer_ticket, invalider_stats_tickets
+
+    desindexer_ticket(instance.pk)
+    transaction.on_commit(invalider_stats_tickets)
+
+
+# Champs du ticket repris dans l'index de recherche plein texte
+CHAMPS_INDEXES_TICKET = {"description", "categorie", "magasin"}
+
+
+@receiver(post_save, sender=Ticket)
+def indexer_ticket_enregistre(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not CHAMPS_INDEXES_TICKET.intersection(update_fields):
+        return  # ex. changement de statut : le document de recherche est inchangé
+    from .services import indexer_ticket
+
+    indexer_ticket(instance.pk)
+
+
+@receiver(post_save, sender=TicketCategorie)
+def indexer_tickets_categorie_renommee(sender, instance, created, **kwargs):
+    if not created:
+        from .services import indexer_tickets_categorie
+
+        indexer_tickets_categorie(instance.pk)
+
+
+@receiver(post_save, sender=Magasin)
+def indexer_tickets_magasin_renomme(sender, instance, created, **kwargs):
+    if not created:
+        from .services import indexer_tickets_magasin
+
+        indexer_tickets_magasin(instance.pk)
+
+
 class HistoriqueStatut(models.Model):
     ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name="historiques_statut")
     ancien_statut = models.CharField(max_length=20, blank=True)
@@ -139,11 +227,56 @@ class HistoriqueStatut(models.Model):
         verbose_name = "Historique de statut"
         verbose_name_plural = "Historiques de statut"
         ordering = ["-date_changement"]
+        indexes = [
+            # Parcours de l'historique par ticket dans l'ordre chronologique (indicateurs SLA)
+            models.Index(fields=["ticket", "date_changement"]),
+        ]
 
     def __str__(self):
         return f"{self.ticket} {self.ancien_statut} → {self.nouveau_statut}"
 
 
+class IndicateurSLA(models.Model):
+    """
+    Délais moyens (en heures) par magasin, catégorie, urgence ou technicien, calculés en SQL
+    depuis l'historique des statuts (voir tickets.services.rafraichir_indicateurs_sla)
+    """
+    DIMENSION_MAGASIN = "magasin"
+    DIMENSION_CATEGORIE = "categorie"
+    DIMENSION_URGENCE = "urgence"
+    DIMENSION_TECHNICIEN = "technicien"
+    DIMENSION_CHOICES = [
+        (DIMENSION_MAGASIN, "Magasin"),
+        (DIMENSION_CATEGORIE, "Catégorie"),
+        (DIMENSION_URGENCE, "Urgence"),
+        (DIMENSION_TECHNICIEN, "Technicien"),
+    ]
+
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES)
+    valeur = models.CharField(max_length=150, blank=True, default="")
+    libelle = models.CharField(max_length=200, blank=True, default="")
+    nb_tickets = models.PositiveIntegerField(default=0)
+    nb_resolus = models.PositiveIntegerField(default=0)
+    premiere_reponse_h = models.FloatField(null=True, blank=True, verbose_name="Délai de première réponse (h)")
+    resolution_h = models.FloatField(null=True, blank=True, verbose_name="Délai de résolution (h)")
+    duree_nouveau_h = models.FloatField(null=True, blank=True)
+    duree_en_cours_h = models.FloatField(null=True, blank=True)
+    duree_en_attente_h = models.FloatField(null=True, blank=True)
+    duree_resolu_h = models.FloatField(null=True, blank=True)
+    date_calcul = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Indicateur SLA"
+        verbose_name_plural = "Indicateurs SLA"
+        ordering = ["dimension", "-nb_tickets"]
+        constraints = [
+            models.UniqueConstraint(fields=["dimension", "valeur"], name="tickets_indicateursla_dimension_valeur_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_dimension_display()} {self.libelle or self.valeur}"
+
+
 class SuiviTicket(models.Model):
     ticket = models.ForeignKey(Ticket, on_delete=models.CASCADE, related_name="suivis")
     auteur = models.CharField(max_length=150, blank=True, default="")
@@ -159,6 +292,14 @@ class SuiviTicket(models.Model):
         return f"Suivi #{self.pk} - {self.ticket}"
 
 
+@receiver(post_save, sender=SuiviTicket)
+@receiver(post_delete, sender=SuiviTicket)
+def indexer_ticket_du_suivi(sender, instance, **kwargs):
+    from .services import indexer_ticket
+
+    indexer_ticket(instance.ticket_id)
+
+
 def chemin_piece_jointe(instance, filename):
     return os.path.join("tickets", "suivis", timezone.now().strftime("%Y/%m/%d"), filename)
 
@@ -180,7 +321,11 @@ class PieceJointe(models.Model):
     ]
 
     suivi = models.ForeignKey(SuiviTicket, on_delete=models.CASCADE, related_name="pieces_jointes")
-    fichier = models.FileField(upload_to=chemin_piece_jointe)
+    fichier = models.FileField(upload_to=chemin_piece_jointe, storage=get_stockage_pieces_jointes, max_length=255)
+    nom_original = models.CharField(max_length=255, blank=True, default="")
+    empreinte = models.CharField(max_length=64, blank=True, default="", db_index=True)
+    taille = models.PositiveBigIntegerField(null=True, blank=True)
+    apercu = models.CharField(max_length=255, blank=True, default="")
     type_fichier = models.CharField(max_length=20, choices=TYPE_CHOICES, default=TYPE_AUTRE)
     date_upload = models.DateTimeField(auto_now_add=True)
 
@@ -188,14 +333,29 @@ class PieceJointe(models.Model):
         verbose_name = "Pièce jointe"
         verbose_name_plural = "Pièces jointes"
         ordering = ["-date_upload"]
+        indexes = [
+            # Comptage des références à un fichier partagé avant sa suppression
+            models.Index(fields=["fichier"]),
+        ]
 
     def __str__(self):
-        return os.path.basename(self.fichier.name)
+        return self.nom_original or os.path.basename(self.fichier.name)
 
     def save(self, *args, **kwargs):
         if self.fichier and (not self.type_fichier or self.type_fichier == self.TYPE_AUTRE):
             self.type_fichier = self.deduire_type_fichier()
-        super().save(*args, **kwargs)
+        if not self.fichier or self.fichier._committed:
+            super().save(*args, **kwargs)
+            return
+        # Écriture dans le stockage par contenu avant l'INSERT pour connaître l'empreinte. Une seule
+        # transaction : le verrou pris sur l'empreinte par le stockage couvre l'objet réutilisé
+        # jusqu'à ce que la nouvelle référence soit visible de liberer_fichier_piece_jointe
+        with transaction.atomic():
+            self.nom_original = os.path.basename(self.fichier.name)[:255]
+            self.fichier.save(self.fichier.name, self.fichier.file, save=False)
+            self.empreinte = os.path.splitext(os.path.basename(self.fichier.name))[0]
+            self.taille = self.fichier.size
+            super().save(*args, **kwargs)
 
     def deduire_type_fichier(self):
         extension = os.path.splitext(self.fichier.name)[1].lower()
@@ -216,3 +376,43 @@ class PieceJointe(models.Model):
         extension = os.path.splitext(self.fichier.name)[1].lower()
         return extension in {".jpg", ".jpeg", ".png", ".gif", ".webp"}
 
+    @property
+    def url_apercu(self):
+        if not self.apercu:
+            return ""
+        from django.urls import reverse
+
+        return reverse("tickets:apercu", args=[os.path.basename(self.apercu)])
+
+
+
+@receiver(post_delete, sender=PieceJointe)
+def liberer_fichier_piece_jointe(sender, instance, **kwargs):
+    """Le fichier n'est supprimé du disque que lorsque plus aucune pièce jointe n'y fait référence"""
+    nom = instance.fichier.name
+    if not nom:
+        return
+    stockage = instance.fichier.storage
+    empreinte = instance.empreinte
+    apercu = instance.apercu
+
+    def liberer():
+        with transaction.atomic():
+            if empreinte:
+                # Attend la fin d'un upload en cours du même contenu (voir verrouiller_contenu) :
+                # s'il réutilise l'objet, sa référence est visible avant le comptage
+                verrouiller_contenu(empreinte)
+            if not PieceJointe.objects.filter(fichier=nom).exists():
+                stockage.delete(nom)
+            if apercu and not PieceJointe.objects.filter(apercu=apercu).exists():
+                stockage.delete(apercu)
+
+    transaction.on_commit(liberer)
+
+
+@receiver(post_save, sender=PieceJointe)
+def planifier_apercu_piece_jointe(sender, instance, created, **kwargs):
+    if created and instance.est_image and not instance.apercu:
+        from .apercus import planifier_apercu
+
+        planifier_apercu(instance.pk)
@@ -0,0 +1,464 @@
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import CompteurTicket, HistoriqueStatut, IndicateurSLA, Ticket
+
+# Version des statistiques tenue en base (ligne de CompteurTicket) et non dans le cache : le cache
+# par défaut (LocMemCache) est propre à chaque processus, une invalidation n'y atteindrait qu'un worker.
+COMPTEUR_VERSION_STATS = "stats_tickets"
+
+# Couleurs des cartes "magasins les plus touchés", par rang (du plus au moins touché)
+COULEURS_MAGASINS = (
+    {
+        'border_color': '#dc2626',
+        'color_start': '#dc2626',
+        'color_end': '#991b1b',
+        'bg_start': '#fef2f2',
+        'bg_end': '#fee2e2',
+        'shadow': 'rgba(220, 38, 38, 0.3)'
+    },
+    {
+        'border_color': '#ef4444',
+        'color_start': '#ef4444',
+        'color_end': '#dc2626',
+        'bg_start': '#fef2f2',
+        'bg_end': '#fee2e2',
+        'shadow': 'rgba(239, 68, 68, 0.3)'
+    },
+    {
+        'border_color': '#f97316',
+        'color_start': '#f97316',
+        'color_end': '#ea580c',
+        'bg_start': '#fff7ed',
+        'bg_end': '#ffedd5',
+        'shadow': 'rgba(249, 115, 22, 0.3)'
+    },
+    {
+        'border_color': '#fb923c',
+        'color_start': '#fb923c',
+        'color_end': '#f97316',
+        'bg_start': '#fff7ed',
+        'bg_end': '#ffedd5',
+        'shadow': 'rgba(251, 146, 60, 0.3)'
+    },
+)
+
+
+def get_version_stats_tickets():
+    """Version des statistiques de tickets, changée à chaque création, suppression ou changement de statut"""
+    return CompteurTicket.objects.filter(nom=COMPTEUR_VERSION_STATS).values_list("valeur", flat=True).first() or 0
+
+
+def invalider_stats_tickets():
+    """Rend obsolètes, pour tous les processus, les statistiques de tickets en cache"""
+    compteur = CompteurTicket.objects.filter(nom=COMPTEUR_VERSION_STATS)
+    if not compteur.update(valeur=F("valeur") + 1):
+        try:
+            with transaction.atomic():
+                CompteurTicket.objects.create(nom=COMPTEUR_VERSION_STATS, valeur=1)
+        except IntegrityError:
+            compteur.update(valeur=F("valeur") + 1)  # créé entre-temps par un autre processus
+
+
+def _en_cache(suffixe, calcul):
+    cle = f"tickets:stats:{get_version_stats_tickets()}:{suffixe}"
+    valeur = cache.get(cle)
+    if valeur is None:
+        valeur = calcul()
+        cache.set(cle, valeur, getattr(settings, 'CACHE_FRAGMENTS_DUREE', 3600))
+    return valeur
+
+
+def statistiques_tickets(queryset):
+    """Total et répartition par statut du queryset filtré, en une seule requête d'agrégat conditionnel"""
+    stats = queryset.order_by().aggregate(
+        total=Count('id'),
+        resolu=Count('id', filter=Q(statut=Ticket.STATUT_RESOLU)),
+        en_cours=Count('id', filter=Q(statut=Ticket.STATUT_EN_COURS)),
+        en_attente=Count('id', filter=Q(statut=Ticket.STATUT_EN_ATTENTE)),
+    )
+    total = stats['total']
+    for statut in ('resolu', 'en_cours', 'en_attente'):
+        stats[f'taux_{statut}'] = round((stats[statut] / total * 100) if total > 0 else 0, 1)
+    return stats
+
+
+def magasins_les_plus_touches(date_debut=None, date_fin=None, limite=4):
+    """
+    Magasins ayant le plus de tickets sur la période (tous statuts et types confondus),
+    avec les couleurs de leur rang. Mis en cache jusqu'à la prochaine invalidation.
+    """
+    def calcul():
+        queryset = Ticket.objects.all()
+        if date_debut:
+            queryset = queryset.filter(date_creation__date__gte=date_debut)
+        if date_fin:
+            queryset = queryset.filter(date_creation__date__lte=date_fin)
+        magasins = list(
+            queryset.values('magasin__code', 'magasin__nom').annotate(count=Count('id')).order_by('-count')[:limite]
+        )
+        for rang, magasin in enumerate(magasins):
+            magasin.update(COULEURS_MAGASINS[min(rang, len(COULEURS_MAGASINS) - 1)])
+        return magasins
+
+    return _en_cache(f"magasins:{date_debut}:{date_fin}:{limite}", calcul)
+
+
+def total_tickets_global():
+    """Nombre total de tickets (sans filtre), mis en cache jusqu'à la prochaine invalidation"""
+    return _en_cache("total", Ticket.objects.count)
+
+
+def changer_statut_tickets(ticket_ids, nouveau_statut, utilisateur=""):
+    """
+    Équivalent groupé de Ticket.set_statut : un seul UPDATE pour tous les tickets dont le statut
+    change et un bulk_create de leurs historiques. Même règle pour date_fermeture (renseignée au
+    passage à Résolu/Fermé, remise à vide sinon). Renvoie le nombre de tickets modifiés.
+    """
+    with transaction.atomic():
+        anciens_statuts = list(
+            Ticket.objects.select_for_update()
+            .filter(pk__in=ticket_ids)
+            .exclude(statut=nouveau_statut)
+            .values_list("id", "statut")
+        )
+        if not anciens_statuts:
+            return 0
+        maintenant = timezone.now()
+        Ticket.objects.filter(pk__in=[ticket_id for ticket_id, _ in anciens_statuts]).update(
+            statut=nouveau_statut,
+            date_fermeture=maintenant if nouveau_statut in {Ticket.STATUT_RESOLU, Ticket.STATUT_FERME} else None,
+            date_mise_a_jour=maintenant,
+        )
+        HistoriqueStatut.objects.bulk_create(
+            [
+                HistoriqueStatut(
+                    ticket_id=ticket_id,
+                    ancien_statut=ancien_statut,
+                    nouveau_statut=nouveau_statut,
+                    utilisateur=utilisateur or "",
+                )
+                for ticket_id, ancien_statut in anciens_statuts
+            ],
+            batch_size=1000,
+        )
+        transaction.on_commit(invalider_stats_tickets)
+    return len(anciens_statuts)
+
+
+# --- Recherche plein texte -------------------------------------------------
+#
+# Table d'index "tickets_recherche" créée par la migration 0006 : une ligne par ticket avec
+# l'en-tête (catégorie, code et nom du magasin) et le contenu (description + messages de suivi).
+# SQLite : table virtuelle FTS5 (rowid = id du ticket), classement bm25.
+# PostgreSQL : colonne tsvector générée + index GIN, classement ts_rank.
+
+TABLE_RECHERCHE = "tickets_recherche"
+DEBUT_EXTRAIT = "\x02"
+FIN_EXTRAIT = "\x03"
+
+SQL_DOCUMENTS = {
+    "sqlite": """
+        SELECT t.id,
+               COALESCE(c.nom, '') || ' ' || m.code || ' ' || m.nom,
+               t.description || ' ' || COALESCE(
+                   (SELECT group_concat(s.message, ' ') FROM tickets_suiviticket s WHERE s.ticket_id = t.id), ''
+               )
+        FROM tickets_ticket t
+        JOIN core_magasin m ON m.code = t.magasin_id
+        LEFT JOIN tickets_ticketcategorie c ON c.id = t.categorie_id
+    """,
+    "postgresql": """
+        SELECT t.id,
+               COALESCE(c.nom, '') || ' ' || m.code || ' ' || m.nom,
+               t.description || ' ' || COALESCE(
+                   (SELECT string_agg(s.message, ' ') FROM tickets_suiviticket s WHERE s.ticket_id = t.id), ''
+               )
+        FROM tickets_ticket t
+        JOIN core_magasin m ON m.code = t.magasin_id
+        LEFT JOIN tickets_ticketcategorie c ON c.id = t.categorie_id
+    """,
+}
+
+SQL_INSERTION = {
+    "sqlite": f"INSERT INTO {TABLE_RECHERCHE} (rowid, entete, contenu) ",
+    "postgresql": f"INSERT INTO {TABLE_RECHERCHE} (ticket_id, entete, contenu) ",
+}
+
+SQL_SUPPRESSION = {
+    "sqlite": f"DELETE FROM {TABLE_RECHERCHE} WHERE rowid IN ",
+    "postgresql": f"DELETE FROM {TABLE_RECHERCHE} WHERE ticket_id IN ",
+}
+
+
+def recherche_plein_texte_disponible():
+    return connection.vendor in SQL_DOCUMENTS
+
+
+def _reindexer(condition, params):
+    """Réécrit les documents des tickets sélectionnés par `condition` (SQL sur l'alias t)"""
+    if not recherche_plein_texte_disponible():
+        return
+    vendor = connection.vendor
+    with connection.cursor() as cursor:
+        cursor.execute(f"{SQL_SUPPRESSION[vendor]} (SELECT t.id FROM tickets_ticket t WHERE {condition})", params)
+        cursor.execute(f"{SQL_INSERTION[vendor]} {SQL_DOCUMENTS[vendor]} WHERE {condition}", params)
+
+
+def indexer_ticket(ticket_id):
+    """Met à jour le document de recherche d'un ticket (appelé à l'enregistrement du ticket ou d'un suivi)"""
+    _reindexer("t.id = %s", [ticket_id])
+
+
+def indexer_tickets_categorie(categorie_id):
+    _reindexer("t.categorie_id = %s", [categorie_id])
+
+
+def indexer_tickets_magasin(code_magasin):
+    _reindexer("t.magasin_id = %s", [code_magasin])
+
+
+def desindexer_ticket(ticket_id):
+    if not recherche_plein_texte_disponible():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"{SQL_SUPPRESSION[connection.vendor]} (%s)", [ticket_id])
+
+
+def reconstruire_index_recherche():
+    """Reconstruit tout l'index de recherche en deux requêtes ; renvoie le nombre de tickets indexés"""
+    if not recherche_plein_texte_disponible():
+        return 0
+    vendor = connection.vendor
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE_RECHERCHE}")
+        cursor.execute(SQL_INSERTION[vendor] + SQL_DOCUMENTS[vendor])
+        if vendor == "sqlite":
+            cursor.execute(f"INSERT INTO {TABLE_RECHERCHE} ({TABLE_RECHERCHE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT COUNT(*) FROM {TABLE_RECHERCHE}")
+        return cursor.fetchone()[0]
+
+
+def _termes(recherche):
+    """Mots de la recherche (les opérateurs et caractères spéciaux sont ignorés)"""
+    return re.findall(r"\w+", recherche or "")
+
+
+def extrait_html(texte):
+    """Extrait échappé, termes trouvés entourés de <mark>"""
+    if not texte:
+        return ""
+    return mark_safe(
+        escape(texte).replace(DEBUT_EXTRAIT, "<mark>").replace(FIN_EXTRAIT, "</mark>")
+    )
+
+
+class ResultatsRecherche:
+    """
+    Résultats classés d'une recherche plein texte, paginables avec Paginator :
+    count() et le découpage [debut:fin] exécutent chacun une requête sur l'index.
+    """
+
+    def __init__(self, recherche):
+        self.termes = _termes(recherche)
+        self.vendor = connection.vendor
+
+    def _requete(self):
+        if self.vendor == "sqlite":
+            # Tous les mots doivent être présents, chacun en préfixe
+            return " ".join(f'"{terme}"*' for terme in self.termes)
+        return " & ".join(f"{terme}:*" for terme in self.termes)
+
+    def count(self):
+        if not self.termes:
+            return 0
+        if not recherche_plein_texte_disponible():
+            return self._queryset_repli().count()
+        with connection.cursor() as cursor:
+            if self.vendor == "sqlite":
+                cursor.execute(f"SELECT COUNT(*) FROM {TABLE_RECHERCHE} WHERE {TABLE_RECHERCHE} MATCH %s", [self._requete()])
+            else:
+                cursor.execute(
+                    f"SELECT COUNT(*) FROM {TABLE_RECHERCHE} WHERE vecteur @@ to_tsquery('french', %s)",
+                    [self._requete()],
+                )
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, tranche):
+        if not isinstance(tranche, slice):
+            raise TypeError("ResultatsRecherche ne se découpe que par tranches")
+        debut, fin = tranche.start or 0, tranche.stop
+        if not self.termes or fin is None or fin <= debut:
+            return []
+        if not recherche_plein_texte_disponible():
+            return list(self._queryset_repli()[debut:fin])
+
+        with connection.cursor() as cursor:
+            if self.vendor == "sqlite":
+                cursor.execute(
+                    f"""
+                    SELECT rowid, bm25({TABLE_RECHERCHE}, 2.0, 1.0) AS rang,
+                           snippet({TABLE_RECHERCHE}, 1, %s, %s, '…', 16)
+                    FROM {TABLE_RECHERCHE}
+                    WHERE {TABLE_RECHERCHE} MATCH %s
+                    ORDER BY rang
+                    LIMIT %s OFFSET %s
+                    """,
+                    [DEBUT_EXTRAIT, FIN_EXTRAIT, self._requete(), fin - debut, debut],
+                )
+            else:
+                cursor.execute(
+                    f"""
+                    SELECT ticket_id, ts_rank(vecteur, q) AS rang,
+                           ts_headline('french', contenu, q, %s)
+                    FROM {TABLE_RECHERCHE}, to_tsquery('french', %s) q
+                    WHERE vecteur @@ q
+                    ORDER BY rang DESC
+                    LIMIT %s OFFSET %s
+                    """,
+                    [f"StartSel={DEBUT_EXTRAIT}, StopSel={FIN_EXTRAIT}, MaxWords=30, MinWords=10",
+                     self._requete(), fin - debut, debut],
+                )
+            lignes = cursor.fetchall()
+
+        tickets = Ticket.objects.select_related("categorie", "magasin").in_bulk([ligne[0] for ligne in lignes])
+        resultats = []
+        for ticket_id, rang, extrait in lignes:
+            ticket = tickets.get(ticket_id)
+            if ticket is None:
+                continue
+            ticket.rang = rang
+            ticket.extrait = extrait_html(extrait)
+            resultats.append(ticket)
+        return resultats
+
+    def _queryset_repli(self):
+        """Autres bases : recherche simple (icontains) sans classement"""
+        condition = Q()
+        for terme in self.termes:
+            condition &= (
+                Q(description__icontains=terme)
+                | Q(suivis__message__icontains=terme)
+                | Q(categorie__nom__icontains=terme)
+                | Q(magasin__nom__icontains=terme)
+                | Q(magasin__code__icontains=terme)
+            )
+        return (
+            Ticket.objects.filter(condition).select_related("categorie", "magasin")
+            .distinct().order_by("-date_mise_a_jour")
+        )
+
+
+# --- Indicateurs SLA / MTTR ------------------------------------------------
+
+# Écart en heures entre deux dates, selon la base
+SQL_DUREE_HEURES = {
+    "sqlite": "((julianday({fin}) - julianday({debut})) * 24.0)",
+    "postgresql": "(EXTRACT(EPOCH FROM ({fin} - {debut})) / 3600.0)",
+}
+
+STATUTS_FERMES_SQL = f"('{Ticket.STATUT_RESOLU}', '{Ticket.STATUT_FERME}')"
+
+
+def _sql_indicateurs_sla(duree):
+    """
+    Une ligne par (dimension, valeur) :
+    - transitions : chaque changement de statut avec la date du changement précédent du même ticket
+      (LAG sur date_changement, à défaut la création du ticket) : la différence est le temps passé
+      dans l'ancien statut ;
+    - par_ticket : première réponse (premier changement après la création), première résolution
+      et temps cumulé par statut ;
+    - agrégats moyens par magasin, catégorie, urgence et technicien assigné.
+    """
+    def temps_statut(statut):
+        return (
+            f"SUM(CASE WHEN tr.ancien_statut = '{statut}' "
+            f"THEN {duree.format(fin='tr.date_changement', debut='COALESCE(tr.date_precedente, t.date_creation)')} END)"
+        )
+
+    colonnes = f"""
+        COUNT(*),
+        COUNT(p.resolution),
+        AVG({duree.format(fin='p.premiere_reponse', debut='p.date_creation')}),
+        AVG({duree.format(fin='p.resolution', debut='p.date_creation')}),
+        AVG(p.duree_nouveau),
+        AVG(p.duree_en_cours),
+        AVG(p.duree_en_attente),
+        AVG(p.duree_resolu),
+        %s
+    """
+    return f"""
+        INSERT INTO tickets_indicateursla (
+            dimension, valeur, libelle, nb_tickets, nb_resolus, premiere_reponse_h, resolution_h,
+            duree_nouveau_h, duree_en_cours_h, duree_en_attente_h, duree_resolu_h, date_calcul
+        )
+        WITH transitions AS (
+            SELECT h.ticket_id, h.ancien_statut, h.nouveau_statut, h.date_changement,
+                   LAG(h.date_changement) OVER (PARTITION BY h.ticket_id ORDER BY h.date_changement, h.id) AS date_precedente
+            FROM tickets_historiquestatut h
+        ),
+        par_ticket AS (
+            SELECT t.id AS ticket_id, t.magasin_id, t.categorie_id, t.urgence, t.date_creation,
+                   MIN(CASE WHEN tr.ancien_statut <> '' THEN tr.date_changement END) AS premiere_reponse,
+                   MIN(CASE WHEN tr.nouveau_statut IN {STATUTS_FERMES_SQL} THEN tr.date_changement END) AS resolution,
+                   {temps_statut(Ticket.STATUT_NOUVEAU)} AS duree_nouveau,
+                   {temps_statut(Ticket.STATUT_EN_COURS)} AS duree_en_cours,
+                   {temps_statut(Ticket.STATUT_EN_ATTENTE)} AS duree_en_attente,
+                   {temps_statut(Ticket.STATUT_RESOLU)} AS duree_resolu
+            FROM tickets_ticket t
+            LEFT JOIN transitions tr ON tr.ticket_id = t.id
+            GROUP BY t.id, t.magasin_id, t.categorie_id, t.urgence, t.date_creation
+        )
+        SELECT '{IndicateurSLA.DIMENSION_MAGASIN}', p.magasin_id, MAX(m.nom), {colonnes}
+        FROM par_ticket p JOIN core_magasin m ON m.code = p.magasin_id
+        GROUP BY p.magasin_id
+        UNION ALL
+        SELECT '{IndicateurSLA.DIMENSION_CATEGORIE}', COALESCE(CAST(p.categorie_id AS VARCHAR(20)), ''),
+               COALESCE(MAX(c.nom), 'Sans catégorie'), {colonnes}
+        FROM par_ticket p LEFT JOIN tickets_ticketcategorie c ON c.id = p.categorie_id
+        GROUP BY p.categorie_id
+        UNION ALL
+        SELECT '{IndicateurSLA.DIMENSION_URGENCE}', p.urgence, p.urgence, {colonnes}
+        FROM par_ticket p
+        GROUP BY p.urgence
+        UNION ALL
+        SELECT '{IndicateurSLA.DIMENSION_TECHNICIEN}', CAST(a.technicien_id AS VARCHAR(20)), MAX(te.nom), {colonnes}
+        FROM par_ticket p
+        JOIN tickets_ticket_assigne_a a ON a.ticket_id = p.ticket_id
+        JOIN tickets_technicien te ON te.id = a.technicien_id
+        GROUP BY a.technicien_id
+    """
+
+
+class IndicateursSLAIndisponibles(Exception):
+    """Calcul des indicateurs SLA impossible sur la base configurée"""
+
+
+def rafraichir_indicateurs_sla():
+    """
+    Recalcule la table des indicateurs SLA en une requête SQL ; renvoie le nombre de lignes.
+    Lève IndicateursSLAIndisponibles si la base n'est pas prise en charge (SQL_DUREE_HEURES).
+    """
+    duree = SQL_DUREE_HEURES.get(connection.vendor)
+    if duree is None:
+        raise IndicateursSLAIndisponibles(f"Indicateurs SLA non disponibles pour la base {connection.vendor}")
+    date_calcul = connection.ops.adapt_datetimefield_value(timezone.now())
+    with transaction.atomic():
+        IndicateurSLA.objects.all().delete()
+        with connection.cursor() as cursor:
+            # Une date de calcul par SELECT de l'UNION
+            cursor.execute(_sql_indicateurs_sla(duree), [date_calcul] * 4)
+        # Libellés lisibles pour l'urgence (codes stockés en base)
+        for code, libelle in Ticket.NIVEAU_CHOICES:
+            IndicateurSLA.objects.filter(dimension=IndicateurSLA.DIMENSION_URGENCE, valeur=code).update(libelle=libelle)
+    return IndicateurSLA.objects.count()
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import connection
+
+TAILLE_BLOC = 1024 * 1024
+
+
+def verrouiller_contenu(empreinte):
+    """
+    Verrou sur un contenu stocké, gardé jusqu'à la fin de la transaction en cours : l'upload qui
+    réutilise un objet existant et la suppression du dernier fichier référencé (voir
+    liberer_fichier_piece_jointe) ne peuvent pas s'entrelacer. PostgreSQL : verrou consultatif sur
+    l'empreinte ; SQLite : verrou d'écriture de la base (un seul écrivain à la fois).
+    """
+    from .models import PieceJointe
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cle = int(hashlib.sha256(empreinte.encode()).hexdigest()[:15], 16)
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [cle])
+        else:
+            # UPDATE sans effet : ouvre la transaction d'écriture, et donc prend le verrou
+            table = connection.ops.quote_name(PieceJointe._meta.db_table)
+            cursor.execute(f"UPDATE {table} SET empreinte = empreinte WHERE empreinte = %s", [empreinte])
+
+
+class HachageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Upload écrit par blocs dans un fichier temporaire (comme le gestionnaire par défaut)
+    en calculant le SHA-256 au fil de l'eau : le stockage n'a pas à relire le fichier.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hachage = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hachage.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        fichier = super().file_complete(file_size)
+        fichier.sha256 = self.hachage.hexdigest()
+        return fichier
+
+
+class StockageContenuAdressable(FileSystemStorage):
+    """
+    Stockage des pièces jointes par contenu : tickets/objets/<2 premiers car.>/<sha256><extension>.
+
+    Un même fichier joint à plusieurs suivis n'est écrit qu'une fois ; le nom demandé par
+    upload_to n'est utilisé que pour son extension. Le contenu est copié par blocs en calculant
+    l'empreinte, ou simplement déplacé quand l'upload a déjà été haché (HachageUploadHandler).
+    Les fichiers déjà stockés sous leur ancien chemin restent lisibles (même racine MEDIA_ROOT).
+    Appelé dans une transaction (PieceJointe.save), le verrou pris sur l'empreinte est gardé
+    jusqu'à l'enregistrement de la référence.
+    """
+
+    dossier = "tickets/objets"
+
+    def get_available_name(self, name, max_length=None):
+        # Le nom définitif dépend du contenu : il est choisi dans _save
+        return name
+
+    def _save(self, name, content):
+        extension = os.path.splitext(name)[1].lower()
+        empreinte = getattr(content, "sha256", None)
+        chemin_temporaire = None
+
+        if empreinte is None or not hasattr(content, "temporary_file_path"):
+            dossier_temporaire = self.path(os.path.join(self.dossier, "tmp"))
+            os.makedirs(dossier_temporaire, exist_ok=True)
+            descripteur, chemin_temporaire = tempfile.mkstemp(dir=dossier_temporaire)
+            hachage = hashlib.sha256()
+            try:
+                with os.fdopen(descripteur, "wb") as destination:
+                    if hasattr(content, "seek"):
+                        content.seek(0)
+                    for bloc in content.chunks(TAILLE_BLOC):
+                        hachage.update(bloc)
+                        destination.write(bloc)
+            except BaseException:
+                os.remove(chemin_temporaire)
+                raise
+            empreinte = hachage.hexdigest()
+
+        nom = f"{self.dossier}/{empreinte[:2]}/{empreinte}{extension}"
+        chemin = self.path(nom)
+        verrouiller_contenu(empreinte)
+        if os.path.exists(chemin):
+            # Contenu déjà stocké : une référence de plus, rien à écrire
+            if chemin_temporaire:
+                os.remove(chemin_temporaire)
+            return nom
+
+        os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        if chemin_temporaire:
+            os.replace(chemin_temporaire, chemin)
+        else:
+            file_move_safe(content.temporary_file_path(), chemin, allow_overwrite=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(chemin, self.file_permissions_mode)
+        return nom
+
+
+stockage_pieces_jointes = StockageContenuAdressable()
+
+
+def get_stockage_pieces_jointes():
+    return stockage_pieces_jointes
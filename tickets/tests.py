@@ -0,0 +1,215 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from core.models import Magasin
+from . import services
+from .apercus import DOSSIER_APERCUS, generer_apercu
+from .models import CompteurTicket, PieceJointe, SuiviTicket, Ticket
+from .stockage import StockageContenuAdressable
+
+
+class NumeroTicketConcurrentTests(TransactionTestCase):
+    """Numéros de ticket attribués par le compteur atomique lors de créations simultanées"""
+
+    NB_THREADS = 8
+    TICKETS_PAR_THREAD = 10
+
+    def test_creations_concurrentes_numeros_uniques(self):
+        magasin = Magasin.objects.create(code="9001", nom="Magasin test")
+        depart = threading.Barrier(self.NB_THREADS)
+        erreurs = []
+
+        def creer():
+            try:
+                depart.wait()
+                for _ in range(self.TICKETS_PAR_THREAD):
+                    Ticket.objects.create(
+                        type_demande=Ticket.TYPE_INCIDENT,
+                        urgence=Ticket.NIVEAU_MOYEN,
+                        impact=Ticket.NIVEAU_MOYEN,
+                        magasin=magasin,
+                    )
+            except Exception as exc:
+                erreurs.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=creer) for _ in range(self.NB_THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(erreurs, [])
+        numeros = list(Ticket.objects.values_list("numero_ticket", flat=True))
+        self.assertEqual(len(numeros), self.NB_THREADS * self.TICKETS_PAR_THREAD)
+        self.assertEqual(len(set(numeros)), len(numeros))
+        self.assertEqual(
+            CompteurTicket.objects.get(nom="ticket").valeur,
+            max(int(numero) for numero in numeros),
+        )
+
+
+class PiecesJointesTestCase(TestCase):
+    """Ticket de test et MEDIA_ROOT temporaire pour les pièces jointes"""
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        reglages = override_settings(MEDIA_ROOT=self.media.name)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        self.ticket = Ticket.objects.create(
+            type_demande=Ticket.TYPE_DEMANDE,
+            urgence=Ticket.NIVEAU_BAS,
+            impact=Ticket.NIVEAU_BAS,
+            magasin=Magasin.objects.create(code="9002", nom="Magasin test"),
+        )
+
+
+class PiecesJointesPartageesTests(PiecesJointesTestCase):
+    """Stockage par contenu : un fichier joint à plusieurs suivis n'est écrit qu'une fois sur disque"""
+
+    # Fichier de 100 Mo avec TICKETS_TEST_GROS_FICHIER=1 ; 8 Mo par défaut pour garder la suite rapide
+    # (déjà au-delà de FILE_UPLOAD_MAX_MEMORY_SIZE : upload écrit sur disque et haché par blocs)
+    TAILLE = (100 if os.environ.get("TICKETS_TEST_GROS_FICHIER") == "1" else 8) * 1024 * 1024
+    NB_SUIVIS = 3
+    DEBIT_MIN = 2 * 1024 * 1024  # octets/s : borne très large, ne détecte qu'un upload anormalement lent
+
+    def _objets_sur_disque(self):
+        return [chemin for chemin in Path(self.media.name, "tickets", "objets").rglob("*") if chemin.is_file()]
+
+    def test_meme_fichier_sur_plusieurs_suivis(self):
+        contenu = os.urandom(self.TAILLE)
+        url = reverse("tickets:detail", args=[self.ticket.pk])
+        durees = []
+        for i in range(self.NB_SUIVIS):
+            fichier = SimpleUploadedFile("rapport.bin", contenu, content_type="application/octet-stream")
+            debut = time.perf_counter()
+            response = self.client.post(url, {"ajouter_suivi": "1", "message": f"Envoi {i}", "fichiers": fichier})
+            durees.append(time.perf_counter() - debut)
+            self.assertEqual(response.status_code, 302)
+        self.assertLess(
+            max(durees),
+            self.TAILLE / self.DEBIT_MIN,
+            f"Upload de {self.TAILLE // (1024 * 1024)} Mo : " + ", ".join(f"{duree * 1000:.0f} ms" for duree in durees),
+        )
+
+        pieces = list(PieceJointe.objects.filter(suivi__ticket=self.ticket))
+        self.assertEqual(len(pieces), self.NB_SUIVIS)
+        self.assertEqual(len({piece.fichier.name for piece in pieces}), 1)
+        objets = self._objets_sur_disque()
+        self.assertEqual(len(objets), 1)
+        self.assertEqual(objets[0].stat().st_size, self.TAILLE)
+        self.assertEqual(pieces[0].taille, self.TAILLE)
+        self.assertEqual(pieces[0].empreinte, hashlib.sha256(contenu).hexdigest())
+
+        # Le fichier reste sur disque tant qu'une pièce jointe y fait référence
+        for piece in pieces[:-1]:
+            with self.captureOnCommitCallbacks(execute=True):
+                piece.delete()
+            self.assertTrue(objets[0].exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            pieces[-1].delete()
+        self.assertFalse(objets[0].exists())
+
+
+class ApercusTests(PiecesJointesTestCase):
+    """Aperçus des images jointes, nommés d'après l'empreinte de l'original"""
+
+    def test_generations_concurrentes_un_seul_apercu(self):
+        tampon = io.BytesIO()
+        Image.new("RGB", (800, 600), "navy").save(tampon, "PNG")
+        suivi = SuiviTicket.objects.create(ticket=self.ticket, auteur="Test", message="Photo")
+        piece = PieceJointe.objects.create(suivi=suivi, fichier=SimpleUploadedFile("photo.png", tampon.getvalue()))
+
+        # Deux générations qui ont toutes deux vu l'aperçu absent (course entre threads)
+        with mock.patch.object(StockageContenuAdressable, "exists", return_value=False):
+            noms = [generer_apercu(piece.pk)]
+            PieceJointe.objects.filter(pk=piece.pk).update(apercu="")
+            noms.append(generer_apercu(piece.pk))
+
+        self.assertEqual(noms[0], noms[1])
+        self.assertTrue(noms[0].startswith(f"{DOSSIER_APERCUS}/{piece.empreinte}."))
+        apercus = list(Path(self.media.name, DOSSIER_APERCUS).iterdir())
+        self.assertEqual([chemin.name for chemin in apercus], [os.path.basename(noms[0])])
+        piece.refresh_from_db()
+        self.assertEqual(piece.apercu, noms[0])
+
+
+class IndicateursSLATests(TestCase):
+    """Bouton « Recalculer » de la page des indicateurs SLA"""
+
+    def test_recalcul(self):
+        response = self.client.post(reverse("tickets:sla"), follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [str(message) for message in response.context["messages"]],
+            ["Indicateurs SLA recalculés (0 lignes)."],
+        )
+
+    def test_base_non_prise_en_charge(self):
+        with mock.patch.dict(services.SQL_DUREE_HEURES, clear=True):
+            response = self.client.post(reverse("tickets:sla"), follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [message.level_tag for message in response.context["messages"]],
+            ["error"],
+        )
+
+
+class StatistiquesTicketsCacheTests(TestCase):
+    """Statistiques de tickets en cache, invalidées par les modifications qui les changent"""
+
+    def setUp(self):
+        self.magasin_a = Magasin.objects.create(code="9101", nom="Magasin A")
+        self.magasin_b = Magasin.objects.create(code="9102", nom="Magasin B")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ticket = Ticket.objects.create(
+                type_demande=Ticket.TYPE_INCIDENT,
+                urgence=Ticket.NIVEAU_MOYEN,
+                impact=Ticket.NIVEAU_MOYEN,
+                magasin=self.magasin_a,
+            )
+
+    def test_changement_de_magasin(self):
+        self.assertEqual([m["magasin__code"] for m in services.magasins_les_plus_touches()], ["9101"])
+
+        ticket = Ticket.objects.get(pk=self.ticket.pk)
+        ticket.magasin = self.magasin_b
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket.save()
+
+        self.assertEqual([m["magasin__code"] for m in services.magasins_les_plus_touches()], ["9102"])
+
+    def test_modification_sans_effet_sur_les_statistiques(self):
+        ticket = Ticket.objects.get(pk=self.ticket.pk)
+        ticket.description = "Précision"
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            ticket.save()
+        self.assertNotIn(services.invalider_stats_tickets, callbacks)
+
+    def test_invalidation_vue_par_les_autres_processus(self):
+        self.assertEqual([m["magasin__code"] for m in services.magasins_les_plus_touches()], ["9101"])
+
+        # Modification faite par un autre worker, qui a son propre cache local
+        autre_cache = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "autre-worker"}}
+        with override_settings(CACHES=autre_cache):
+            ticket = Ticket.objects.get(pk=self.ticket.pk)
+            ticket.magasin = self.magasin_b
+            with self.captureOnCommitCallbacks(execute=True):
+                ticket.save()
+
+        self.assertEqual([m["magasin__code"] for m in services.magasins_les_plus_touches()], ["9102"])
@@ -5,9 +5,13 @@ app_name = "tickets"
 
 urlpatterns = [
     path("tickets/", views.liste_tickets, name="liste"),
+    path("tickets/recherche/", views.recherche_tickets, name="recherche"),
+    path("tickets/sla/", views.indicateurs_sla, name="sla"),
     path("tickets/nouveau/", views.nouveau_ticket, name="nouveau"),
     path("tickets/<int:ticket_id>/", views.detail_ticket, name="detail"),
     path("tickets/<int:ticket_id>/supprimer/", views.supprimer_ticket, name="supprimer"),
+    path("tickets/apercus/<str:nom>", views.apercu_piece_jointe, name="apercu"),
     path("tickets/supprimer-multiple/", views.supprimer_tickets_multiple, name="supprimer_multiple"),
+    path("tickets/changer-statut-multiple/", views.changer_statut_tickets_multiple, name="changer_statut_multiple"),
 ]
 
@@ -1,11 +1,20 @@
+import re
+
 from django.contrib import messages
+from django.http import FileResponse, Http404
+from django.views.decorators.cache import cache_control
 from django.shortcuts import get_object_or_404, redirect, render
 from django.utils.dateparse import parse_date
 from django.core.paginator import Paginator
-from django.db.models import Case, When, IntegerField, Count
+from django.db.models import Case, When, IntegerField
 
 from .forms import TicketForm, SuiviTicketForm, StatutTicketForm, AssignationTicketForm, ModifierTicketForm
-from .models import Ticket, SuiviTicket, PieceJointe, HistoriqueStatut
+from .models import Ticket, SuiviTicket, PieceJointe, HistoriqueStatut, IndicateurSLA
+from .apercus import DOSSIER_APERCUS
+from .services import (
+    IndicateursSLAIndisponibles, ResultatsRecherche, changer_statut_tickets, magasins_les_plus_touches,
+    rafraichir_indicateurs_sla, statistiques_tickets, total_tickets_global,
+)
 from .utils import charger_techniciens_si_vide
 
 
@@ -43,78 +52,14 @@ def liste_tickets(request):
     if date_fin:
         queryset = queryset.filter(date_creation__date__lte=date_fin)
 
-    # Calculer les magasins les plus touchés
-    # Par défaut, utiliser TOUS les tickets (sans filtres) pour les magasins
-    # Sauf si des filtres de date sont explicitement appliqués
-    queryset_magasins = Ticket.objects.select_related("magasin")
-    
-    # Appliquer uniquement les filtres de date si présents (pour la période)
-    # Les autres filtres (type, statut, urgence, magasin) ne s'appliquent pas aux magasins
-    # car on veut toujours voir les magasins les plus touchés globalement
-    if date_debut:
-        queryset_magasins = queryset_magasins.filter(date_creation__date__gte=date_debut)
-    if date_fin:
-        queryset_magasins = queryset_magasins.filter(date_creation__date__lte=date_fin)
-    
-    # Calculer les 4 magasins les plus touchés
-    # Forcer l'évaluation de la requête pour éviter les problèmes de cache
-    magasins_touches_raw = list(queryset_magasins.values('magasin__code', 'magasin__nom').annotate(
-        count=Count('id')
-    ).order_by('-count')[:4])
-    
-    # Ajouter les couleurs selon le rang
-    def get_magasin_colors(rank):
-        if rank == 0:
-            return {
-                'border_color': '#dc2626',
-                'color_start': '#dc2626',
-                'color_end': '#991b1b',
-                'bg_start': '#fef2f2',
-                'bg_end': '#fee2e2',
-                'shadow': 'rgba(220, 38, 38, 0.3)'
-            }
-        elif rank == 1:
-            return {
-                'border_color': '#ef4444',
-                'color_start': '#ef4444',
-                'color_end': '#dc2626',
-                'bg_start': '#fef2f2',
-                'bg_end': '#fee2e2',
-                'shadow': 'rgba(239, 68, 68, 0.3)'
-            }
-        elif rank == 2:
-            return {
-                'border_color': '#f97316',
-                'color_start': '#f97316',
-                'color_end': '#ea580c',
-                'bg_start': '#fff7ed',
-                'bg_end': '#ffedd5',
-                'shadow': 'rgba(249, 115, 22, 0.3)'
-            }
-        elif rank == 3:
-            return {
-                'border_color': '#fb923c',
-                'color_start': '#fb923c',
-                'color_end': '#f97316',
-                'bg_start': '#fff7ed',
-                'bg_end': '#ffedd5',
-                'shadow': 'rgba(251, 146, 60, 0.3)'
-            }
-        else:
-            return {
-                'border_color': '#fbbf24',
-                'color_start': '#fbbf24',
-                'color_end': '#f59e0b',
-                'bg_start': '#fffbeb',
-                'bg_end': '#fef3c7',
-                'shadow': 'rgba(251, 191, 36, 0.3)'
-            }
-    
-    magasins_touches = []
-    for idx, magasin_data in enumerate(magasins_touches_raw):
-        colors = get_magasin_colors(idx)
-        magasin_data.update(colors)
-        magasins_touches.append(magasin_data)
+    # Magasins les plus touchés : sur TOUS les tickets de la période (seuls les filtres de date
+    # s'appliquent), servis depuis le cache tant qu'aucun ticket n'est créé, supprimé ou change de statut
+    magasins_touches = magasins_les_plus_touches(date_debut, date_fin)
+
+    # Stats sur le queryset filtré (pour correspondre à la liste affichée) : un seul agrégat conditionnel
+    stats = statistiques_tickets(queryset)
+    # Stats globales (sans filtres) pour référence, en cache
+    stats["total_global"] = total_tickets_global()
 
     # Trier : tickets non résolus/fermés en premier, puis par date de mise à jour
     queryset = queryset.annotate(
@@ -126,23 +71,10 @@ def liste_tickets(request):
     ).order_by("priority", "-date_mise_a_jour")
     
     paginator = Paginator(queryset, 20)
+    # Le total est déjà connu : évite le COUNT(*) de la pagination
+    paginator.count = stats["total"]
     page_obj = paginator.get_page(request.GET.get("page"))
 
-    # Calculer les stats sur le queryset filtré (pour correspondre à la liste affichée)
-    total_filtre = queryset.count()
-    resolu_filtre = queryset.filter(statut=Ticket.STATUT_RESOLU).count()
-    en_cours_filtre = queryset.filter(statut=Ticket.STATUT_EN_COURS).count()
-    en_attente_filtre = queryset.filter(statut=Ticket.STATUT_EN_ATTENTE).count()
-    
-    # Calculer les pourcentages basés sur les tickets filtrés
-    taux_resolu = round((resolu_filtre / total_filtre * 100) if total_filtre > 0 else 0, 1)
-    taux_en_cours = round((en_cours_filtre / total_filtre * 100) if total_filtre > 0 else 0, 1)
-    taux_en_attente = round((en_attente_filtre / total_filtre * 100) if total_filtre > 0 else 0, 1)
-    
-    # Calculer aussi les stats globales (sans filtres) pour référence
-    all_tickets = Ticket.objects.all()
-    total_global = all_tickets.count()
-    
     context = {
         "page_obj": page_obj,
         "type_choices": Ticket.TYPE_CHOICES,
@@ -156,21 +88,20 @@ def liste_tickets(request):
         "date_fin": date_fin,
         "date_debut_str": request.GET.get("date_debut", ""),
         "date_fin_str": request.GET.get("date_fin", ""),
-        "stats": {
-            "total": total_filtre,
-            "resolu": resolu_filtre,
-            "en_cours": en_cours_filtre,
-            "en_attente": en_attente_filtre,
-            "taux_resolu": taux_resolu,
-            "taux_en_cours": taux_en_cours,
-            "taux_en_attente": taux_en_attente,
-            "total_global": total_global,
-        },
+        "stats": stats,
         "magasins_touches": magasins_touches,
     }
     return render(request, "tickets/liste.html", context)
 
 
+def recherche_tickets(request):
+    """Recherche plein texte (description, suivis, catégorie, magasin), résultats classés par pertinence"""
+    recherche = (request.GET.get("q") or "").strip()
+    paginator = Paginator(ResultatsRecherche(recherche), 20)
+    page_obj = paginator.get_page(request.GET.get("page"))
+    return render(request, "tickets/recherche.html", {"q": recherche, "page_obj": page_obj})
+
+
 def nouveau_ticket(request):
     charger_techniciens_si_vide()
     if request.method == "POST":
@@ -343,3 +274,82 @@ def supprimer_tickets_multiple(request):
     
     messages.error(request, "Méthode non autorisée.")
     return redirect("tickets:liste")
+
+
+def changer_statut_tickets_multiple(request):
+    """Changer le statut de plusieurs tickets en une seule fois"""
+    if request.method != "POST":
+        messages.error(request, "Méthode non autorisée.")
+        return redirect("tickets:liste")
+
+    statut = request.POST.get("statut", "")
+    if statut not in dict(Ticket.STATUT_CHOICES):
+        messages.error(request, "Statut invalide.")
+        return redirect("tickets:liste")
+
+    # IDs envoyés en un seul champ "1,2,3" (évite la limite du nombre de champs POST) ou répétés
+    try:
+        ticket_ids = {
+            int(tid)
+            for valeur in request.POST.getlist("ticket_ids")
+            for tid in valeur.split(",")
+            if tid.strip()
+        }
+    except (ValueError, TypeError):
+        messages.error(request, "IDs de tickets invalides.")
+        return redirect("tickets:liste")
+    if not ticket_ids:
+        messages.error(request, "Aucun ticket sélectionné.")
+        return redirect("tickets:liste")
+
+    count = changer_statut_tickets(ticket_ids, statut, utilisateur="Utilisateur")
+    libelle = dict(Ticket.STATUT_CHOICES)[statut]
+    if count == 0:
+        messages.info(request, f"Les tickets sélectionnés sont déjà au statut « {libelle} ».")
+    elif count == 1:
+        messages.success(request, f"1 ticket passé au statut « {libelle} ».")
+    else:
+        messages.success(request, f"{count} tickets passés au statut « {libelle} ».")
+    return redirect("tickets:liste")
+
+
+def indicateurs_sla(request):
+    """Délais de première réponse, de résolution et temps par statut, lus dans la table pré-calculée"""
+    if request.method == "POST":
+        try:
+            total = rafraichir_indicateurs_sla()
+        except IndicateursSLAIndisponibles as e:
+            messages.error(request, str(e))
+        else:
+            messages.success(request, f"Indicateurs SLA recalculés ({total} lignes).")
+        return redirect("tickets:sla")
+
+    indicateurs = list(IndicateurSLA.objects.all())
+    sections = [
+        {
+            "dimension": dimension,
+            "libelle": libelle,
+            "lignes": [indicateur for indicateur in indicateurs if indicateur.dimension == dimension],
+        }
+        for dimension, libelle in IndicateurSLA.DIMENSION_CHOICES
+    ]
+    context = {
+        "sections": sections,
+        "date_calcul": max((indicateur.date_calcul for indicateur in indicateurs), default=None),
+    }
+    return render(request, "tickets/sla.html", context)
+
+
+@cache_control(public=True, max_age=31536000, immutable=True)
+def apercu_piece_jointe(request, nom):
+    """Aperçu d'une image jointe ; le nom dépend du contenu de l'original, d'où un cache d'un an"""
+    if not re.fullmatch(r"[0-9A-Za-z_]+\.(webp|jpg)", nom):
+        raise Http404
+    stockage = PieceJointe._meta.get_field("fichier").storage
+    chemin = f"{DOSSIER_APERCUS}/{nom}"
+    if not stockage.exists(chemin):
+        raise Http404
+    return FileResponse(
+        stockage.open(chemin, "rb"),
+        content_type="image/webp" if nom.endswith(".webp") else "image/jpeg",
+    )
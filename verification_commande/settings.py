@@ -58,6 +58,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Mesures SQL / temps par requête (inactif sauf si INSTRUMENTATION_ACTIVE=True)
+    'core.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -90,13 +92,71 @@ WSGI_APPLICATION = 'verification_commande.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
+# DB_MOTEUR=postgresql dans config.env bascule sur PostgreSQL (imports chargés par COPY) ;
+# SQLite reste le profil par défaut.
+DB_MOTEUR = config('DB_MOTEUR', default='sqlite')
+
+if DB_MOTEUR == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NOM', default='verification_commande'),
+            'USER': config('DB_UTILISATEUR', default='postgres'),
+            'PASSWORD': config('DB_MOT_DE_PASSE', default=''),
+            'HOST': config('DB_HOTE', default='localhost'),
+            'PORT': config('DB_PORT', default='5432'),
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+    if config('DB_POOL', default=True, cast=bool):
+        # Pool de connexions natif (psycopg_pool) : incompatible avec CONN_MAX_AGE, qui reste à 0
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': config('DB_POOL_MIN', default=2, cast=int),
+                'max_size': config('DB_POOL_MAX', default=10, cast=int),
+                'timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+            },
+        }
+    else:
+        # Connexions persistantes : réutilisées d'une requête à l'autre pendant DB_CONN_MAX_AGE secondes
+        DATABASES['default']['CONN_MAX_AGE'] = config('DB_CONN_MAX_AGE', default=600, cast=int)
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DB_NOM', default=str(BASE_DIR / 'db.sqlite3')),
+            # Base de test sur fichier (et non en mémoire partagée) : les tests lancés depuis
+            # plusieurs threads y ont le même verrouillage qu'en production (WAL, busy_timeout)
+            'TEST': {'NAME': str(BASE_DIR / 'test_db.sqlite3')},
+        }
+    }
+
+# PRAGMA appliqués à chaque connexion SQLite (core/sqlite.py) ; une valeur vide désactive le PRAGMA.
+# WAL : les lectures ne sont plus bloquées par un import en cours.
+SQLITE_PRAGMAS = {
+    'journal_mode': config('SQLITE_JOURNAL_MODE', default='WAL'),
+    'synchronous': config('SQLITE_SYNCHRONOUS', default='NORMAL'),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=268435456),
+    'cache_size': config('SQLITE_CACHE_SIZE', default=-65536),
+    'temp_store': config('SQLITE_TEMP_STORE', default='MEMORY'),
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=10000),
+}
+
+
+# Cache (fragments de templates du dashboard et de l'accueil)
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'verification-commande',
     }
 }
 
+# Durée de vie (secondes) des fragments ; les clés incluent la version des données,
+# un import ou un recalcul rend donc immédiatement les anciens fragments obsolètes
+CACHE_FRAGMENTS_DUREE = config('CACHE_FRAGMENTS_DUREE', default=3600, cast=int)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -141,6 +201,21 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / config('MEDIA_ROOT', default='media')
 
+# Uploads : les petits fichiers restent en mémoire, les autres sont écrits par blocs sur disque
+# en calculant leur SHA-256 (stockage des pièces jointes par contenu, sans relecture)
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'tickets.stockage.HachageUploadHandler',
+]
+# Dossier temporaire des uploads : sur le même disque que MEDIA_ROOT, une vidéo est déplacée
+# (renommage) au lieu d'être recopiée
+FILE_UPLOAD_TEMP_DIR = config('FILE_UPLOAD_TEMP_DIR', default=None)
+
+# Aperçus des images jointes aux remontées (générés en arrière-plan après l'upload)
+APERCUS_TAILLE = config('APERCUS_TAILLE', default=360, cast=int)
+APERCUS_NB_WORKERS = config('APERCUS_NB_WORKERS', default=2, cast=int)
+APERCUS_ARRIERE_PLAN = config('APERCUS_ARRIERE_PLAN', default=True, cast=bool)
+
 # Configuration des chemins des dossiers d'import
 # Les chemins peuvent être relatifs à MEDIA_ROOT ou absolus
 DOSSIER_COMMANDES_ASTEN = config('DOSSIER_COMMANDES_ASTEN', default='commande_asten')
@@ -175,3 +250,17 @@ DOSSIER_COMMANDES_CYRUS_PATH = get_dossier_path(DOSSIER_COMMANDES_CYRUS)
 DOSSIER_COMMANDES_GPV_PATH = get_dossier_path(DOSSIER_COMMANDES_GPV)
 DOSSIER_COMMANDES_LEGEND_PATH = get_dossier_path(DOSSIER_COMMANDES_LEGEND)
 DOSSIER_BR_ASTEN_PATH = get_dossier_path(DOSSIER_BR_ASTEN)
+
+# Archive Parquet des lignes importées, partitionnée par source et par mois (rejouée par replay_import).
+# Nécessite pyarrow ; sans lui, les imports ne sont pas archivés.
+ARCHIVE_IMPORTS_ACTIVE = config('ARCHIVE_IMPORTS_ACTIVE', default=True, cast=bool)
+ARCHIVE_IMPORTS_DIR = BASE_DIR / config('ARCHIVE_IMPORTS_DIR', default='archives_imports')
+ARCHIVE_IMPORTS_COMPRESSION = config('ARCHIVE_IMPORTS_COMPRESSION', default='zstd')
+
+# Instrumentation des requêtes (en-tête Server-Timing + journal JSON lines)
+# Désactivée par défaut : INSTRUMENTATION_ACTIVE=True dans config.env pour l'activer
+INSTRUMENTATION_ACTIVE = config('INSTRUMENTATION_ACTIVE', default=False, cast=bool)
+INSTRUMENTATION_FICHIER = BASE_DIR / config('INSTRUMENTATION_FICHIER', default='logs/instrumentation.jsonl')
+INSTRUMENTATION_TAILLE_MAX_MO = config('INSTRUMENTATION_TAILLE_MAX_MO', default=10, cast=int)
+INSTRUMENTATION_NB_FICHIERS = config('INSTRUMENTATION_NB_FICHIERS', default=5, cast=int)
+INSTRUMENTATION_NB_REQUETES_LENTES = config('INSTRUMENTATION_NB_REQUETES_LENTES', default=5, cast=int)